@@ -1,3 +1,37 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import CumulAnnuel, PayrollJob, PayrollJobShard, PayrollRun, Payslip
+
+
+@admin.register(PayrollRun)
+class PayrollRunAdmin(admin.ModelAdmin):
+    list_display = ('societe', 'mois', 'annee', 'cree_le')
+    list_filter = ('societe', 'annee')
+
+
+@admin.register(Payslip)
+class PayslipAdmin(admin.ModelAdmin):
+    list_display = ('nom_prenom', 'matricule', 'societe', 'mois', 'annee', 'version_regles', 'cree_le')
+    search_fields = ('nom_prenom', 'matricule')
+    list_filter = ('societe', 'annee', 'version_regles')
+    raw_id_fields = ('run',)
+
+
+@admin.register(CumulAnnuel)
+class CumulAnnuelAdmin(admin.ModelAdmin):
+    list_display = ('matricule', 'societe', 'annee', 'base_imposable', 'irpp', 'css', 'modifie_le')
+    search_fields = ('matricule',)
+    list_filter = ('societe', 'annee')
+
+
+@admin.register(PayrollJob)
+class PayrollJobAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'titre', 'statut', 'nb_employes', 'cree_le', 'termine_le')
+    list_filter = ('statut',)
+
+
+@admin.register(PayrollJobShard)
+class PayrollJobShardAdmin(admin.ModelAdmin):
+    list_display = ('job', 'numero', 'statut', 'position', 'reprises', 'worker', 'battement')
+    list_filter = ('statut',)
+    exclude = ('entrees',)
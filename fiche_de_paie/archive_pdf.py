@@ -0,0 +1,224 @@
+# fiche_de_paie/archive_pdf.py
+"""Archive des bulletins PDF adressée par contenu.
+
+Chaque PDF rendu est rangé sous l'empreinte SHA-256 de ce qui détermine ses
+octets : les données calculées du bulletin et la version de mise en page
+(plus les options de rendu). Un même bulletin régénéré retrouve le fichier
+déjà archivé, sans nouveau rendu ; des bulletins identiques n'occupent qu'un
+fichier. Les fichiers sont écrits une fois (écriture dans un fichier
+temporaire puis renommage atomique) et relus d'un seul ``read``.
+
+Réglage ``PAIE_ARCHIVE_PDF`` : répertoire de l'archive, ``MEDIA_ROOT /
+archive_bulletins`` par défaut ; ``False`` désactive l'archive.
+Réglage ``PAIE_ARCHIVE_PDF_TAILLE_MAX`` : taille maximale de l'archive en
+octets (512 Mo par défaut, ``None`` pour aucune limite). Au-delà, les fichiers
+les moins récemment lus sont supprimés jusqu'à 90 % de cette taille : la purge
+(un parcours de l'archive) n'a lieu qu'une fois toutes les quelques milliers
+d'écritures. Un bulletin purgé est simplement rendu à nouveau à sa prochaine
+demande.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+from django.conf import settings
+
+from .pdf import VERSION_MISE_EN_PAGE, generate_pdf_fpdf
+
+TAILLE_MAX_ARCHIVE = 512 * 1024 * 1024
+NIVEAU_PURGE = 0.9  # part de taille_max conservée par une purge
+
+
+def empreinte_pdf(data, gabarit=True, compact=False):
+    """Clé d'archive d'un bulletin calculé : SHA-256 hexadécimal des données et de la mise en page."""
+    contenu = json.dumps(
+        [VERSION_MISE_EN_PAGE, bool(gabarit), bool(compact), data],
+        sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str,
+    )
+    return hashlib.sha256(contenu.encode('utf-8')).hexdigest()
+
+
+class ArchivePdf:
+    """Fichiers PDF rangés par empreinte (``ab/abcdef....pdf``), écrits une seule fois.
+
+    Avec ``taille_max`` (octets), les fichiers les moins récemment lus sont
+    supprimés dès que l'archive dépasse cette taille, jusqu'à NIVEAU_PURGE de
+    celle-ci. La taille archivée est tenue à jour en mémoire : seule une purge
+    parcourt l'archive.
+    """
+
+    def __init__(self, repertoire, taille_max=None):
+        self.repertoire = os.fspath(repertoire)
+        self.taille_max = taille_max
+        self._verrou = threading.Lock()
+        self._taille = None  # octets archivés, mesurés au premier besoin
+        self._purge_en_cours = False
+        self.hits = 0
+        self.misses = 0
+        self.ecritures = 0
+        self.suppressions = 0
+        self.purges = 0
+
+    def chemin(self, cle):
+        return os.path.join(self.repertoire, cle[:2], f"{cle}.pdf")
+
+    def lire(self, cle):
+        """Octets du PDF archivé sous ``cle``, ou None."""
+        chemin = self.chemin(cle)
+        try:
+            with open(chemin, 'rb') as fichier:
+                contenu = fichier.read()
+        except FileNotFoundError:
+            contenu = b''
+        if not contenu:
+            with self._verrou:
+                self.misses += 1
+            return None
+        if self.taille_max is not None:
+            # Date de modification = dernière lecture : la purge garde les PDF demandés
+            try:
+                os.utime(chemin)
+            except FileNotFoundError:
+                pass
+        with self._verrou:
+            self.hits += 1
+        return contenu
+
+    def ecrire(self, cle, contenu):
+        """Archive ``contenu`` sous ``cle`` s'il n'y est pas déjà ; retourne le chemin."""
+        chemin = self.chemin(cle)
+        if os.path.exists(chemin):
+            return chemin
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        descripteur, temporaire = tempfile.mkstemp(dir=os.path.dirname(chemin), suffix='.tmp')
+        try:
+            with os.fdopen(descripteur, 'wb') as fichier:
+                fichier.write(contenu)
+            # Renommage atomique : un lecteur voit le fichier complet ou rien
+            os.replace(temporaire, chemin)
+        except BaseException:
+            if os.path.exists(temporaire):
+                os.unlink(temporaire)
+            raise
+        with self._verrou:
+            self.ecritures += 1
+            if self._taille is not None:
+                self._taille += len(contenu)
+        if self.taille_max is not None:
+            self._limiter()
+        return chemin
+
+    def _fichiers(self):
+        """``(date_modification, taille, chemin)`` des PDF archivés."""
+        fichiers = []
+        for dossier, _, noms in os.walk(self.repertoire):
+            for nom in noms:
+                if nom.endswith('.pdf'):
+                    chemin = os.path.join(dossier, nom)
+                    try:
+                        infos = os.stat(chemin)
+                    except FileNotFoundError:
+                        continue
+                    fichiers.append((infos.st_mtime, infos.st_size, chemin))
+        return fichiers
+
+    def _limiter(self):
+        with self._verrou:
+            if self._taille is not None and self._taille <= self.taille_max:
+                return
+        if self._taille is None:
+            # Archive existante à l'ouverture : mesurée une fois
+            taille = sum(taille for _, taille, _ in self._fichiers())
+            with self._verrou:
+                if self._taille is None:
+                    self._taille = taille
+                if self._taille <= self.taille_max:
+                    return
+        with self._verrou:
+            # Une seule purge à la fois : les écritures concurrentes ne la relancent pas
+            if self._purge_en_cours:
+                return
+            self._purge_en_cours = True
+        try:
+            self.purger(int(self.taille_max * NIVEAU_PURGE))
+        finally:
+            with self._verrou:
+                self._purge_en_cours = False
+
+    def purger(self, taille_max=0):
+        """Supprime les PDF les moins récemment lus jusqu'à ramener l'archive à ``taille_max`` octets.
+
+        Retourne le nombre de fichiers supprimés ; ``purger()`` vide l'archive.
+        """
+        fichiers = sorted(self._fichiers())
+        total = taille = sum(taille for _, taille, _ in fichiers)
+        supprimes, liberes = 0, 0
+        for _, taille_fichier, chemin in fichiers:
+            if taille <= taille_max:
+                break
+            taille -= taille_fichier
+            try:
+                os.unlink(chemin)
+            except FileNotFoundError:
+                # Déjà supprimé (et décompté) par une autre purge
+                continue
+            supprimes += 1
+            liberes += taille_fichier
+        with self._verrou:
+            # Écritures concurrentes comprises : seuls les octets supprimés ici sont retirés
+            self._taille = (total if self._taille is None else self._taille) - liberes
+            self.suppressions += supprimes
+            self.purges += 1
+        return supprimes
+
+    def stats(self):
+        with self._verrou:
+            total = self.hits + self.misses
+            return {
+                'repertoire': self.repertoire,
+                'hits': self.hits,
+                'misses': self.misses,
+                'ratio_hits': round(self.hits / total, 4) if total else 0.0,
+                'ecritures': self.ecritures,
+                'suppressions': self.suppressions,
+                'purges': self.purges,
+            }
+
+
+_archives = {}
+
+
+def archive_pdf():
+    """Archive du réglage PAIE_ARCHIVE_PDF, ou None si elle est désactivée."""
+    repertoire = getattr(settings, 'PAIE_ARCHIVE_PDF', None)
+    if repertoire is None:
+        if not settings.MEDIA_ROOT:
+            return None
+        repertoire = os.path.join(settings.MEDIA_ROOT, 'archive_bulletins')
+    if not repertoire:
+        return None
+    repertoire = os.fspath(repertoire)
+    taille_max = getattr(settings, 'PAIE_ARCHIVE_PDF_TAILLE_MAX', TAILLE_MAX_ARCHIVE)
+    archive = _archives.get((repertoire, taille_max))
+    if archive is None:
+        archive = _archives.setdefault((repertoire, taille_max), ArchivePdf(repertoire, taille_max))
+    return archive
+
+
+def pdf_bulletin(data, gabarit=True, compact=False):
+    """PDF d'un bulletin calculé, relu dans l'archive ou rendu puis archivé.
+
+    Retourne ``(pdf_bytes, archive)`` où ``archive`` indique un PDF relu sans rendu.
+    """
+    archive = archive_pdf()
+    if archive is None:
+        return generate_pdf_fpdf(data, gabarit=gabarit, compact=compact), False
+    cle = empreinte_pdf(data, gabarit, compact)
+    contenu = archive.lire(cle)
+    if contenu is not None:
+        return contenu, True
+    contenu = generate_pdf_fpdf(data, gabarit=gabarit, compact=compact)
+    archive.ecrire(cle, contenu)
+    return contenu, False
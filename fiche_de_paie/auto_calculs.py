@@ -1,5 +1,11 @@
+import copy
+import hashlib
+from bisect import bisect_left
 from decimal import Decimal, ROUND_HALF_UP
-from .auto_config import REGLES_AUTOMATIQUES, SEUILS_AUTOMATIQUES
+from datetime import datetime
+from .auto_config import HEURES_SUPPLEMENTAIRES, REGLES_AUTOMATIQUES, SEUILS_AUTOMATIQUES
+from .millimes import calcul_auto_millimes
+from .regles import MoteurRegles, booleen_saisi
 
 # === Taux cotisations salarié ===
 TAUX_ASSURANCES = Decimal('0.05')       # Assurances sociales
@@ -28,26 +34,37 @@ BARÈME_IRPP = [
 
 CSS_TAUX = Decimal('0.005')  # Contribution sociale de solidarité 0,5%
 
+# === Barème IRPP 2017-2024 ===
+BARÈME_IRPP_2024 = [
+    (0, 5000, 0),           # 0-5000 TND : 0%
+    (5000.001, 20000, 0.26), # 5001-20000 TND : 26%
+    (20000.001, 30000, 0.28), # 20001-30000 TND : 28%
+    (30000.001, 50000, 0.32), # 30001-50000 TND : 32%
+    (50000.001, float('inf'), 0.35), # +50000 TND : 35%
+]
+
+# === Jeux de règles datés (bornes incluses, (année, mois)) ===
+# Hors de ces périodes, les règles courantes ci-dessus s'appliquent.
+REGLES_DATEES = [
+    {'debut': (2017, 1), 'fin': (2024, 12), 'bareme': BARÈME_IRPP_2024},
+]
+
+CENTIME = Decimal('0.01')
+
 # === Calcul cotisations CNSS ===
-def calcul_cotisations(total_brut):
+def calcul_cotisations(total_brut, plan=None):
     total_brut = Decimal(total_brut)
+    plan = plan or plan_regles()
 
     # Cotisations salariales
     cot_salarie = {
-        'assurances': (total_brut * TAUX_ASSURANCES).quantize(Decimal('0.01')),
-        'supp': (total_brut * TAUX_SUPP).quantize(Decimal('0.01')),
-        'pensions': (total_brut * TAUX_PENSIONS).quantize(Decimal('0.01')),
-        'chomage': (total_brut * TAUX_CHOMAGE).quantize(Decimal('0.01')),
+        nom: (total_brut * taux).quantize(CENTIME) for nom, taux in plan.cotisations_salarie
     }
     total_salarie = sum(cot_salarie.values())
 
     # Cotisations employeur
     cot_employeur = {
-        'assurances': (total_brut * TAUX_ASSURANCES_EMPLOYEUR).quantize(Decimal('0.01')),
-        'supp': (total_brut * TAUX_SUPP_EMPLOYEUR).quantize(Decimal('0.01')),
-        'pensions': (total_brut * TAUX_PENSIONS_EMPLOYEUR).quantize(Decimal('0.01')),
-        'chomage': (total_brut * TAUX_CHOMAGE_EMPLOYEUR).quantize(Decimal('0.01')),
-        'majoration_loi_74_101': (total_brut * TAUX_MAJORATION_EMPLOYEUR).quantize(Decimal('0.01')),
+        nom: (total_brut * taux).quantize(CENTIME) for nom, taux in plan.cotisations_employeur
     }
     total_employeur = sum(cot_employeur.values())
 
@@ -58,21 +75,120 @@ def calcul_cotisations(total_brut):
         'total_cotisations_patronales': total_employeur
     }
 
+# === Règles compilées ===
+def _regles_en_vigueur():
+    """Règles de base courantes, au format attendu par MoteurRegles."""
+    return {
+        'regles': REGLES_AUTOMATIQUES,
+        'seuils': SEUILS_AUTOMATIQUES,
+        'cotisations_salarie': (
+            ('assurances', TAUX_ASSURANCES),
+            ('supp', TAUX_SUPP),
+            ('pensions', TAUX_PENSIONS),
+            ('chomage', TAUX_CHOMAGE),
+        ),
+        'cotisations_employeur': (
+            ('assurances', TAUX_ASSURANCES_EMPLOYEUR),
+            ('supp', TAUX_SUPP_EMPLOYEUR),
+            ('pensions', TAUX_PENSIONS_EMPLOYEUR),
+            ('chomage', TAUX_CHOMAGE_EMPLOYEUR),
+            ('majoration_loi_74_101', TAUX_MAJORATION_EMPLOYEUR),
+        ),
+        'bareme': BARÈME_IRPP,
+        'css_taux': CSS_TAUX,
+        'heures_supp_dans_brut': HEURES_SUPPLEMENTAIRES['dans_le_brut'],
+    }
+
+
+MOTEUR_REGLES = MoteurRegles(_regles_en_vigueur(), REGLES_DATEES)
+BARÈME_IRPP_COMPILÉ = MOTEUR_REGLES.defaut.bareme
+
+
+# === Version des règles en vigueur ===
+_ETAT_REGLES = {
+    'regles': None, 'seuils': None, 'bareme': None, 'taux': None, 'datees': None,
+    'heures_supp': None, 'version': None,
+}
+
+
+def _taux_en_vigueur():
+    return (
+        TAUX_ASSURANCES, TAUX_SUPP, TAUX_PENSIONS, TAUX_CHOMAGE,
+        TAUX_ASSURANCES_EMPLOYEUR, TAUX_SUPP_EMPLOYEUR, TAUX_PENSIONS_EMPLOYEUR,
+        TAUX_CHOMAGE_EMPLOYEUR, TAUX_MAJORATION_EMPLOYEUR, CSS_TAUX,
+    )
+
+
+def version_regles():
+    """Identifiant court des règles en vigueur (primes, seuils, taux, barème).
+
+    La comparaison avec la dernière copie connue est faite par valeur : une
+    modification en place de REGLES_AUTOMATIQUES, SEUILS_AUTOMATIQUES,
+    BARÈME_IRPP, REGLES_DATEES ou HEURES_SUPPLEMENTAIRES change la version
+    et recompile les plans.
+    """
+    global MOTEUR_REGLES, BARÈME_IRPP_COMPILÉ
+    etat = _ETAT_REGLES
+    taux = _taux_en_vigueur()
+    if (etat['version'] is None
+            or REGLES_AUTOMATIQUES != etat['regles']
+            or SEUILS_AUTOMATIQUES != etat['seuils']
+            or BARÈME_IRPP != etat['bareme']
+            or taux != etat['taux']
+            or REGLES_DATEES != etat['datees']
+            or HEURES_SUPPLEMENTAIRES != etat['heures_supp']):
+        if etat['version'] is not None:
+            MOTEUR_REGLES = MoteurRegles(_regles_en_vigueur(), REGLES_DATEES)
+            BARÈME_IRPP_COMPILÉ = MOTEUR_REGLES.defaut.bareme
+        etat.update({
+            'regles': copy.deepcopy(REGLES_AUTOMATIQUES),
+            'seuils': copy.deepcopy(SEUILS_AUTOMATIQUES),
+            'bareme': copy.deepcopy(BARÈME_IRPP),
+            'taux': taux,
+            'datees': copy.deepcopy(REGLES_DATEES),
+            'heures_supp': copy.deepcopy(HEURES_SUPPLEMENTAIRES),
+        })
+        empreinte = repr((
+            etat['regles'], etat['seuils'], etat['bareme'], taux, etat['datees'], etat['heures_supp'],
+        ))
+        etat['version'] = hashlib.sha1(empreinte.encode('utf-8')).hexdigest()[:12]
+    return etat['version']
+
+
+def moteur_regles():
+    """MoteurRegles des règles en vigueur (recompilé si elles ont changé)."""
+    version_regles()
+    return MOTEUR_REGLES
+
+
+def plan_regles(annee=None, mois=None):
+    """Plan de règles compilé applicable à la période (règles courantes par défaut)."""
+    version_regles()
+    return MOTEUR_REGLES.plan(annee, mois)
+
+
 # === Calcul IRPP 2025 ===
-def calcul_irpp(salaire_mensuel_net_imposable):
+def calcul_irpp_annuel(base_imposable_annuelle, bareme=None):
+    """IRPP dû sur une base imposable annuelle"""
+    base_imposable_annuelle = Decimal(base_imposable_annuelle)
+
+    # Tranche atteinte : dernier plancher strictement inférieur à la base
+    planchers, tranches = bareme or BARÈME_IRPP_COMPILÉ
+    i = bisect_left(planchers, base_imposable_annuelle) - 1
+    if i < 0:
+        return Decimal('0.00')
+
+    plancher, plafond, taux, cumul = tranches[i]
+    tranche = min(base_imposable_annuelle, plafond) - plancher
+    return cumul + (tranche * taux).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def calcul_irpp(salaire_mensuel_net_imposable, bareme=None):
     """Calcule l'IRPP sur base ANNUELLE"""
     salaire_mensuel = Decimal(salaire_mensuel_net_imposable)
     
     # Conversion en base annuelle
-    base_imposable_annuelle = salaire_mensuel * 12
-    
-    irpp_annuel = Decimal('0')
-    
-    # Application du barème sur base ANNUELLE
-    for min_val, max_val, taux in BARÈME_IRPP:
-        if base_imposable_annuelle > Decimal(str(min_val)):
-            tranche = min(base_imposable_annuelle, Decimal(str(max_val))) - Decimal(str(min_val))
-            irpp_annuel += (tranche * Decimal(str(taux))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    irpp_annuel = calcul_irpp_annuel(salaire_mensuel * 12, bareme)
     
     # Conversion en mensuel
     irpp_mensuel = (irpp_annuel / 12).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
@@ -80,46 +196,50 @@ def calcul_irpp(salaire_mensuel_net_imposable):
     return irpp_mensuel
 
 # === Calcul CSS 0,5% si revenu annuel net imposable > 5000 TND ===
-def calcul_css(salaire_brut):
+def calcul_css_annuelle(salaire_annuel, taux=None):
+    """CSS due sur un revenu annuel"""
+    salaire_annuel = Decimal(salaire_annuel)
+    if salaire_annuel > 5000:
+        return (salaire_annuel * (taux or CSS_TAUX)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    return Decimal('0.00')
+
+
+def calcul_css(salaire_brut, taux=None):
     salaire_annuel = Decimal(salaire_brut) * 12
     if salaire_annuel > 5000:
-        return (Decimal(salaire_brut) * CSS_TAUX).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+        return (Decimal(salaire_brut) * (taux or CSS_TAUX)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
     return Decimal('0.00')
 
 # === Classe principale de calcul automatique ===
 class CalculateurPaieAuto:
-    def __init__(self, salaire_base, annees_anciennete=0):
+    def __init__(self, salaire_base, annees_anciennete=0, plan=None, heures_supp=0):
         self.salaire_base = Decimal(str(salaire_base))
         self.annees_anciennete = annees_anciennete
+        self.heures_supp = Decimal(str(heures_supp or 0))
+        self.plan = plan or plan_regles()
         self.resultats = {}
 
     # --- Prime ancienneté ---
     def calculer_prime_anciennete(self):
-        regle = REGLES_AUTOMATIQUES['prime_anciennete']
         taux = Decimal('0')
-        for seuil, taux_seuil in reversed(regle['echelons']):
+        for seuil, taux_seuil in self.plan.anciennete:
             if self.annees_anciennete >= seuil:
                 taux = taux_seuil
                 break
-        montant = (self.salaire_base * taux).quantize(Decimal('0.01'))
-        return {'montant': montant, 'libelle': regle['libelle']} if montant > 0 else None
+        montant = (self.salaire_base * taux).quantize(CENTIME)
+        return {'montant': montant, 'libelle': self.plan.libelle_anciennete} if montant > 0 else None
 
     # --- Tous les gains (primes) ---
     def calculer_tous_les_gains(self):
         gains = {}
         total_brut = self.salaire_base
 
-        # Liste des primes à calculer
-        primes = ['prime_presence', 'indemn_transport', 'prime_panier', 'prime_rendement']
-        for prime in primes:
-            regle = REGLES_AUTOMATIQUES[prime]
-            montant = (self.salaire_base * regle['valeur']).quantize(Decimal('0.01'))
-            # Vérification des seuils pour certaines primes
-            if prime in ['prime_presence', 'prime_rendement']:
-                seuil = SEUILS_AUTOMATIQUES[f'{prime}_seuil']
-                if self.salaire_base < seuil:
-                    continue
-            gains[prime] = {'montant': montant, 'libelle': regle['libelle']}
+        # Primes en pourcentage, seuils déjà résolus par le plan
+        for prime, taux, seuil, libelle in self.plan.primes:
+            if seuil is not None and self.salaire_base < seuil:
+                continue
+            montant = (self.salaire_base * taux).quantize(CENTIME)
+            gains[prime] = {'montant': montant, 'libelle': libelle}
             total_brut += montant
 
         # Prime ancienneté
@@ -128,6 +248,10 @@ class CalculateurPaieAuto:
             gains['prime_anciennete'] = prime_anciennete
             total_brut += prime_anciennete['montant']
 
+        # Heures supplémentaires : montant saisi ou calculé des pointages (voir pointages.py)
+        if self.plan.heures_supp_dans_brut:
+            total_brut += self.heures_supp
+
         self.resultats['total_brut'] = total_brut
         self.resultats['gains'] = gains
         return self.resultats
@@ -135,9 +259,9 @@ class CalculateurPaieAuto:
     # --- Calcul salaire net ---
     def calculer_salaire_net(self):
         total_brut = self.resultats.get('total_brut', self.salaire_base)
-        cotisations = calcul_cotisations(total_brut)
-        irpp = calcul_irpp(total_brut)
-        css = calcul_css(total_brut)
+        cotisations = calcul_cotisations(total_brut, self.plan)
+        irpp = calcul_irpp(total_brut, self.plan.bareme)
+        css = calcul_css(total_brut, self.plan.css_taux)
         salaire_net = total_brut - cotisations['retenue_cnss'] - irpp - css  # tous Decimal
 
         self.resultats.update({
@@ -147,3 +271,109 @@ class CalculateurPaieAuto:
             'salaire_net': salaire_net
         })
         return self.resultats
+
+
+# --- Déductions fiscales mensuelles ---
+def deduction_situation(chef_famille, enfants):
+    """Déduction mensuelle pour situation de famille."""
+    ded_situation = Decimal('0')
+    if chef_famille:
+        ded_situation += Decimal('25')  # 300/12 = 25 TND par mois
+    ded_situation += Decimal('8.33') * enfants  # 100/12 ≈ 8.33 TND par enfant/mois
+    return ded_situation
+
+
+def frais_professionnels(brut_imposable):
+    """Frais professionnels mensuels : 10 % du brut imposable."""
+    return (brut_imposable * Decimal('0.10')).quantize(Decimal('0.001'))
+
+
+# --- Fonction de calcul complète CORRIGÉE ---
+MOTEURS = ('decimal', 'millimes')
+
+
+def calcul_auto(data, moteur='decimal'):
+    """Calcul automatique complet du bulletin de paie
+
+    ``moteur`` : 'decimal' (référence) ou 'millimes' (entiers, voir millimes.py),
+    aux résultats identiques ; le moteur entier exige des montants au millime.
+    """
+    if moteur == 'millimes':
+        return calcul_auto_millimes(data, plan_regles(data.get('annee'), data.get('mois')))
+    if moteur != 'decimal':
+        raise ValueError(f"Moteur de calcul inconnu : {moteur}")
+
+    # Extraction des données
+    s_base = Decimal(str(data.get('salaire_base', 0)))
+    chef_famille = booleen_saisi(data.get('chef_famille', False))
+    enfants = int(data.get('enfants', 0))
+    annees_anciennete = int(data.get('annees_anciennete', 0))
+    plan = plan_regles(data.get('annee'), data.get('mois'))
+    
+    # Initialisation du calculateur
+    calculateur = CalculateurPaieAuto(s_base, annees_anciennete, plan, data.get('heures_supp'))
+    calculateur.calculer_tous_les_gains()
+    resultats = calculateur.calculer_salaire_net()
+
+    total_brut = resultats['total_brut']
+    cotisations = resultats['cotisations']
+    gains = resultats['gains']
+    
+    # Calcul brut imposable MENSUEL
+    brut_imposable_mensuel = total_brut - cotisations['retenue_cnss']
+    
+    # Calcul déductions fiscales MENSUELLES
+    ded_situation_mensuel = deduction_situation(chef_famille, enfants)
+    frais_prof_mensuel = frais_professionnels(brut_imposable_mensuel)
+    autres_deductions = Decimal(str(data.get('autres_deductions', 0)))
+    avance = Decimal(str(data.get('avance', 0)))
+    
+    # Base imposable nette MENSUELLE
+    base_imposable_nette_mensuel = max(
+        brut_imposable_mensuel - ded_situation_mensuel - frais_prof_mensuel,
+        Decimal('0')
+    )
+    
+    # ✅ CORRECTION : Calcul IRPP sur base MENSUELLE (la fonction gère la conversion annuelle)
+    irpp = calcul_irpp(base_imposable_nette_mensuel, plan.bareme)
+    
+    # ✅ CORRECTION : Calcul CSS sur base MENSUELLE
+    css = calcul_css(brut_imposable_mensuel, plan.css_taux)
+    
+    # Total impôts
+    total_impots = irpp + css
+    
+    # Calcul cohérent du net à payer
+    net_a_payer = total_brut - cotisations['retenue_cnss'] - total_impots - avance - autres_deductions
+
+    # Mise à jour du dictionnaire data
+    data.update({
+        'salaire_base': float(s_base),
+        'total_brut': float(total_brut),
+        'brut_imposable': float(brut_imposable_mensuel),
+        'retenue_cnss': float(cotisations['retenue_cnss']),
+        'total_cotisations_patronales': float(cotisations['total_cotisations_patronales']),
+        'irpp': float(irpp),
+        'css': float(css),
+        'total_impots': float(total_impots),
+        'salaire_net': float(total_brut - cotisations['retenue_cnss'] - total_impots),
+        'net_a_payer': float(net_a_payer),
+        'ded_situation': float(ded_situation_mensuel),
+        'frais_prof': float(frais_prof_mensuel),
+        'base_imposable_nette': float(base_imposable_nette_mensuel),
+        'date_generation': datetime.now().strftime('%d/%m/%Y'),
+    })
+
+    # Ajouter cotisations salariales individuellement
+    for k, v in cotisations['salarie'].items():
+        data[f'cotisation_{k}'] = float(v)
+    
+    # Ajouter cotisations patronales individuellement
+    for k, v in cotisations['employeur'].items():
+        data[f'patronale_{k}'] = float(v)
+
+    # Ajouter primes individuelles
+    for k, v in gains.items():
+        data[k] = float(v['montant'])
+
+    return data
@@ -47,4 +47,19 @@ REGLES_AUTOMATIQUES = {
 SEUILS_AUTOMATIQUES = {
     'prime_rendement_seuil': Decimal('2000'),
     'prime_presence_seuil': Decimal('1000'),
-}
\ No newline at end of file
+}
+
+# Heures supplémentaires. 'dans_le_brut' : montant heures_supp ajouté au brut
+# (cotisé et imposé) ; faux, il n'est qu'affiché, comme avant les pointages.
+# Calcul des pointages (voir pointages.py) : taux horaire = salaire de base /
+# heures mensuelles ; majoration des heures de la semaine au-delà de chaque
+# seuil (régime de 40 h : 25 % de 40 à 48 h, 75 % au-delà).
+# Régime de 48 h : 'heures_mensuelles' 208 et une seule tranche (48, 0.75).
+HEURES_SUPPLEMENTAIRES = {
+    'dans_le_brut': True,
+    'heures_mensuelles': Decimal('173.33'),
+    'tranches': [
+        (Decimal('40'), Decimal('0.25')),
+        (Decimal('48'), Decimal('0.75')),
+    ],
+}
@@ -0,0 +1,299 @@
+# fiche_de_paie/batch.py
+"""Moteur de paie vectorisé (NumPy) pour les traitements de masse.
+
+Tous les montants sont manipulés en millimes (entiers int64) et arrondis
+explicitement avec les mêmes modes que les ``quantize`` de ``calcul_auto`` :
+les résultats sont identiques, au millime près, au calcul unitaire.
+"""
+from decimal import Decimal
+
+import numpy as np
+
+from . import auto_calculs
+from .auto_calculs import plan_regles
+from .regles import booleen_saisi
+
+# Colonnes attendues en entrée (les colonnes absentes valent 0)
+COLONNES_ENTREE = (
+    'salaire_base', 'annees_anciennete', 'chef_famille',
+    'enfants', 'avance', 'autres_deductions', 'heures_supp',
+)
+
+# Déductions familiales mensuelles (en millimes)
+DED_CHEF_FAMILLE = 25000    # 25 TND
+DED_PAR_ENFANT = 8330       # 8.33 TND
+
+MILLIMES = 1000
+
+
+# === Arrondis entiers ===
+def _taux_entier(taux):
+    """Décompose un taux décimal en (numérateur entier, nombre de décimales)."""
+    signe, chiffres, exposant = Decimal(str(taux)).as_tuple()
+    numerateur = int(''.join(map(str, chiffres))) * (-1 if signe else 1)
+    if exposant > 0:
+        return numerateur * 10 ** exposant, 0
+    return numerateur, -exposant
+
+
+def _arrondi_half_up(numerateur, diviseur):
+    """numerateur / diviseur arrondi au plus proche, égalité loin de zéro (ROUND_HALF_UP)."""
+    absolu = np.abs(numerateur)
+    quotient = (2 * absolu + diviseur) // (2 * diviseur)
+    return np.where(numerateur < 0, -quotient, quotient)
+
+
+def _arrondi_half_even(numerateur, diviseur):
+    """numerateur / diviseur arrondi au plus proche, égalité vers le pair (ROUND_HALF_EVEN)."""
+    absolu = np.abs(numerateur)
+    quotient, reste = np.divmod(absolu, diviseur)
+    double = 2 * reste
+    quotient = quotient + ((double > diviseur) | ((double == diviseur) & (quotient % 2 == 1)))
+    return np.where(numerateur < 0, -quotient, quotient)
+
+
+def _appliquer_taux(montants, taux, decimales, arrondi=_arrondi_half_even):
+    """(montants × taux).quantize(10^-decimales) en millimes, sur des millimes."""
+    numerateur, chiffres = _taux_entier(taux)
+    # montants (1e-3) × numerateur (1e-chiffres) -> échelle 1e-(3+chiffres)
+    diviseur = 10 ** (3 + chiffres - decimales)
+    if diviseur < 1:
+        return montants * numerateur * 10 ** (decimales - 3 - chiffres)
+    return arrondi(montants * numerateur, diviseur) * 10 ** (3 - decimales)
+
+
+# === Conversion des entrées ===
+def _en_millimes(valeurs, nom):
+    """Convertit une colonne de montants en millimes entiers."""
+    if isinstance(valeurs, np.ndarray) and valeurs.dtype.kind in 'iu':
+        return valeurs.astype(np.int64) * MILLIMES
+    if isinstance(valeurs, np.ndarray) and valeurs.dtype.kind == 'f':
+        millimes = np.rint(valeurs * MILLIMES)
+        if not np.allclose(millimes, valeurs * MILLIMES, rtol=0, atol=1e-6):
+            raise ValueError(f"{nom} : précision supérieure au millime")
+        return millimes.astype(np.int64)
+
+    resultat = np.empty(len(valeurs), dtype=np.int64)
+    for i, valeur in enumerate(valeurs):
+        montant = Decimal(str(valeur if valeur not in (None, '') else 0)) * MILLIMES
+        if montant != montant.to_integral_value():
+            raise ValueError(f"{nom} : précision supérieure au millime (ligne {i + 1})")
+        resultat[i] = int(montant)
+    return resultat
+
+
+def _en_entiers(valeurs):
+    if isinstance(valeurs, np.ndarray) and valeurs.dtype.kind in 'iub':
+        return valeurs.astype(np.int64)
+    return np.array([int(v) if v not in (None, '') else 0 for v in valeurs], dtype=np.int64)
+
+
+def _en_booleens(valeurs):
+    if isinstance(valeurs, np.ndarray) and valeurs.dtype.kind in 'biuf':
+        return valeurs.astype(bool)
+    return np.array([booleen_saisi(v) for v in valeurs], dtype=bool)
+
+
+def preparer_table(employes):
+    """Construit les colonnes NumPy à partir d'une liste de dicts ou d'un dict de colonnes."""
+    if isinstance(employes, dict):
+        colonnes = employes
+        taille = len(next(iter(colonnes.values()))) if colonnes else 0
+    else:
+        employes = list(employes)
+        taille = len(employes)
+        colonnes = {nom: [e.get(nom, 0) for e in employes] for nom in COLONNES_ENTREE}
+
+    def colonne(nom):
+        if nom not in colonnes:
+            return np.zeros(taille, dtype=np.int64)
+        return colonnes[nom]
+
+    return {
+        'salaire_base': _en_millimes(colonne('salaire_base'), 'salaire_base'),
+        'annees_anciennete': _en_entiers(colonne('annees_anciennete')),
+        'chef_famille': _en_booleens(colonne('chef_famille')),
+        'enfants': _en_entiers(colonne('enfants')),
+        'avance': _en_millimes(colonne('avance'), 'avance'),
+        'autres_deductions': _en_millimes(colonne('autres_deductions'), 'autres_deductions'),
+        'heures_supp': _en_millimes(colonne('heures_supp'), 'heures_supp'),
+    }
+
+
+# === Briques de calcul vectorisées (millimes) ===
+def primes_batch(salaire_base, annees_anciennete, plan):
+    """Primes automatiques et total brut, comme CalculateurPaieAuto.calculer_tous_les_gains."""
+    primes = {}
+    total_brut = salaire_base.copy()
+
+    for prime, taux, seuil, _ in plan.primes:
+        montant = _appliquer_taux(salaire_base, taux, 2)
+        if seuil is not None:
+            montant = np.where(salaire_base < int(seuil * MILLIMES), 0, montant)
+        primes[prime] = montant
+        total_brut = total_brut + montant
+
+    # Prime d'ancienneté : échelon le plus haut atteint
+    anciennete = np.zeros_like(salaire_base)
+    for seuil, taux in reversed(plan.anciennete):
+        montant = _appliquer_taux(salaire_base, taux, 2)
+        anciennete = np.where(annees_anciennete >= int(seuil), montant, anciennete)
+    anciennete = np.where(anciennete > 0, anciennete, 0)
+    primes['prime_anciennete'] = anciennete
+    total_brut = total_brut + anciennete
+
+    return primes, total_brut
+
+
+def cotisations_batch(total_brut, plan):
+    """Cotisations CNSS salariales et patronales, comme calcul_cotisations."""
+    salarie = {k: _appliquer_taux(total_brut, taux, 2) for k, taux in plan.cotisations_salarie}
+    employeur = {k: _appliquer_taux(total_brut, taux, 2) for k, taux in plan.cotisations_employeur}
+    return {
+        'salarie': salarie,
+        'retenue_cnss': sum(salarie.values()),
+        'employeur': employeur,
+        'total_cotisations_patronales': sum(employeur.values()),
+    }
+
+
+def _bareme_millimes(bareme_compile):
+    """Tables NumPy (millimes) dérivées du barème précompilé de auto_calculs."""
+    planchers, tranches = bareme_compile
+    chiffres = max(_taux_entier(taux)[1] for _, _, taux, _ in tranches)
+    plafond_max = np.iinfo(np.int64).max // 2
+    return {
+        'planchers': np.array([int(p * MILLIMES) for p in planchers], dtype=np.int64),
+        'plafonds': np.array([
+            int(plafond * MILLIMES) if plafond.is_finite() else plafond_max
+            for _, plafond, _, _ in tranches
+        ], dtype=np.int64),
+        'taux': np.array([int(taux.scaleb(chiffres)) for _, _, taux, _ in tranches], dtype=np.int64),
+        'cumuls': np.array([int(cumul * MILLIMES) for _, _, _, cumul in tranches], dtype=np.int64),
+        'diviseur': 10 ** (3 + chiffres - 2),
+    }
+
+
+_BAREMES_MILLIMES = {}
+
+
+def bareme_millimes(plan=None):
+    """Tables du barème d'un plan en millimes, construites une fois par plan compilé."""
+    plan = plan or plan_regles()
+    entree = _BAREMES_MILLIMES.get(plan.version)
+    if entree is None or entree[0] is not plan.bareme:
+        if len(_BAREMES_MILLIMES) > 16:
+            _BAREMES_MILLIMES.clear()
+        entree = _BAREMES_MILLIMES[plan.version] = (plan.bareme, _bareme_millimes(plan.bareme))
+    return entree[1]
+
+
+def irpp_batch(base_mensuelle, bareme=None):
+    """IRPP mensuel sur base annualisée, comme calcul_irpp (une recherche par tranche + un produit)."""
+    bareme = bareme or bareme_millimes()
+    base_annuelle = base_mensuelle * 12
+    i = np.searchsorted(bareme['planchers'], base_annuelle, side='left') - 1
+    atteinte = i >= 0
+    i = np.maximum(i, 0)
+
+    tranche = np.minimum(base_annuelle, bareme['plafonds'][i]) - bareme['planchers'][i]
+    partiel = _arrondi_half_up(tranche * bareme['taux'][i], bareme['diviseur']) * 10
+    irpp_annuel = np.where(atteinte, bareme['cumuls'][i] + partiel, 0)
+    # irpp_annuel / 12 arrondi au centime
+    return _arrondi_half_up(irpp_annuel // 10, 12) * 10
+
+
+def css_batch(brut_imposable, taux):
+    """CSS mensuelle, comme calcul_css."""
+    css = _appliquer_taux(brut_imposable, taux, 2, _arrondi_half_up)
+    return np.where(brut_imposable * 12 > 5000 * MILLIMES, css, 0)
+
+
+def calcul_batch_millimes(table, plan=None):
+    """Calcule tous les bulletins d'une table préparée ; résultats en millimes (int64).
+
+    ``plan`` (voir auto_calculs.plan_regles) vaut par défaut les règles courantes.
+    """
+    plan = plan or plan_regles()
+    salaire_base = table['salaire_base']
+    primes, total_brut = primes_batch(salaire_base, table['annees_anciennete'], plan)
+    if plan.heures_supp_dans_brut:
+        total_brut = total_brut + table['heures_supp']
+    cotisations = cotisations_batch(total_brut, plan)
+    retenue_cnss = cotisations['retenue_cnss']
+
+    brut_imposable = total_brut - retenue_cnss
+    ded_situation = table['chef_famille'] * DED_CHEF_FAMILLE + table['enfants'] * DED_PAR_ENFANT
+    frais_prof = _appliquer_taux(brut_imposable, Decimal('0.10'), 3)
+    base_imposable_nette = np.maximum(brut_imposable - ded_situation - frais_prof, 0)
+
+    irpp = irpp_batch(base_imposable_nette, bareme_millimes(plan))
+    css = css_batch(brut_imposable, plan.css_taux)
+    total_impots = irpp + css
+    salaire_net = total_brut - retenue_cnss - total_impots
+
+    resultats = {
+        'salaire_base': salaire_base,
+        'total_brut': total_brut,
+        'brut_imposable': brut_imposable,
+        'retenue_cnss': retenue_cnss,
+        'total_cotisations_patronales': cotisations['total_cotisations_patronales'],
+        'irpp': irpp,
+        'css': css,
+        'total_impots': total_impots,
+        'salaire_net': salaire_net,
+        'net_a_payer': salaire_net - table['avance'] - table['autres_deductions'],
+        'ded_situation': ded_situation,
+        'frais_prof': frais_prof,
+        'base_imposable_nette': base_imposable_nette,
+    }
+    for k, v in cotisations['salarie'].items():
+        resultats[f'cotisation_{k}'] = v
+    for k, v in cotisations['employeur'].items():
+        resultats[f'patronale_{k}'] = v
+    resultats.update(primes)
+    return resultats
+
+
+# === API publique ===
+def calcul_auto_batch(employes, annee=None, mois=None):
+    """Calcule les bulletins de toute une table d'employés en une passe vectorisée.
+
+    ``employes`` est une liste de dicts ou un dict de colonnes (voir COLONNES_ENTREE),
+    tous de la même période ``annee``/``mois``. Retourne un dict
+    ``{champ: np.ndarray[float64]}`` avec les mêmes clés et les mêmes valeurs que
+    ``calcul_auto`` (primes non accordées à 0).
+    """
+    resultats = calcul_batch_millimes(preparer_table(employes), plan_regles(annee, mois))
+    return {k: v / MILLIMES for k, v in resultats.items()}
+
+
+def calcul_auto_batch_par_periode(employes):
+    """Comme calcul_auto_batch pour une liste d'employés de périodes différentes.
+
+    Les lignes sont regroupées par plan de règles (clés ``annee``/``mois`` de
+    chaque dict) et chaque groupe est calculé en une passe vectorisée.
+    """
+    auto_calculs.version_regles()
+    moteur = auto_calculs.MOTEUR_REGLES
+    plans, groupes = {}, {}
+    for i, employe in enumerate(employes):
+        periode = (employe.get('annee'), employe.get('mois'))
+        plan = plans.get(periode)
+        if plan is None:
+            plan = plans[periode] = moteur.plan(*periode)
+        groupes.setdefault(plan.version, (plan, []))[1].append(i)
+
+    resultats = {}
+    for plan, indices in groupes.values():
+        partiels = calcul_batch_millimes(preparer_table([employes[i] for i in indices]), plan)
+        for k, v in partiels.items():
+            resultats.setdefault(k, np.zeros(len(employes), dtype=np.int64))[indices] = v
+    return {k: v / MILLIMES for k, v in resultats.items()}
+
+
+def iter_bulletins(resultats):
+    """Itère sur les résultats de calcul_auto_batch ligne par ligne (dicts de floats)."""
+    cles = list(resultats)
+    for ligne in zip(*(resultats[k].tolist() for k in cles)):
+        yield dict(zip(cles, ligne))
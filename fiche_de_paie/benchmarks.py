@@ -0,0 +1,435 @@
+# fiche_de_paie/benchmarks.py
+"""Microbenchmarks et suite de performance du moteur de paie.
+
+La suite (``suite_performance``) mesure la latence d'un bulletin, le débit du
+calcul unitaire et vectorisé, le rendu PDF et l'endpoint AJAX sous charge
+concurrente. Elle vérifie d'abord le corpus de référence figé (entrées et
+montants attendus), puis compare les débits à un fichier de référence : une
+baisse au-delà du seuil fait échouer l'exécution.
+"""
+import json
+import os
+import platform
+import random
+import statistics
+import time
+import timeit
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, ROUND_HALF_UP
+
+from .auto_calculs import BARÈME_IRPP, MOTEURS, calcul_auto, calcul_irpp
+from .batch import calcul_auto_batch_par_periode, iter_bulletins
+from .json_rapide import dumps
+from .pdf import generate_pdf_fpdf
+from .resultat import LotResultats, calcul_resultat
+from .simulation import balayage_salaires
+
+DOSSIER_REFERENCES = os.path.join(os.path.dirname(__file__), 'references')
+CORPUS_REFERENCE = os.path.join(DOSSIER_REFERENCES, 'corpus_paie.json')
+PERFORMANCES_REFERENCE = os.path.join(DOSSIER_REFERENCES, 'performances.json')
+SEUIL_REGRESSION = 0.10
+
+# Champs d'entrée du corpus ; les montants attendus sont toutes les autres clés numériques
+ENTREES_CORPUS = (
+    'salaire_base', 'annees_anciennete', 'chef_famille', 'enfants',
+    'avance', 'autres_deductions', 'annee', 'mois', 'heures_supp',
+)
+
+
+def calcul_irpp_par_tranches(salaire_mensuel_net_imposable):
+    """Ancien calcul IRPP (parcours complet du barème), conservé comme référence."""
+    base_imposable_annuelle = Decimal(salaire_mensuel_net_imposable) * 12
+    irpp_annuel = Decimal('0')
+    for min_val, max_val, taux in BARÈME_IRPP:
+        if base_imposable_annuelle > Decimal(str(min_val)):
+            tranche = min(base_imposable_annuelle, Decimal(str(max_val))) - Decimal(str(min_val))
+            irpp_annuel += (tranche * Decimal(str(taux))).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    return (irpp_annuel / 12).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+
+
+def bases_aleatoires(taille, graine=0):
+    """Bases imposables mensuelles au millime, de 0 à 10 000 TND."""
+    rng = random.Random(graine)
+    return [Decimal(rng.randint(0, 10_000_000)) / 1000 for _ in range(taille)]
+
+
+def bench_irpp(iterations=20000, repetitions=5):
+    """Compare le coût par appel (µs) du barème précompilé et de l'ancien parcours."""
+    bases = bases_aleatoires(iterations)
+
+    def mesurer(fonction):
+        meilleur = min(timeit.repeat(lambda: [fonction(b) for b in bases], number=1, repeat=repetitions))
+        return meilleur / iterations * 1e6
+
+    ancien = mesurer(calcul_irpp_par_tranches)
+    nouveau = mesurer(calcul_irpp)
+    return {
+        'iterations': iterations,
+        'par_tranches_us': round(ancien, 3),
+        'precompile_us': round(nouveau, 3),
+        'acceleration': round(ancien / nouveau, 2),
+    }
+
+
+def entrees_aleatoires(taille, graine=0):
+    """Saisies de bulletins pour un même mois et une même société."""
+    rng = random.Random(graine)
+    return [
+        {
+            'nom_prenom': f"Employe {i}", 'matricule': f"M{i:05d}", 'mois': 'Janvier', 'annee': 2025,
+            'salaire_base': Decimal(rng.randint(500_000, 8_000_000)) / 1000,
+            'annees_anciennete': rng.randint(0, 30),
+            'chef_famille': rng.random() < 0.5,
+            'enfants': rng.randint(0, 4),
+        }
+        for i in range(taille)
+    ]
+
+
+def bulletins_aleatoires(taille, graine=0):
+    """Bulletins calculés pour un même mois et une même société."""
+    return [calcul_auto(entrees) for entrees in entrees_aleatoires(taille, graine)]
+
+
+def bench_pdf(iterations=200, repetitions=3):
+    """Compare la latence par bulletin (ms) du rendu classique et du mode gabarit."""
+    bulletins = bulletins_aleatoires(iterations)
+
+    def mesurer(gabarit):
+        def rendre():
+            return [generate_pdf_fpdf(data, gabarit=gabarit) for data in bulletins]
+
+        rendre()  # Construit les gabarits hors mesure
+        meilleur = min(timeit.repeat(rendre, number=1, repeat=repetitions))
+        return meilleur / iterations * 1e3
+
+    classique = mesurer(False)
+    gabarit = mesurer(True)
+    return {
+        'iterations': iterations,
+        'classique_ms': round(classique, 3),
+        'gabarit_ms': round(gabarit, 3),
+        'acceleration': round(classique / gabarit, 2),
+    }
+
+
+# === Moteur entier (millimes) ===
+def verifier_parite_millimes(taille=100_000, graine=0):
+    """Compare les moteurs 'decimal' et 'millimes' de calcul_auto sur ``taille`` entrées aléatoires.
+
+    Retourne la liste des entrées dont les résultats diffèrent (champ ou ordre des clés).
+    """
+    ecarts = []
+    for entrees in entrees_corpus(taille, graine):
+        attendu = calcul_auto(dict(entrees))
+        obtenu = calcul_auto(dict(entrees), 'millimes')
+        attendu.pop('date_generation'), obtenu.pop('date_generation')
+        if obtenu != attendu or list(obtenu) != list(attendu):
+            ecarts.append(entrees)
+    return ecarts
+
+
+def bench_millimes(iterations=20000, repetitions=5):
+    """Compare le coût par bulletin (µs) de calcul_auto sur les deux moteurs."""
+    entrees = entrees_corpus(iterations)
+
+    def mesurer(moteur):
+        meilleur = min(timeit.repeat(
+            lambda: [calcul_auto(dict(e), moteur) for e in entrees], number=1, repeat=repetitions,
+        ))
+        return meilleur / iterations * 1e6
+
+    decimal = mesurer('decimal')
+    millimes = mesurer('millimes')
+    return {
+        'iterations': iterations,
+        'decimal_us': round(decimal, 3),
+        'millimes_us': round(millimes, 3),
+        'acceleration': round(decimal / millimes, 2),
+    }
+
+
+# === Résultats compacts ===
+def _octets_alloues(construire):
+    """Octets encore alloués par le résultat de ``construire()``."""
+    tracemalloc.start()
+    try:
+        avant = tracemalloc.get_traced_memory()[0]
+        resultat = construire()
+        octets = tracemalloc.get_traced_memory()[0] - avant
+    finally:
+        tracemalloc.stop()
+    del resultat
+    return octets
+
+
+def bench_resultats(iterations=2000, repetitions=5):
+    """Compare le dictionnaire de calcul_auto, ResultatBulletin et LotResultats.
+
+    Mémoire par bulletin (octets retenus, entrées non comprises) et coût de
+    sérialisation JSON par bulletin (µs), à l'unité et pour le lot entier.
+    """
+    entrees = entrees_aleatoires(iterations)
+    dictionnaires = [calcul_auto(dict(e), 'millimes') for e in entrees]
+    resultats = [calcul_resultat(e) for e in entrees]
+    lot = LotResultats.calculer(entrees, 2025, 'Janvier')
+
+    def mesurer(serialiser):
+        meilleur = min(timeit.repeat(serialiser, number=1, repeat=repetitions))
+        return round(meilleur / iterations * 1e6, 3)
+
+    return {
+        'iterations': iterations,
+        'dict_octets': _octets_alloues(lambda: [calcul_auto(dict(e), 'millimes') for e in entrees]) // iterations,
+        'resultat_octets': _octets_alloues(lambda: [calcul_resultat(e) for e in entrees]) // iterations,
+        'lot_octets': _octets_alloues(lambda: LotResultats.calculer(entrees, 2025, 'Janvier')) // iterations,
+        'dict_json_us': mesurer(lambda: [dumps(d) for d in dictionnaires]),
+        'resultat_json_us': mesurer(lambda: [r.json() for r in resultats]),
+        'dict_lot_json_us': mesurer(lambda: dumps(dictionnaires)),
+        'lot_json_us': mesurer(lot.json),
+    }
+
+
+# === Corpus de référence figé ===
+def entrees_corpus(taille=200, graine=2025, heures_supp=40):
+    """Entrées du corpus : salaires aléatoires, bornes des primes et des tranches, deux barèmes.
+
+    Les ``heures_supp`` derniers cas portent un montant d'heures supplémentaires
+    (ajouté au brut), dont des montants qui font franchir le seuil de la CSS.
+    """
+    rng = random.Random(graine)
+    limites = ['0', '999.999', '1000', '1999.999', '2000', '416.667', '666.666', '833.334', '1666.667', '5833.334']
+    entrees = []
+    for i in range(taille):
+        salaire = limites[i] if i < len(limites) else f"{rng.randint(0, 12_000_000) / 1000:.3f}"
+        entrees.append({
+            'salaire_base': salaire,
+            'annees_anciennete': rng.randint(0, 40),
+            'chef_famille': rng.random() < 0.5,
+            'enfants': rng.randint(0, 6),
+            'avance': f"{rng.randint(0, 300_000) / 1000:.3f}",
+            'autres_deductions': f"{rng.randint(0, 50_000) / 1000:.3f}",
+            'annee': 2024 if i % 4 == 0 else 2025,
+            'mois': rng.choice(('Janvier', 'Juin', 'Décembre')),
+        })
+
+    # Générateur distinct : les cas précédents restent identiques
+    rng = random.Random(graine + 1)
+    limites = [('400', '16.666'), ('400', '16.667'), ('1999.999', '0.001'), ('0', '250')]
+    for i in range(heures_supp):
+        if i < len(limites):
+            salaire, montant = limites[i]
+        else:
+            salaire, montant = f"{rng.randint(0, 8_000_000) / 1000:.3f}", f"{rng.randint(1, 1_500_000) / 1000:.3f}"
+        entrees.append({
+            'salaire_base': salaire,
+            'annees_anciennete': rng.randint(0, 40),
+            'chef_famille': rng.random() < 0.5,
+            'enfants': rng.randint(0, 6),
+            'avance': '0.000',
+            'autres_deductions': '0.000',
+            'heures_supp': montant,
+            'annee': 2024 if i % 4 == 0 else 2025,
+            'mois': rng.choice(('Janvier', 'Juin', 'Décembre')),
+        })
+    return entrees
+
+
+def _montants(data):
+    return {
+        k: v for k, v in data.items()
+        if k not in ENTREES_CORPUS and isinstance(v, float)
+    }
+
+
+def figer_corpus(chemin=CORPUS_REFERENCE, taille=200):
+    """Écrit le corpus de référence (entrées et montants calculés par les règles actuelles)."""
+    corpus = [
+        {'entrees': entrees, 'attendu': _montants(calcul_auto(dict(entrees)))}
+        for entrees in entrees_corpus(taille)
+    ]
+    os.makedirs(os.path.dirname(chemin), exist_ok=True)
+    # Un bulletin par ligne : les différences restent lisibles dans l'historique
+    with open(chemin, 'w', encoding='utf-8') as f:
+        f.write('[\n')
+        f.write(',\n'.join(json.dumps(cas, ensure_ascii=False, sort_keys=True) for cas in corpus))
+        f.write('\n]\n')
+    return len(corpus)
+
+
+def charger_corpus(chemin=CORPUS_REFERENCE):
+    with open(chemin, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def ecarts_corpus(corpus):
+    """Écarts entre les montants attendus du corpus et calcul_auto (deux moteurs) / le moteur vectorisé.
+
+    Retourne une liste de ``(index, moteur, champ, attendu, obtenu)`` (vide si tout concorde).
+    """
+    ecarts = []
+    for i, cas in enumerate(corpus):
+        for moteur in MOTEURS:
+            obtenu = calcul_auto(dict(cas['entrees']), moteur)
+            for champ, attendu in cas['attendu'].items():
+                if obtenu.get(champ) != attendu:
+                    ecarts.append((i, f'calcul_auto/{moteur}', champ, attendu, obtenu.get(champ)))
+
+    lot = iter_bulletins(calcul_auto_batch_par_periode([cas['entrees'] for cas in corpus]))
+    for i, (cas, obtenu) in enumerate(zip(corpus, lot)):
+        for champ, valeur in obtenu.items():
+            if champ in ENTREES_CORPUS:
+                continue
+            attendu = cas['attendu'].get(champ, 0.0)
+            if valeur != attendu:
+                ecarts.append((i, 'batch', champ, attendu, valeur))
+    return ecarts
+
+
+# === Mesures ===
+def _percentile(valeurs, p):
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(round(p / 100 * (len(valeurs) - 1))))]
+
+
+def mesurer_bulletin(entrees):
+    """Latence de calcul_auto par bulletin (µs, p50/p95) et débit (bulletins/s) de chaque moteur."""
+    resultats = {}
+    for moteur in MOTEURS:
+        durees = []
+        for e in entrees:
+            debut = time.perf_counter()
+            calcul_auto(dict(e), moteur)
+            durees.append(time.perf_counter() - debut)
+        suffixe = '' if moteur == 'decimal' else f'_{moteur}'
+        resultats.update({
+            f'bulletin{suffixe}_p50_us': round(_percentile(durees, 50) * 1e6, 1),
+            f'bulletin{suffixe}_p95_us': round(_percentile(durees, 95) * 1e6, 1),
+            f'debit_unitaire{suffixe}': round(len(durees) / sum(durees)),
+        })
+    return resultats
+
+
+def mesurer_batch(entrees, taille=20000):
+    """Débit du moteur vectorisé (bulletins/s) sur ``taille`` employés."""
+    table = [entrees[i % len(entrees)] for i in range(taille)]
+    duree = timeit.timeit(lambda: calcul_auto_batch_par_periode(table), number=1)
+    return {'debit_batch': round(taille / duree)}
+
+
+def mesurer_balayage(points=100_000):
+    """Balayage de salaires du simulateur : durée (ms) et débit (points/s) pour ``points`` salaires."""
+    duree = timeit.timeit(lambda: balayage_salaires(500, 500 + points - 1), number=1)
+    return {'balayage_ms': round(duree * 1e3, 2), 'debit_balayage': round(points / duree)}
+
+
+def mesurer_pdf(iterations=100):
+    """Rendu PDF (gabarit, classique et compact) : ms et octets par bulletin, débit en bulletins/s."""
+    bulletins = bulletins_aleatoires(iterations)
+    resultats = {}
+    for mode, gabarit, compact in (('gabarit', True, False), ('classique', False, False), ('compact', True, True)):
+        # Premier passage hors mesure : gabarits construits, tailles relevées
+        octets = [len(generate_pdf_fpdf(data, gabarit=gabarit, compact=compact)) for data in bulletins]
+        duree = timeit.timeit(
+            lambda: [generate_pdf_fpdf(data, gabarit=gabarit, compact=compact) for data in bulletins], number=1,
+        )
+        resultats[f'pdf_{mode}_ms'] = round(duree / iterations * 1e3, 3)
+        resultats[f'pdf_{mode}_octets'] = round(statistics.mean(octets))
+        resultats[f'debit_pdf_{mode}'] = round(iterations / duree)
+    return resultats
+
+
+def mesurer_ajax(entrees, concurrence=8, requetes=400):
+    """Endpoint calcul_auto_ajax sous ``concurrence`` clients simultanés (requêtes/s, latence p95)."""
+    from django.test import Client
+    from django.test.utils import override_settings
+    from django.urls import reverse
+
+    from .cache import cache_calculs
+
+    url = reverse('calcul_auto_ajax')
+    corps = [
+        {k: str(v).lower() if isinstance(v, bool) else str(v) for k, v in entrees[i % len(entrees)].items()}
+        for i in range(requetes)
+    ]
+    durees = []
+
+    def client_concurrent(indices):
+        client = Client()
+        for i in indices:
+            debut = time.perf_counter()
+            reponse = client.post(url, corps[i])
+            durees.append(time.perf_counter() - debut)
+            if reponse.status_code != 200:
+                raise RuntimeError(f"calcul_auto_ajax : HTTP {reponse.status_code}")
+
+    cache_calculs.vider()
+    with override_settings(ALLOWED_HOSTS=['testserver']), ThreadPoolExecutor(concurrence) as pool:
+        debut = time.perf_counter()
+        list(pool.map(client_concurrent, [range(c, requetes, concurrence) for c in range(concurrence)]))
+        duree = time.perf_counter() - debut
+    return {
+        'ajax_concurrence': concurrence,
+        'ajax_p95_ms': round(_percentile(durees, 95) * 1e3, 2),
+        'debit_ajax': round(requetes / duree),
+    }
+
+
+def suite_performance(ajax=True, pdf=True, tours=3):
+    """Vérifie le corpus de référence puis mesure l'ensemble des indicateurs.
+
+    Chaque indicateur garde sa meilleure valeur sur ``tours`` passages (débit
+    maximal, durées minimales), ce qui limite l'effet du bruit de la machine.
+    """
+    corpus = charger_corpus()
+    ecarts = ecarts_corpus(corpus)
+    if ecarts:
+        raise ValueError(f"{len(ecarts)} écarts avec le corpus de référence, ex. {ecarts[0]}")
+
+    entrees = [cas['entrees'] for cas in corpus]
+    mesures = {}
+    for _ in range(tours):
+        tour = {}
+        tour.update(mesurer_bulletin(entrees))
+        tour.update(mesurer_batch(entrees))
+        tour.update(mesurer_balayage())
+        if pdf:
+            tour.update(mesurer_pdf())
+        if ajax:
+            tour.update(mesurer_ajax(entrees))
+        for nom, valeur in tour.items():
+            if nom not in mesures:
+                mesures[nom] = valeur
+            elif nom.startswith('debit_'):
+                mesures[nom] = max(mesures[nom], valeur)
+            elif nom.endswith(('_ms', '_us')):
+                mesures[nom] = min(mesures[nom], valeur)
+    return mesures
+
+
+# === Référence et régressions ===
+def comparer_reference(mesures, reference, seuil=SEUIL_REGRESSION):
+    """Débits (indicateurs ``debit_*``) en baisse de plus de ``seuil`` par rapport à la référence.
+
+    Retourne une liste de ``(indicateur, reference, mesure, variation)``.
+    """
+    regressions = []
+    for nom, valeur_reference in reference.items():
+        if not nom.startswith('debit_') or nom not in mesures or not valeur_reference:
+            continue
+        variation = mesures[nom] / valeur_reference - 1
+        if variation < -seuil:
+            regressions.append((nom, valeur_reference, mesures[nom], round(variation, 3)))
+    return regressions
+
+
+def charger_reference(chemin=PERFORMANCES_REFERENCE):
+    with open(chemin, encoding='utf-8') as f:
+        return json.load(f)['mesures']
+
+
+def enregistrer_reference(mesures, chemin=PERFORMANCES_REFERENCE):
+    with open(chemin, 'w', encoding='utf-8') as f:
+        json.dump({'machine': platform.node(), 'mesures': mesures}, f, indent=2, sort_keys=True)
+        f.write('\n')
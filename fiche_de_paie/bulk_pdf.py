@@ -0,0 +1,98 @@
+# fiche_de_paie/bulk_pdf.py
+"""Génération en masse des bulletins PDF.
+
+Le rendu FPDF est réparti sur un pool de processus ; les PDF terminés sont
+écrits au fil de l'eau dans une archive ZIP produite morceau par morceau.
+Le nombre de bulletins en vol est borné : la mémoire reste constante quel
+que soit l'effectif.
+"""
+import io
+import os
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .import_employes import ecrire_rapport_erreurs
+from .pdf import generate_pdf_fpdf, nom_fichier_bulletin
+from .resultat import calcul_resultat
+
+
+# === Rendu parallèle ===
+def _rendre_bulletin(numero, donnees, compact=False):
+    """Calcule et rend un bulletin (exécuté dans un processus du pool)."""
+    data = calcul_resultat(donnees)
+    return numero, nom_fichier_bulletin(data), generate_pdf_fpdf(data, gabarit=True, compact=compact)
+
+
+def rendre_bulletins(lignes, processus=None, compact=False):
+    """Rend les bulletins en parallèle et les produit dans l'ordre d'achèvement.
+
+    ``lignes`` est un itérable de ``(numero, donnees)`` consommé paresseusement ;
+    au plus deux bulletins par processus sont en cours à un instant donné.
+    """
+    processus = processus or os.cpu_count() or 1
+    fenetre = 2 * processus
+    pool = ProcessPoolExecutor(max_workers=processus)
+    en_cours = set()
+    try:
+        for numero, donnees in lignes:
+            en_cours.add(pool.submit(_rendre_bulletin, numero, donnees, compact))
+            if len(en_cours) >= fenetre:
+                termines, en_cours = wait(en_cours, return_when=FIRST_COMPLETED)
+                for future in termines:
+                    yield future.result()
+        while en_cours:
+            termines, en_cours = wait(en_cours, return_when=FIRST_COMPLETED)
+            for future in termines:
+                yield future.result()
+    finally:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+# === Archive ZIP en flux ===
+class _TamponZip(io.RawIOBase):
+    """Destination non positionnable pour ZipFile, vidée après chaque écriture."""
+
+    def __init__(self):
+        self._morceaux = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._morceaux.append(bytes(b))
+        return len(b)
+
+    def vider(self):
+        contenu = b''.join(self._morceaux)
+        self._morceaux.clear()
+        return contenu
+
+
+def iter_zip_bulletins(employes, processus=None, compact=False):
+    """Produit les octets d'une archive ZIP de bulletins, au fur et à mesure du rendu.
+
+    ``employes`` est l'itérable produit par ``import_employes.lire_employes``. Les lignes
+    invalides sont listées dans ``erreurs.csv`` à la fin de l'archive. Avec ``compact``,
+    chaque bulletin est un PDF 1.5 compact (chaque fichier garde ses propres ressources).
+    """
+    erreurs = []
+
+    def lignes_valides():
+        for numero, donnees, erreurs_ligne in employes:
+            if donnees is None:
+                erreurs.append((numero, erreurs_ligne))
+            else:
+                yield numero, donnees
+
+    tampon = _TamponZip()
+    # Les PDF sont déjà compressés par FPDF : stockage sans recompression
+    with zipfile.ZipFile(tampon, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for numero, nom_fichier, pdf_bytes in rendre_bulletins(lignes_valides(), processus, compact):
+            archive.writestr(f"{numero:06d}_{nom_fichier}", pdf_bytes)
+            yield tampon.vider()
+
+        if erreurs:
+            rapport = io.StringIO()
+            ecrire_rapport_erreurs(rapport, erreurs)
+            archive.writestr('erreurs.csv', rapport.getvalue().encode('utf-8'))
+    yield tampon.vider()
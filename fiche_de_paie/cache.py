@@ -0,0 +1,198 @@
+# fiche_de_paie/cache.py
+"""Cache LRU + TTL des calculs de bulletin.
+
+Il sert les API de calcul sans émission, très répétées : calcul_auto_ajax
+(une requête par frappe dans le formulaire) et calcul_auto_lot. Les vues
+d'un bulletin (prévisualisation, export, génération) n'y passent pas : elles
+relisent l'instantané émis ou calculent un ResultatBulletin (instantanes.py).
+
+La clé ne contient que les entrées financières normalisées (pas le nom, le
+matricule ni la date) et la version du plan de règles de la période : toute
+modification des règles, seuils, taux ou du barème vide le cache.
+CacheLRU, sans cette invalidation, range aussi les états du recalcul
+incrémental (calcul_incremental.MagasinEtats).
+"""
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+
+from .auto_calculs import calcul_auto, plan_regles, version_regles
+from .regles import booleen_saisi
+
+# Entrées financières lues par calcul_auto
+CHAMPS_FINANCIERS = (
+    'salaire_base', 'annees_anciennete', 'chef_famille',
+    'enfants', 'avance', 'autres_deductions', 'heures_supp',
+)
+# Période du bulletin : sélectionne le plan de règles
+CHAMPS_PERIODE = ('annee', 'mois')
+
+
+def cle_calcul(data):
+    """Normalise les entrées financières d'un bulletin comme le fait calcul_auto."""
+    return (
+        Decimal(str(data.get('salaire_base', 0))),
+        int(data.get('annees_anciennete', 0)),
+        booleen_saisi(data.get('chef_famille', False)),
+        int(data.get('enfants', 0)),
+        Decimal(str(data.get('avance', 0))),
+        Decimal(str(data.get('autres_deductions', 0))),
+        Decimal(str(data.get('heures_supp') or 0)),
+        plan_regles(data.get('annee'), data.get('mois')).version,
+    )
+
+
+class CacheLRU:
+    """Dictionnaire borné (LRU) avec expiration (TTL), sûr entre threads."""
+
+    def __init__(self, taille_max, ttl):
+        self.taille_max = taille_max
+        self.ttl = ttl
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+
+    def _lire(self, cle, maintenant):
+        """``(True, valeur)`` si ``cle`` est présente et non expirée, sinon ``(False, None)`` ; verrou tenu."""
+        entree = self._entrees.get(cle)
+        if entree is not None:
+            expire_le, valeur = entree
+            if expire_le > maintenant:
+                self._entrees.move_to_end(cle)
+                self.hits += 1
+                return True, valeur
+            del self._entrees[cle]
+            self.expirations += 1
+        self.misses += 1
+        return False, None
+
+    def _ecrire(self, cle, valeur, maintenant):
+        """Range ``valeur`` sous ``cle`` et évince les plus anciennes entrées ; verrou tenu."""
+        self._entrees[cle] = (maintenant + self.ttl, valeur)
+        self._entrees.move_to_end(cle)
+        while len(self._entrees) > self.taille_max:
+            self._entrees.popitem(last=False)
+            self.evictions += 1
+
+    def lire(self, cle, defaut=None):
+        """Valeur rangée sous ``cle``, ou ``defaut`` si elle est absente ou expirée."""
+        with self._verrou:
+            trouve, valeur = self._lire(cle, time.monotonic())
+        return valeur if trouve else defaut
+
+    def ecrire(self, cle, valeur):
+        with self._verrou:
+            self._ecrire(cle, valeur, time.monotonic())
+
+    def vider(self):
+        with self._verrou:
+            self._entrees.clear()
+
+    def _stats(self):
+        total = self.hits + self.misses
+        return {
+            'taille': len(self._entrees),
+            'taille_max': self.taille_max,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'ratio_hits': round(self.hits / total, 4) if total else 0.0,
+            'expirations': self.expirations,
+            'evictions': self.evictions,
+        }
+
+    def stats(self):
+        with self._verrou:
+            return self._stats()
+
+
+class CacheCalculs(CacheLRU):
+    """Cache des calculs, vidé à chaque changement de version des règles."""
+
+    def __init__(self, taille_max=2048, ttl=300):
+        super().__init__(taille_max, ttl)
+        self._version = None
+        self.invalidations = 0
+
+    def obtenir(self, cle, calculer):
+        """Retourne la valeur en cache pour ``cle`` ou la calcule avec ``calculer()``."""
+        version = version_regles()
+        maintenant = time.monotonic()
+        with self._verrou:
+            if version != self._version:
+                if self._entrees:
+                    self.invalidations += 1
+                self._entrees.clear()
+                self._version = version
+            trouve, valeur = self._lire(cle, maintenant)
+            if trouve:
+                return valeur
+
+        valeur = calculer()
+
+        with self._verrou:
+            if version == self._version:
+                self._ecrire(cle, valeur, maintenant)
+        return valeur
+
+    def _stats(self):
+        stats = super()._stats()
+        stats['version_regles'] = self._version
+        stats['invalidations'] = self.invalidations
+        return stats
+
+
+cache_calculs = CacheCalculs(
+    taille_max=getattr(settings, 'PAIE_CACHE_TAILLE', 2048),
+    ttl=getattr(settings, 'PAIE_CACHE_TTL', 300),
+)
+
+
+def calcul_auto_cache(data, moteur=None):
+    """Équivalent de calcul_auto servi depuis le cache de calcul_auto_ajax et calcul_auto_lot.
+
+    ``moteur`` vaut par défaut ``settings.PAIE_MOTEUR`` ('decimal') ; les deux
+    moteurs donnant les mêmes résultats, il ne fait pas partie de la clé.
+    """
+    cle = cle_calcul(data)
+    moteur = moteur or getattr(settings, 'PAIE_MOTEUR', 'decimal')
+
+    def calculer():
+        entrees = {k: data.get(k, 0) for k in CHAMPS_FINANCIERS}
+        entrees.update({k: data.get(k) for k in CHAMPS_PERIODE})
+        resultat = calcul_auto(entrees, moteur)
+        # Seuls les montants calculés sont conservés (salaire_base est normalisé en float)
+        return {
+            k: v for k, v in resultat.items()
+            if k == 'salaire_base'
+            or (k not in CHAMPS_FINANCIERS and k not in CHAMPS_PERIODE and k != 'date_generation')
+        }
+
+    data.update(cache_calculs.obtenir(cle, calculer))
+    data['date_generation'] = datetime.now().strftime('%d/%m/%Y')
+    return data
+
+
+def calcul_auto_cache_lot(employes, moteur=None):
+    """calcul_auto_cache appliqué à une liste de dicts d'employés.
+
+    Une entrée invalide n'interrompt pas le lot : chaque résultat vaut
+    ``{'success': True, 'data': {...}}`` ou ``{'success': False, 'error': '...'}``.
+    """
+    resultats = []
+    for employe in employes:
+        if not isinstance(employe, dict):
+            resultats.append({'success': False, 'error': 'Objet JSON attendu'})
+            continue
+        try:
+            resultats.append({'success': True, 'data': calcul_auto_cache(dict(employe), moteur)})
+        except (ValueError, ArithmeticError, TypeError) as e:
+            resultats.append({'success': False, 'error': str(e)})
+    return resultats
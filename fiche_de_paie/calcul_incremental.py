@@ -0,0 +1,219 @@
+# fiche_de_paie/calcul_incremental.py
+"""Recalcul incrémental du formulaire de bulletin.
+
+Le calcul de calcul_auto est découpé en étapes dont les dépendances sont
+déclarées (ETAPES). Le serveur garde l'état de chaque saisie (entrées et
+sorties de chaque étape) sous un identifiant ; le formulaire n'envoie plus que
+cet identifiant et les champs modifiés. Seules les étapes dont une dépendance
+a changé sont recalculées — modifier ``enfants`` ne touche ni les primes ni
+les cotisations — et une étape dont les sorties ne changent pas arrête la
+propagation. La réponse ne contient que les sorties modifiées.
+
+Le plan de règles de la période est une dépendance comme les autres : une
+période ou des règles modifiées recalculent les étapes qui en dépendent.
+Résultats identiques à calcul_auto (moteur Decimal).
+"""
+import hashlib
+from decimal import Decimal
+
+from django.conf import settings
+
+from .auto_calculs import (
+    CalculateurPaieAuto, calcul_cotisations, calcul_css, calcul_irpp,
+    deduction_situation, frais_professionnels, plan_regles,
+)
+from .cache import CHAMPS_FINANCIERS, CHAMPS_PERIODE, CacheLRU
+from .regles import booleen_saisi
+
+ZERO = Decimal('0')
+
+
+class EtatInconnu(KeyError):
+    """Identifiant d'état absent du magasin (inconnu ou expiré)."""
+
+
+# Normalisation des entrées, comme calcul_auto
+NORMALISATIONS = {
+    'salaire_base': lambda v: Decimal(str(v)),
+    'annees_anciennete': int,
+    'chef_famille': booleen_saisi,
+    'enfants': int,
+    'avance': lambda v: Decimal(str(v)),
+    'autres_deductions': lambda v: Decimal(str(v)),
+    'heures_supp': lambda v: Decimal(str(v or 0)),
+}
+
+
+def normaliser_entrees(data, entrees=None):
+    """Entrées de calcul de ``data``, appliquées sur ``entrees`` (état précédent) s'il est donné."""
+    resultat = dict(entrees) if entrees is not None else {}
+    for champ in CHAMPS_FINANCIERS:
+        if champ in data:
+            resultat[champ] = NORMALISATIONS[champ](data[champ])
+        elif champ not in resultat:
+            resultat[champ] = NORMALISATIONS[champ](0)
+    for champ in CHAMPS_PERIODE:
+        if champ in data:
+            resultat[champ] = data[champ] if data[champ] not in ('', None) else None
+        else:
+            resultat.setdefault(champ, None)
+    return resultat
+
+
+# === Étapes ===
+def _gains(valeurs, plan):
+    calculateur = CalculateurPaieAuto(
+        valeurs['salaire_base'], valeurs['annees_anciennete'], plan, valeurs['heures_supp'],
+    )
+    resultats = calculateur.calculer_tous_les_gains()
+    sorties = {prime: gain['montant'] for prime, gain in resultats['gains'].items()}
+    sorties['total_brut'] = resultats['total_brut']
+    return sorties
+
+
+def _cotisations(valeurs, plan):
+    cotisations = calcul_cotisations(valeurs['total_brut'], plan)
+    sorties = {f'cotisation_{k}': v for k, v in cotisations['salarie'].items()}
+    sorties.update({f'patronale_{k}': v for k, v in cotisations['employeur'].items()})
+    sorties.update({
+        'retenue_cnss': cotisations['retenue_cnss'],
+        'total_cotisations_patronales': cotisations['total_cotisations_patronales'],
+        'brut_imposable': valeurs['total_brut'] - cotisations['retenue_cnss'],
+    })
+    return sorties
+
+
+def _deductions(valeurs, plan):
+    return {'ded_situation': deduction_situation(valeurs['chef_famille'], valeurs['enfants'])}
+
+
+def _impots(valeurs, plan):
+    brut_imposable = valeurs['brut_imposable']
+    frais_prof = frais_professionnels(brut_imposable)
+    base_imposable_nette = max(brut_imposable - valeurs['ded_situation'] - frais_prof, ZERO)
+    irpp = calcul_irpp(base_imposable_nette, plan.bareme)
+    css = calcul_css(brut_imposable, plan.css_taux)
+    return {
+        'frais_prof': frais_prof,
+        'base_imposable_nette': base_imposable_nette,
+        'irpp': irpp,
+        'css': css,
+        'total_impots': irpp + css,
+    }
+
+
+def _net(valeurs, plan):
+    salaire_net = valeurs['total_brut'] - valeurs['retenue_cnss'] - valeurs['total_impots']
+    return {
+        'salaire_net': salaire_net,
+        'net_a_payer': salaire_net - valeurs['avance'] - valeurs['autres_deductions'],
+    }
+
+
+# (étape, dépendances, fonction) dans l'ordre du calcul ; 'plan' désigne le plan de règles
+ETAPES = (
+    ('gains', ('salaire_base', 'annees_anciennete', 'heures_supp', 'plan'), _gains),
+    ('cotisations', ('total_brut', 'plan'), _cotisations),
+    ('deductions', ('chef_famille', 'enfants'), _deductions),
+    ('impots', ('brut_imposable', 'ded_situation', 'plan'), _impots),
+    ('net', ('total_brut', 'retenue_cnss', 'total_impots', 'avance', 'autres_deductions'), _net),
+)
+
+
+class EtatCalcul:
+    """Entrées normalisées, version du plan et sorties de chaque étape d'une saisie."""
+    __slots__ = ('entrees', 'version', 'sorties')
+
+    def __init__(self, entrees, version, sorties):
+        self.entrees = entrees
+        self.version = version
+        self.sorties = sorties
+
+    @property
+    def identifiant(self):
+        """Identifiant déterminé par le contenu : une même saisie retrouve le même état."""
+        contenu = repr((sorted(self.entrees.items()), self.version))
+        return hashlib.sha256(contenu.encode('utf-8')).hexdigest()[:24]
+
+    def resultats(self):
+        """Toutes les sorties, en float comme calcul_auto."""
+        return {cle: float(v) for sorties in self.sorties.values() for cle, v in sorties.items()}
+
+
+def recalculer(precedent, entrees):
+    """Nouvel état pour ``entrees`` à partir de ``precedent`` (None : calcul complet).
+
+    Retourne ``(etat, modifies, supprimes, etapes)`` : sorties modifiées (en
+    float), sorties disparues (prime sous son seuil) et étapes recalculées.
+    """
+    plan = plan_regles(entrees['annee'], entrees['mois'])
+    if precedent is None:
+        changes = set(entrees) | {'plan'}
+    else:
+        changes = {cle for cle, valeur in entrees.items() if precedent.entrees.get(cle) != valeur}
+        if plan.version != precedent.version:
+            changes.add('plan')
+
+    valeurs = dict(entrees)
+    sorties = {}
+    modifies, supprimes, etapes = {}, [], []
+    for nom, dependances, fonction in ETAPES:
+        anciennes = precedent.sorties[nom] if precedent is not None else {}
+        if precedent is None or changes.intersection(dependances):
+            nouvelles = fonction(valeurs, plan)
+            etapes.append(nom)
+            for cle, valeur in nouvelles.items():
+                if cle not in anciennes or anciennes[cle] != valeur:
+                    changes.add(cle)
+                    modifies[cle] = float(valeur)
+            for cle in anciennes.keys() - nouvelles.keys():
+                changes.add(cle)
+                supprimes.append(cle)
+        else:
+            nouvelles = anciennes
+        sorties[nom] = nouvelles
+        valeurs.update(nouvelles)
+    return EtatCalcul(entrees, plan.version, sorties), modifies, sorted(supprimes), etapes
+
+
+class MagasinEtats(CacheLRU):
+    """États de saisie par identifiant, bornés (LRU) avec expiration (TTL), sûrs entre threads."""
+
+    def __init__(self, taille_max=4096, ttl=1800):
+        super().__init__(taille_max, ttl)
+
+    def lire(self, identifiant):
+        """État enregistré sous ``identifiant`` ; EtatInconnu s'il est absent ou expiré."""
+        etat = super().lire(identifiant)
+        if etat is None:
+            raise EtatInconnu(identifiant)
+        return etat
+
+    def enregistrer(self, etat):
+        identifiant = etat.identifiant
+        self.ecrire(identifiant, etat)
+        return identifiant
+
+
+magasin_etats = MagasinEtats(
+    taille_max=getattr(settings, 'PAIE_DELTA_ETATS', 4096),
+    ttl=getattr(settings, 'PAIE_DELTA_TTL', 1800),
+)
+
+
+def calcul_delta(modifications, identifiant=None, magasin=None):
+    """Applique ``modifications`` à l'état ``identifiant`` (saisie complète si None).
+
+    Retourne ``{'etat', 'modifies', 'supprimes', 'etapes'}`` ; EtatInconnu si
+    l'état a expiré (le client renvoie alors la saisie complète).
+    """
+    magasin = magasin or magasin_etats
+    precedent = magasin.lire(identifiant) if identifiant else None
+    entrees = normaliser_entrees(modifications, precedent.entrees if precedent is not None else None)
+    etat, modifies, supprimes, etapes = recalculer(precedent, entrees)
+    return {
+        'etat': magasin.enregistrer(etat),
+        'modifies': modifies,
+        'supprimes': supprimes,
+        'etapes': etapes,
+    }
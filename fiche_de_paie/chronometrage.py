@@ -0,0 +1,149 @@
+# fiche_de_paie/chronometrage.py
+"""Chronométrage par étape des vues de paie : en-tête Server-Timing, journal et percentiles.
+
+Activé par ``settings.PAIE_SERVER_TIMING``. Une vue décorée par
+``chronometrer`` découpe son traitement avec ``etape(request, nom)`` ; la
+réponse porte alors un en-tête ``Server-Timing`` (une entrée par étape, plus
+``total``), chaque requête est journalisée en JSON (logger
+``fiche_de_paie.chronometrage``) avec le nombre de bulletins et la taille du
+PDF, et les durées alimentent des percentiles agrégés dans le processus.
+
+Désactivé, le décorateur appelle directement la vue et ``etape`` retourne un
+contexte vide partagé : le surcoût se limite à deux lectures d'attribut.
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+TAILLE_FENETRE = 1024  # dernières durées conservées par vue et par étape
+PERCENTILES = (50, 95, 99)
+
+_INACTIF = nullcontext()
+
+
+def _percentile(valeurs, p):
+    valeurs = sorted(valeurs)
+    return valeurs[min(len(valeurs) - 1, int(round(p / 100 * (len(valeurs) - 1))))]
+
+
+class Chronometre:
+    """Durées des étapes d'une requête et grandeurs associées."""
+    __slots__ = ('etapes', 'bulletins', 'octets_pdf', '_debut')
+
+    def __init__(self):
+        self.etapes = []
+        self.bulletins = 0
+        self.octets_pdf = 0
+        self._debut = time.perf_counter()
+
+    @contextmanager
+    def etape(self, nom):
+        debut = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.etapes.append((nom, time.perf_counter() - debut))
+
+    def total(self):
+        return time.perf_counter() - self._debut
+
+    def server_timing(self, total):
+        entrees = [f"{nom};dur={duree * 1e3:.3f}" for nom, duree in self.etapes]
+        entrees.append(f"total;dur={total * 1e3:.3f}")
+        return ', '.join(entrees)
+
+
+class StatistiquesEtapes:
+    """Percentiles des durées par vue et par étape, sur une fenêtre glissante, sûrs entre threads."""
+
+    def __init__(self, taille_fenetre=TAILLE_FENETRE):
+        self.taille_fenetre = taille_fenetre
+        self._durees = {}
+        self._vues = {}
+        self._verrou = threading.Lock()
+
+    def enregistrer(self, vue, chrono, total):
+        with self._verrou:
+            compteurs = self._vues.setdefault(vue, {'requetes': 0, 'bulletins': 0, 'octets_pdf': 0})
+            compteurs['requetes'] += 1
+            compteurs['bulletins'] += chrono.bulletins
+            compteurs['octets_pdf'] += chrono.octets_pdf
+            for nom, duree in (*chrono.etapes, ('total', total)):
+                fenetre = self._durees.get((vue, nom))
+                if fenetre is None:
+                    fenetre = self._durees[(vue, nom)] = deque(maxlen=self.taille_fenetre)
+                fenetre.append(duree)
+
+    def vider(self):
+        with self._verrou:
+            self._durees.clear()
+            self._vues.clear()
+
+    def stats(self):
+        """``{vue: {requetes, bulletins, octets_pdf, etapes: {etape: {nombre, moyenne_ms, p50_ms, ...}}}}``."""
+        with self._verrou:
+            durees = {cle: list(fenetre) for cle, fenetre in self._durees.items()}
+            vues = {vue: dict(compteurs) for vue, compteurs in self._vues.items()}
+        for vue in vues.values():
+            vue['etapes'] = {}
+        for (vue, nom), valeurs in durees.items():
+            etape = {'nombre': len(valeurs), 'moyenne_ms': round(sum(valeurs) / len(valeurs) * 1e3, 3)}
+            for p in PERCENTILES:
+                etape[f'p{p}_ms'] = round(_percentile(valeurs, p) * 1e3, 3)
+            vues[vue]['etapes'][nom] = etape
+        return vues
+
+
+statistiques_etapes = StatistiquesEtapes(getattr(settings, 'PAIE_SERVER_TIMING_FENETRE', TAILLE_FENETRE))
+
+
+# === Vues ===
+def etape(request, nom):
+    """Contexte chronométrant l'étape ``nom`` de la requête (sans effet si le chronométrage est inactif)."""
+    chrono = getattr(request, 'chrono_paie', None)
+    return _INACTIF if chrono is None else chrono.etape(nom)
+
+
+def compter(request, bulletins=0, octets_pdf=0):
+    """Ajoute des bulletins produits et des octets de PDF au chronométrage de la requête."""
+    chrono = getattr(request, 'chrono_paie', None)
+    if chrono is not None:
+        chrono.bulletins += bulletins
+        chrono.octets_pdf += octets_pdf
+
+
+def chronometrer(vue):
+    """Décorateur de vue : en-tête Server-Timing, journal JSON et percentiles si PAIE_SERVER_TIMING."""
+    @wraps(vue)
+    def vue_chronometree(request, *args, **kwargs):
+        if not getattr(settings, 'PAIE_SERVER_TIMING', False):
+            return vue(request, *args, **kwargs)
+
+        chrono = request.chrono_paie = Chronometre()
+        response = vue(request, *args, **kwargs)
+        total = chrono.total()
+        # Réponses en flux : seule la préparation est mesurée, l'en-tête part avant le contenu
+        response['Server-Timing'] = chrono.server_timing(total)
+        statistiques_etapes.enregistrer(vue.__name__, chrono, total)
+        if logger.isEnabledFor(logging.INFO):
+            enregistrement = {
+                'vue': vue.__name__,
+                'methode': request.method,
+                'statut': response.status_code,
+                'etapes_ms': {nom: round(duree * 1e3, 3) for nom, duree in chrono.etapes},
+                'total_ms': round(total * 1e3, 3),
+                'bulletins': chrono.bulletins,
+                'octets_pdf': chrono.octets_pdf,
+            }
+            logger.info(json.dumps(enregistrement), extra={'chronometrage': enregistrement})
+        return response
+
+    return vue_chronometree
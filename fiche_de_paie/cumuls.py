@@ -0,0 +1,112 @@
+# fiche_de_paie/cumuls.py
+"""Cumuls annuels par employé et régularisation de fin d'année.
+
+Le prélèvement mensuel annualise le seul mois courant (× 12) ; l'impôt
+réellement dû n'est connu qu'à partir du revenu de l'année. Les cumuls
+(CumulAnnuel) sont mis à jour de façon incrémentale à chaque bulletin émis, et
+la régularisation de décembre ne relit que ces cumuls.
+"""
+from decimal import Decimal
+
+from django.db import transaction
+
+from .auto_calculs import calcul_css_annuelle, calcul_irpp_annuel, plan_regles
+from .models import CumulAnnuel, Payslip
+from .regles import numero_mois
+
+# Champ cumulé -> clé du bulletin (dictionnaire de calcul_auto)
+CHAMPS_CUMULES = (
+    ('base_imposable', 'base_imposable_nette'),
+    ('brut_imposable', 'brut_imposable'),
+    ('irpp', 'irpp'),
+    ('css', 'css'),
+)
+
+
+def _montants(donnees):
+    return {champ: Decimal(str(donnees.get(cle) or 0)) for champ, cle in CHAMPS_CUMULES}
+
+
+def cumuler_bulletin(bulletin):
+    """Intègre un bulletin enregistré aux cumuls de l'employé pour son année.
+
+    Un bulletin déjà compté pour le même mois est retiré des cumuls : seul
+    l'écart entre les deux bulletins est ajouté. Retourne le CumulAnnuel, ou
+    None si la période du bulletin est incomplète ou s'il n'a pas de matricule
+    (les employés sans matricule d'une société partageraient un même cumul).
+    """
+    numero = numero_mois(bulletin.mois)
+    if not bulletin.matricule or bulletin.annee is None or numero is None:
+        return None
+
+    with transaction.atomic():
+        cumul, _ = CumulAnnuel.objects.select_for_update().get_or_create(
+            matricule=bulletin.matricule, societe=bulletin.societe, annee=bulletin.annee,
+        )
+        precedent = cumul.bulletins.get(str(numero))
+        if precedent == bulletin.pk:
+            return cumul
+
+        ecarts = _montants(bulletin.donnees)
+        if precedent is not None:
+            ancien = Payslip.objects.filter(pk=precedent).values_list('donnees', flat=True).first()
+            if ancien is not None:
+                for champ, montant in _montants(ancien).items():
+                    ecarts[champ] -= montant
+
+        for champ, ecart in ecarts.items():
+            setattr(cumul, champ, getattr(cumul, champ) + ecart)
+        cumul.bulletins[str(numero)] = bulletin.pk
+        cumul.save()
+    return cumul
+
+
+def reconstruire_cumuls(societe, annee):
+    """Recalcule les cumuls d'une société et d'une année à partir des bulletins enregistrés.
+
+    Sert à initialiser les cumuls d'une année commencée avant leur mise en place :
+    le dernier bulletin de chaque employé et de chaque mois est retenu.
+    """
+    CumulAnnuel.objects.filter(societe=societe, annee=annee).delete()
+    retenus = {}
+    for bulletin in Payslip.objects.filter(societe=societe, annee=annee).order_by('cree_le', 'pk'):
+        retenus[(bulletin.matricule, numero_mois(bulletin.mois))] = bulletin
+    for (_, numero), bulletin in retenus.items():
+        if numero is not None:
+            cumuler_bulletin(bulletin)
+    return CumulAnnuel.objects.filter(societe=societe, annee=annee).count()
+
+
+def regularisation_annuelle(cumul):
+    """Impôts dus sur l'année comparés aux retenues mensuelles cumulées.
+
+    Une régularisation positive est à retenir sur le bulletin de décembre,
+    une régularisation négative est à restituer à l'employé.
+    """
+    plan = plan_regles(cumul.annee, 12)
+    irpp_du = calcul_irpp_annuel(cumul.base_imposable, plan.bareme)
+    css_due = calcul_css_annuelle(cumul.brut_imposable, plan.css_taux)
+    regularisation_irpp = irpp_du - cumul.irpp
+    regularisation_css = css_due - cumul.css
+    return {
+        'matricule': cumul.matricule,
+        'societe': cumul.societe,
+        'annee': cumul.annee,
+        'mois_cumules': len(cumul.bulletins),
+        'base_imposable': float(cumul.base_imposable),
+        'brut_imposable': float(cumul.brut_imposable),
+        'irpp_du': float(irpp_du),
+        'irpp_retenu': float(cumul.irpp),
+        'regularisation_irpp': float(regularisation_irpp),
+        'css_due': float(css_due),
+        'css_retenue': float(cumul.css),
+        'regularisation_css': float(regularisation_css),
+        'regularisation': float(regularisation_irpp + regularisation_css),
+    }
+
+
+def regularisations_annuelles(societe, annee):
+    """Régularisation de chaque employé de la société, en une passe sur les cumuls."""
+    cumuls = CumulAnnuel.objects.filter(societe=societe, annee=annee).order_by('matricule')
+    for cumul in cumuls.iterator():
+        yield regularisation_annuelle(cumul)
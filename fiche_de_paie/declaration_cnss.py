@@ -0,0 +1,211 @@
+# fiche_de_paie/declaration_cnss.py
+"""Déclaration CNSS : cotisations salariales et patronales agrégées par ligne.
+
+La déclaration couvre une ou plusieurs paies (PayrollRun) d'une société,
+typiquement les trois mois d'un trimestre. Les bulletins enregistrés sont lus
+en une seule passe, triés par employé : seul le bulletin en vigueur de chaque
+employé et de chaque mois est retenu (celui des cumuls annuels), et la
+mémoire ne contient jamais plus que les bulletins d'un employé. Le fichier est
+produit au fil de la lecture ; les totaux par ligne de cotisation sont
+accumulés dans la même passe et terminent le fichier.
+"""
+import csv
+import io
+from decimal import Decimal
+
+from .exports import TAILLE_LECTURE, _par_morceaux
+from .models import CumulAnnuel, PayrollRun, Payslip
+from .regles import MOIS, numero_mois
+
+# Ligne de cotisation -> libellé ; montants lus dans cotisation_<ligne> / patronale_<ligne>
+LIGNES_COTISATION = (
+    ('assurances', "Assurances sociales"),
+    ('supp', "Cotisation supplémentaire maladie"),
+    ('pensions', "Régime de pensions"),
+    ('chomage', "Assurance chômage"),
+    ('majoration_loi_74_101', "Majoration loi 74-101"),
+)
+TRIMESTRES = {trimestre: (3 * trimestre - 2, 3 * trimestre - 1, 3 * trimestre) for trimestre in range(1, 5)}
+
+ZERO = Decimal('0')
+
+
+def _montant(donnees, cle):
+    return Decimal(str(donnees.get(cle) or 0))
+
+
+def _somme(bulletins, cle):
+    return sum((_montant(donnees, cle) for donnees in bulletins.values()), ZERO)
+
+
+def paies_trimestre(societe, annee, trimestre):
+    """Paies d'une société pour les mois d'un trimestre (1-4), dans l'ordre des mois."""
+    if trimestre not in TRIMESTRES:
+        raise ValueError(f"Trimestre invalide : {trimestre}")
+    paies = [
+        run for run in PayrollRun.objects.filter(societe=societe, annee=annee)
+        if numero_mois(run.mois) in TRIMESTRES[trimestre]
+    ]
+    return sorted(paies, key=lambda run: (numero_mois(run.mois), run.pk))
+
+
+def _bulletins_par_employe(paies):
+    """``(matricule, nom_prenom, {numero_mois: donnees})`` employé par employé, en flux.
+
+    Les employés sans matricule sont distingués par leur nom.
+    """
+    bulletins = (
+        Payslip.objects.filter(run__in=[run.pk for run in paies])
+        .order_by('matricule', 'nom_prenom', 'pk')
+        .values_list('pk', 'matricule', 'nom_prenom', 'societe', 'annee', 'mois', 'donnees')
+        .iterator(chunk_size=TAILLE_LECTURE)
+    )
+    employe, candidats = None, {}
+    for pk, matricule, nom_prenom, societe, annee, mois, donnees in bulletins:
+        cle = (matricule, '' if matricule else nom_prenom)
+        if cle != employe:
+            if candidats:
+                yield _retenus(employe[0], candidats)
+            employe, candidats = cle, {}
+        candidats.setdefault(numero_mois(mois), []).append((pk, nom_prenom, societe, annee, donnees))
+    if candidats:
+        yield _retenus(employe[0], candidats)
+
+
+def _retenus(matricule, candidats):
+    """Bulletin retenu pour chaque mois : celui des cumuls annuels, sinon le dernier émis."""
+    cumul = None
+    retenus = {}
+    for numero, bulletins in candidats.items():
+        retenu = bulletins[-1]
+        if len(bulletins) > 1:
+            # Mois ressaisi : la saisie en vigueur peut être revenue à un bulletin antérieur
+            if cumul is None:
+                _, _, societe, annee, _ = retenu
+                cumul = CumulAnnuel.objects.filter(
+                    matricule=matricule, societe=societe, annee=annee,
+                ).values_list('bulletins', flat=True).first() or {}
+            pk_cumul = cumul.get(str(numero))
+            retenu = next((b for b in bulletins if b[0] == pk_cumul), retenu)
+        retenus[numero] = retenu
+    nom_prenom = max(retenus.values())[1]
+    return matricule, nom_prenom, {numero: retenu[4] for numero, retenu in retenus.items()}
+
+
+class TotauxDeclaration:
+    """Totaux d'une déclaration, accumulés ligne d'employé par ligne d'employé."""
+
+    def __init__(self):
+        self.nb_employes = 0
+        self.nb_bulletins = 0
+        self.assiette = ZERO
+        self.salarie = {ligne: ZERO for ligne, _ in LIGNES_COTISATION}
+        self.employeur = {ligne: ZERO for ligne, _ in LIGNES_COTISATION}
+
+    def ajouter(self, ligne_employe):
+        self.nb_employes += 1
+        self.nb_bulletins += ligne_employe['nb_bulletins']
+        self.assiette += ligne_employe['assiette']
+        for ligne, _ in LIGNES_COTISATION:
+            self.salarie[ligne] += ligne_employe[f'salarie_{ligne}']
+            self.employeur[ligne] += ligne_employe[f'employeur_{ligne}']
+
+    def resume(self):
+        """Récapitulatif JSON-sérialisable : une entrée par ligne de cotisation et les totaux."""
+        total_salarie, total_employeur = sum(self.salarie.values()), sum(self.employeur.values())
+        return {
+            'nb_employes': self.nb_employes,
+            'nb_bulletins': self.nb_bulletins,
+            'assiette': float(self.assiette),
+            'lignes': [
+                {
+                    'ligne': ligne, 'libelle': libelle,
+                    'salarie': float(self.salarie[ligne]),
+                    'employeur': float(self.employeur[ligne]),
+                    'total': float(self.salarie[ligne] + self.employeur[ligne]),
+                }
+                for ligne, libelle in LIGNES_COTISATION
+            ],
+            'total_salarie': float(total_salarie),
+            'total_employeur': float(total_employeur),
+            'total': float(total_salarie + total_employeur),
+        }
+
+
+def lignes_declaration(paies, totaux=None):
+    """Une ligne par employé : brut de chaque mois, assiette et cotisations par ligne.
+
+    Les montants sont des Decimal ; ``totaux`` (TotauxDeclaration) est alimenté
+    au passage.
+    """
+    mois = sorted({numero_mois(run.mois) for run in paies} - {None})
+    for matricule, nom_prenom, bulletins in _bulletins_par_employe(paies):
+        ligne_employe = {'matricule': matricule, 'nom_prenom': nom_prenom, 'nb_bulletins': len(bulletins)}
+        for numero in mois:
+            donnees = bulletins.get(numero)
+            ligne_employe[f'brut_{MOIS[numero - 1]}'] = _montant(donnees, 'total_brut') if donnees else ZERO
+        ligne_employe['assiette'] = _somme(bulletins, 'total_brut')
+        for ligne, _ in LIGNES_COTISATION:
+            ligne_employe[f'salarie_{ligne}'] = _somme(bulletins, f'cotisation_{ligne}')
+            ligne_employe[f'employeur_{ligne}'] = _somme(bulletins, f'patronale_{ligne}')
+        for partie in ('salarie', 'employeur'):
+            ligne_employe[f'total_{partie}'] = sum(ligne_employe[f'{partie}_{ligne}'] for ligne, _ in LIGNES_COTISATION)
+        if totaux is not None:
+            totaux.ajouter(ligne_employe)
+        yield ligne_employe
+
+
+def colonnes_declaration(paies):
+    mois = sorted({numero_mois(run.mois) for run in paies} - {None})
+    return (
+        ['matricule', 'nom_prenom', 'nb_bulletins']
+        + [f'brut_{MOIS[numero - 1]}' for numero in mois]
+        + ['assiette']
+        + [f'{partie}_{ligne}' for partie in ('salarie', 'employeur') for ligne, _ in LIGNES_COTISATION]
+        + ['total_salarie', 'total_employeur']
+    )
+
+
+def iter_declaration_csv(paies, totaux=None, delimiteur=','):
+    """Fichier de déclaration CSV produit en flux : une ligne par employé puis les totaux.
+
+    Le récapitulatif final (une ligne ``TOTAL`` par ligne de cotisation) est
+    aussi disponible dans ``totaux`` une fois le flux consommé.
+    """
+    totaux = totaux if totaux is not None else TotauxDeclaration()
+    colonnes = colonnes_declaration(paies)
+    tampon = io.StringIO()
+    writer = csv.writer(tampon, delimiter=delimiteur)
+
+    def ligne_csv(valeurs):
+        writer.writerow(valeurs)
+        texte = tampon.getvalue()
+        tampon.seek(0)
+        tampon.truncate()
+        return texte
+
+    def lignes():
+        yield ligne_csv(colonnes)
+        for ligne_employe in lignes_declaration(paies, totaux):
+            yield ligne_csv([
+                f"{v:.3f}" if isinstance(v, Decimal) else v for v in (ligne_employe[c] for c in colonnes)
+            ])
+        resume = totaux.resume()
+        yield ligne_csv([])
+        yield ligne_csv(['TOTAL', 'ligne', 'salarie', 'employeur', 'total'])
+        for ligne in resume['lignes']:
+            yield ligne_csv(['TOTAL', ligne['ligne'], *(f"{ligne[k]:.3f}" for k in ('salarie', 'employeur', 'total'))])
+        yield ligne_csv([
+            'TOTAL', 'ensemble',
+            *(f"{resume[k]:.3f}" for k in ('total_salarie', 'total_employeur', 'total')),
+        ])
+
+    return _par_morceaux(lignes())
+
+
+def resume_declaration(paies):
+    """Totaux de la déclaration sans produire le fichier (même passe unique)."""
+    totaux = TotauxDeclaration()
+    for _ in lignes_declaration(paies, totaux):
+        pass
+    return totaux.resume()
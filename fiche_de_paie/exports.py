@@ -0,0 +1,64 @@
+# fiche_de_paie/exports.py
+"""Exports NDJSON des calculs de paie : un objet JSON compact par ligne.
+
+Les lignes sont produites au fil du calcul (lots vectorisés d'un fichier
+d'employés) ou de la lecture (bulletins enregistrés d'une paie) et regroupées
+en morceaux d'environ 64 Ko : le client lit les premiers bulletins pendant que
+les suivants sont calculés, et la mémoire du serveur ne dépend pas du volume.
+"""
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .import_employes import TAILLE_LOT, calculer_employes
+from .models import Payslip
+
+TAILLE_MORCEAU = 64 * 1024
+TAILLE_LECTURE = 500  # bulletins lus par requête
+
+_encodeur = DjangoJSONEncoder(separators=(',', ':'), ensure_ascii=False)
+
+
+def ligne_ndjson(objet):
+    return _encodeur.encode(objet) + '\n'
+
+
+def _par_morceaux(lignes):
+    morceau, taille = [], 0
+    for ligne in lignes:
+        morceau.append(ligne)
+        taille += len(ligne)
+        if taille >= TAILLE_MORCEAU:
+            yield ''.join(morceau)
+            morceau, taille = [], 0
+    if morceau:
+        yield ''.join(morceau)
+
+
+def iter_ndjson_employes(employes, taille_lot=TAILLE_LOT):
+    """NDJSON des bulletins calculés pour les tuples ``(numero, donnees, erreurs)`` de ``lire_employes``.
+
+    Une ligne valide donne ``{"ligne": n, <entrées>, <montants>}``, une ligne
+    rejetée ``{"ligne": n, "erreurs": {...}}``.
+    """
+    def lignes():
+        for numero, donnees, bulletin, erreurs in calculer_employes(employes, taille_lot):
+            if bulletin is None:
+                yield ligne_ndjson({'ligne': numero, 'erreurs': erreurs})
+            else:
+                yield ligne_ndjson({'ligne': numero, **donnees, **bulletin})
+
+    return _par_morceaux(lignes())
+
+
+def iter_ndjson_paie(run):
+    """NDJSON des bulletins enregistrés d'une paie (PayrollRun), sans recalcul."""
+    bulletins = (
+        Payslip.objects.filter(run=run).order_by('pk')
+        .values_list('pk', 'version_regles', 'donnees')
+        .iterator(chunk_size=TAILLE_LECTURE)
+    )
+
+    def lignes():
+        for pk, version, donnees in bulletins:
+            yield ligne_ndjson({'bulletin': pk, 'version_regles': version, **donnees})
+
+    return _par_morceaux(lignes())
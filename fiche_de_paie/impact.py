@@ -0,0 +1,305 @@
+# fiche_de_paie/impact.py
+"""Analyse d'impact d'un changement de règles et recalcul sélectif des bulletins.
+
+Les règles qu'un bulletin met en jeu ne dépendent que de quatre grandeurs,
+conservées et indexées sur chaque Payslip : le salaire de base (primes à
+seuil), les années d'ancienneté (échelon), la base imposable (tranche IRPP)
+et le brut imposable (CSS). La comparaison de deux plans de règles donne les
+zones de ces grandeurs où le calcul peut changer ; seuls les bulletins calculés
+avec l'ancien plan et situés dans ces zones sont relus et recalculés. Le coût
+d'un changement est proportionnel au nombre de bulletins qu'il touche.
+"""
+import copy
+from decimal import ROUND_FLOOR, Decimal
+
+from django.db import transaction
+from django.db.models import Q
+
+from .auto_calculs import REGLES_DATEES, _regles_en_vigueur
+from .auto_config import REGLES_AUTOMATIQUES, SEUILS_AUTOMATIQUES
+from .cumuls import cumuler_bulletin
+from .instantanes import _valeur_json, entrees_bulletin, grandeurs_bulletin
+from .millimes import calcul_auto_millimes
+from .models import CumulAnnuel, Payslip
+from .regles import MoteurRegles, numero_mois
+
+TAILLE_LECTURE = 500
+MILLIME = Decimal('0.001')
+SEUIL_CSS_ANNUEL = Decimal('5000')
+
+# Clés des bulletins qui ne sont pas des montants calculés
+CLES_NON_COMPAREES = ('date_generation',)
+
+
+# === Zones touchées par un changement de plan ===
+def _mensuel(montant_annuel):
+    """Plus grand montant mensuel au millime dont l'annualisation reste sous ``montant_annuel``."""
+    return (Decimal(montant_annuel) / 12).quantize(MILLIME, rounding=ROUND_FLOOR)
+
+
+def _taux_anciennete(echelons, annees):
+    for seuil, taux in echelons:
+        if annees >= seuil:
+            return taux
+    return Decimal('0')
+
+
+def zones_impactees(avant, apres):
+    """Zones ``(motif, champ, minimum, maximum)`` où ``apres`` peut calculer autrement que ``avant``.
+
+    ``champ`` est un champ indexé de Payslip, ou None pour tous les bulletins ;
+    ``minimum`` est inclus, ``maximum`` exclu, None pour une borne ouverte.
+    """
+    if avant.version == apres.version:
+        return []
+    zones = []
+
+    # Primes en pourcentage : [seuil, +inf) au taux de la prime
+    primes_avant = {nom: (taux, seuil) for nom, taux, seuil, _ in avant.primes}
+    primes_apres = {nom: (taux, seuil) for nom, taux, seuil, _ in apres.primes}
+    for nom in dict.fromkeys([*primes_avant, *primes_apres]):
+        a, b = primes_avant.get(nom), primes_apres.get(nom)
+        if a == b:
+            continue
+        if a is None or b is None:
+            seuil = (a or b)[1]
+            zones.append((f"{nom} : prime {'ajoutée' if a is None else 'supprimée'}", 'salaire_base', seuil, None))
+        elif a[0] != b[0]:
+            seuil = None if None in (a[1], b[1]) else min(a[1], b[1])
+            zones.append((f"{nom} : taux {a[0]} -> {b[0]}", 'salaire_base', seuil, None))
+        else:
+            bornes = sorted(s for s in (a[1], b[1]) if s is not None)
+            minimum, maximum = (None, bornes[0]) if len(bornes) == 1 else bornes
+            zones.append((f"{nom} : seuil {a[1]} -> {b[1]}", 'salaire_base', minimum, maximum))
+
+    # Ancienneté : taux constant entre deux seuils d'échelon consécutifs
+    if avant.anciennete != apres.anciennete:
+        seuils = sorted({s for s, _ in avant.anciennete} | {s for s, _ in apres.anciennete})
+        for i, seuil in enumerate(seuils):
+            if _taux_anciennete(avant.anciennete, seuil) != _taux_anciennete(apres.anciennete, seuil):
+                maximum = seuils[i + 1] if i + 1 < len(seuils) else None
+                if zones and zones[-1][1] == 'annees_anciennete' and zones[-1][3] == seuil:
+                    zones[-1] = (zones[-1][0], 'annees_anciennete', zones[-1][2], maximum)
+                else:
+                    zones.append(("prime_anciennete : échelons", 'annees_anciennete', seuil, maximum))
+
+    if avant.cotisations_salarie != apres.cotisations_salarie:
+        zones.append(("cotisations salariales", None, None, None))
+    if avant.cotisations_employeur != apres.cotisations_employeur:
+        zones.append(("cotisations patronales", None, None, None))
+
+    # Barème IRPP : tout bulletin au-delà de la première tranche modifiée
+    # (l'impôt cumulé des tranches supérieures en dépend)
+    tranches_avant, tranches_apres = avant.bareme[1], apres.bareme[1]
+    if tranches_avant != tranches_apres:
+        i = next(
+            (i for i, (a, b) in enumerate(zip(tranches_avant, tranches_apres)) if a[:3] != b[:3]),
+            min(len(tranches_avant), len(tranches_apres)) - 1,
+        )
+        plancher = min(tranches_avant[i][0], tranches_apres[i][0])
+        zones.append((f"barème IRPP au-delà de {plancher} TND", 'base_imposable', _mensuel(plancher), None))
+
+    if avant.heures_supp_dans_brut != apres.heures_supp_dans_brut:
+        zones.append(("heures supplémentaires dans le brut", None, None, None))
+
+    if avant.css_taux != apres.css_taux:
+        zones.append((
+            f"CSS : taux {avant.css_taux} -> {apres.css_taux}", 'brut_imposable', _mensuel(SEUIL_CSS_ANNUEL), None,
+        ))
+    return zones
+
+
+def _filtre(zones):
+    """Q des bulletins situés dans au moins une zone."""
+    filtre = Q(pk__in=[])
+    for _, champ, minimum, maximum in zones:
+        if champ is None or (minimum is None and maximum is None):
+            return Q()
+        condition = Q()
+        if minimum is not None:
+            condition &= Q(**{f'{champ}__gte': minimum})
+        if maximum is not None:
+            condition &= Q(**{f'{champ}__lt': maximum})
+        filtre |= condition
+    return filtre
+
+
+def _dans_zone(valeurs, zone):
+    _, champ, minimum, maximum = zone
+    if champ is None:
+        return True
+    valeur = valeurs[champ]
+    return (minimum is None or valeur >= minimum) and (maximum is None or valeur < maximum)
+
+
+def correspondances(moteur_avant, moteur_apres):
+    """``{version avant: (plan avant, zones, annees)}`` sur toutes les périodes des deux moteurs.
+
+    Un plan de l'ancien moteur peut correspondre à plusieurs plans du nouveau
+    (jeu daté ajouté en cours d'année) : ses zones sont réunies, et ``annees``
+    limite la recherche aux années concernées (None : toutes).
+    """
+    paires = [(None, moteur_avant.defaut, moteur_apres.defaut)]
+    for periode in sorted(set(moteur_avant.periodes()) | set(moteur_apres.periodes())):
+        annee, mois = divmod(periode, 12)
+        paires.append((annee, moteur_avant.plan(annee, mois + 1), moteur_apres.plan(annee, mois + 1)))
+
+    resultat = {}
+    for annee, avant, apres in paires:
+        zones_paire = zones_impactees(avant, apres)
+        _, zones, annees = resultat.setdefault(avant.version, (avant, [], set()))
+        if zones_paire:
+            zones.extend(z for z in zones_paire if z not in zones)
+            annees.add(annee)
+    return {
+        version: (avant, zones, None if None in annees else annees)
+        for version, (avant, zones, annees) in resultat.items()
+    }
+
+
+# === Recalcul ===
+def _en_vigueur(bulletins):
+    """Bulletins retenus par les cumuls annuels (les bulletins remplacés sont ignorés)."""
+    cumuls = {
+        (matricule, societe, annee): retenus
+        for matricule, societe, annee, retenus in CumulAnnuel.objects.filter(
+            matricule__in={b.matricule for b in bulletins},
+            societe__in={b.societe for b in bulletins},
+            annee__in={b.annee for b in bulletins if b.annee is not None},
+        ).values_list('matricule', 'societe', 'annee', 'bulletins')
+    }
+    for bulletin in bulletins:
+        retenus = cumuls.get((bulletin.matricule, bulletin.societe, bulletin.annee))
+        numero = numero_mois(bulletin.mois)
+        if retenus is None or numero is None or retenus.get(str(numero)) == bulletin.pk:
+            yield bulletin
+
+
+def ecarts_bulletin(avant, apres):
+    """``{cle: (avant, apres)}`` des montants qui diffèrent entre deux bulletins calculés."""
+    ecarts = {}
+    for cle in dict.fromkeys([*avant, *apres]):
+        if cle in CLES_NON_COMPAREES:
+            continue
+        a, b = avant.get(cle, 0), apres.get(cle, 0)
+        if isinstance(a, (int, float)) and isinstance(b, (int, float)) and not isinstance(a, bool):
+            if round(a, 3) != round(b, 3):
+                ecarts[cle] = (a, b)
+    return ecarts
+
+
+def iter_impact(moteur_avant, moteur_apres, bulletins=None):
+    """Bulletins en vigueur touchés par le changement de règles, recalculés avec les nouvelles.
+
+    ``bulletins`` restreint l'analyse (queryset de Payslip, tous par défaut).
+    Produit ``(bulletin, motifs, donnees_recalculees, ecarts)`` ; ``ecarts`` est vide
+    quand le bulletin est dans une zone touchée sans que ses montants changent.
+    Le recalcul passe par le moteur entier, qui prend le plan explicitement et
+    donne les mêmes montants que calcul_auto.
+    """
+    bulletins = Payslip.objects.all() if bulletins is None else bulletins
+    zones_par_paire = {}
+    for version, (avant, zones, annees) in correspondances(moteur_avant, moteur_apres).items():
+        if not zones:
+            continue
+        candidats = bulletins.filter(_filtre(zones), version_regles=version)
+        if annees is not None:
+            candidats = candidats.filter(annee__in=annees)
+        paquet = []
+        for bulletin in candidats.order_by('pk').iterator(chunk_size=TAILLE_LECTURE):
+            paquet.append(bulletin)
+            if len(paquet) >= TAILLE_LECTURE:
+                yield from _recalculer(paquet, avant, moteur_apres, zones_par_paire)
+                paquet = []
+        yield from _recalculer(paquet, avant, moteur_apres, zones_par_paire)
+
+
+def _recalculer(paquet, avant, moteur_apres, zones_par_paire):
+    if not paquet:
+        return
+    for bulletin in _en_vigueur(paquet):
+        # Zones du plan qui s'applique à la période du bulletin
+        apres = moteur_apres.plan(bulletin.annee, bulletin.mois)
+        paire = (avant.version, apres.version)
+        zones = zones_par_paire.get(paire)
+        if zones is None:
+            zones = zones_par_paire[paire] = zones_impactees(avant, apres)
+        valeurs = {
+            'salaire_base': bulletin.salaire_base, 'annees_anciennete': bulletin.annees_anciennete,
+            'base_imposable': bulletin.base_imposable, 'brut_imposable': bulletin.brut_imposable,
+        }
+        motifs = [zone[0] for zone in zones if _dans_zone(valeurs, zone)]
+        if not motifs:
+            continue
+        donnees = calcul_auto_millimes(entrees_bulletin(bulletin.donnees), apres)
+        yield bulletin, motifs, donnees, ecarts_bulletin(bulletin.donnees, donnees)
+
+
+def recalcul_selectif(moteur_avant, moteur_apres, bulletins=None, appliquer=False):
+    """Rapport avant / après des bulletins touchés ; avec ``appliquer``, enregistre les nouveaux bulletins.
+
+    Un bulletin modifié est remplacé par un nouveau Payslip (mêmes entrées,
+    nouvelle version de règles) qui prend sa place dans les cumuls annuels.
+    """
+    rapport = {'zones': [], 'analyses': 0, 'inchanges': 0, 'modifies': []}
+    for _, zones, _ in correspondances(moteur_avant, moteur_apres).values():
+        rapport['zones'].extend(zone[0] for zone in zones if zone[0] not in rapport['zones'])
+
+    for bulletin, motifs, donnees, ecarts in iter_impact(moteur_avant, moteur_apres, bulletins):
+        rapport['analyses'] += 1
+        if not ecarts:
+            rapport['inchanges'] += 1
+            continue
+        ligne = {
+            'bulletin': bulletin.pk, 'matricule': bulletin.matricule, 'nom_prenom': bulletin.nom_prenom,
+            'societe': bulletin.societe, 'annee': bulletin.annee, 'mois': bulletin.mois,
+            'motifs': motifs, 'ecarts': {cle: list(valeurs) for cle, valeurs in ecarts.items()},
+        }
+        if appliquer:
+            ligne['nouveau_bulletin'] = _remplacer(bulletin, donnees, moteur_apres).pk
+        rapport['modifies'].append(ligne)
+    return rapport
+
+
+def _remplacer(bulletin, donnees, moteur_apres):
+    with transaction.atomic():
+        nouveau = Payslip.objects.create(
+            run_id=bulletin.run_id,
+            matricule=bulletin.matricule,
+            nom_prenom=bulletin.nom_prenom,
+            societe=bulletin.societe,
+            annee=bulletin.annee,
+            mois=bulletin.mois,
+            empreinte=bulletin.empreinte,
+            version_regles=moteur_apres.plan(bulletin.annee, bulletin.mois).version,
+            **grandeurs_bulletin(donnees),
+            donnees={k: _valeur_json(v) for k, v in donnees.items()},
+        )
+        cumuler_bulletin(nouveau)
+    return nouveau
+
+
+# === Règles modifiées (simulation) ===
+def moteur_modifie(seuils=None, taux_primes=None, debut=None, jeux_dates=None, heures_supp_dans_brut=None):
+    """MoteurRegles des règles en vigueur avec des seuils et taux de primes modifiés.
+
+    Avec ``debut=(annee, mois)``, la modification ne s'applique que de ce mois
+    à décembre de la même année (changement en cours d'année).
+    ``heures_supp_dans_brut=False`` redonne les règles d'avant la prise en compte
+    des heures supplémentaires dans le brut (versions des bulletins antérieurs).
+    """
+    regles = _regles_en_vigueur()
+    jeux_dates = REGLES_DATEES if jeux_dates is None else jeux_dates
+    nouvelles = {
+        'regles': copy.deepcopy(REGLES_AUTOMATIQUES),
+        'seuils': {**SEUILS_AUTOMATIQUES, **{k: Decimal(str(v)) for k, v in (seuils or {}).items()}},
+    }
+    for nom, taux in (taux_primes or {}).items():
+        if nouvelles['regles'].get(nom, {}).get('type') != 'pourcentage':
+            raise ValueError(f"Prime en pourcentage inconnue : {nom}")
+        nouvelles['regles'][nom]['valeur'] = Decimal(str(taux))
+    if heures_supp_dans_brut is not None:
+        nouvelles['heures_supp_dans_brut'] = heures_supp_dans_brut
+    if debut is None:
+        return MoteurRegles({**regles, **nouvelles}, jeux_dates)
+    return MoteurRegles(regles, [*jeux_dates, {'debut': debut, 'fin': (debut[0], 12), **nouvelles}])
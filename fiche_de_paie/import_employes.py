@@ -0,0 +1,216 @@
+# fiche_de_paie/import_employes.py
+"""Import en masse d'employés depuis un fichier CSV ou XLSX.
+
+Les lignes sont lues une à une (openpyxl en mode lecture seule pour XLSX),
+validées avec les champs de BulletinPaieForm sans construire de formulaire par
+ligne, puis calculées par lots avec le moteur vectorisé. Seul le lot en cours
+est en mémoire, quelle que soit la taille du fichier.
+"""
+import codecs
+import csv
+import io
+import json
+import os
+
+from django.core.exceptions import ValidationError
+
+from .batch import calcul_auto_batch, calcul_auto_batch_par_periode, iter_bulletins
+from .forms import BulletinPaieForm
+from .regles import VALEURS_FAUX
+TAILLE_LOT = 1000
+TAILLE_MEMO = 4096  # valeurs mémorisées par colonne
+COLONNES_IDENTITE = ('matricule', 'nom_prenom', 'cin', 'societe', 'mois', 'annee')
+
+
+# === Lecture des lignes ===
+def iter_lignes_csv(flux, delimiteur=','):
+    """Lignes d'un CSV texte (dicts), numérotées comme dans le fichier."""
+    for numero, ligne in enumerate(csv.DictReader(flux, delimiter=delimiteur), start=2):
+        yield numero, ligne
+
+
+def iter_lignes_xlsx(fichier):
+    """Lignes de la première feuille d'un classeur XLSX, la première ligne donnant les colonnes.
+
+    Nécessite openpyxl (dépendance optionnelle) ; le classeur est lu en flux.
+    """
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValueError("Import XLSX indisponible : installer openpyxl") from None
+
+    classeur = load_workbook(fichier, read_only=True, data_only=True)
+    try:
+        lignes = classeur.worksheets[0].iter_rows(values_only=True)
+        entetes = [str(c).strip() if c is not None else '' for c in next(lignes, ())]
+        for numero, valeurs in enumerate(lignes, start=2):
+            if all(v is None for v in valeurs):
+                continue
+            yield numero, {nom: '' if v is None else v for nom, v in zip(entetes, valeurs) if nom}
+    finally:
+        classeur.close()
+
+
+def iter_lignes_ndjson(flux):
+    """Objets d'un flux NDJSON (un objet JSON par ligne), numérotés à partir de 1.
+
+    Une ligne qui n'est pas un objet JSON est transmise vide, avec sa clé
+    ``_erreur`` : la validation la rejettera sans interrompre le flux.
+    """
+    for numero, ligne in enumerate(flux, start=1):
+        if isinstance(ligne, bytes):
+            ligne = ligne.decode('utf-8-sig' if numero == 1 else 'utf-8')
+        if not ligne.strip():
+            continue
+        try:
+            objet = json.loads(ligne)
+        except ValueError as e:
+            objet = {'_erreur': f"JSON invalide : {e}"}
+        if not isinstance(objet, dict):
+            objet = {'_erreur': "Objet JSON attendu"}
+        yield numero, objet
+
+
+# === Validation ===
+class ValidateurEmployes:
+    """Applique les règles des champs de BulletinPaieForm à des dicts de lignes.
+
+    Les champs et widgets du formulaire sont réutilisés tels quels (lecture de la
+    valeur par le widget puis ``clean`` du champ) : mêmes conversions, mêmes
+    messages, sans la copie profonde des champs qu'impose chaque formulaire.
+    Les valeurs déjà validées d'une colonne (société, mois, zéros...) sont
+    mémorisées : une valeur répétée n'est nettoyée qu'une fois.
+    """
+
+    def __init__(self, formulaire=BulletinPaieForm):
+        self.champs = [
+            (nom, champ, champ.widget, champ.initial, {})
+            for nom, champ in formulaire.base_fields.items()
+        ]
+
+    def valider(self, ligne):
+        """``(donnees, None)`` pour une ligne valide, sinon ``(None, erreurs)``.
+
+        ``erreurs`` a le format de ``form.errors.get_json_data()``.
+        """
+        if '_erreur' in ligne:
+            return None, {'__all__': [{'message': ligne['_erreur'], 'code': 'invalid'}]}
+        if str(ligne.get('chef_famille', '')).strip().lower() in VALEURS_FAUX:
+            ligne['chef_famille'] = 'false'
+        donnees, erreurs = {}, {}
+        for nom, champ, widget, initial, valides in self.champs:
+            if initial is not None and ligne.get(nom) in (None, ''):
+                ligne[nom] = initial
+            valeur = widget.value_from_datadict(ligne, {}, nom)
+            # Le type fait partie de la clé : 0, 0.0 et False ne se nettoient pas pareil
+            cle = (type(valeur), valeur)
+            try:
+                donnees[nom] = valides[cle]
+                continue
+            except KeyError:
+                pass
+            except TypeError:
+                # Liste ou objet JSON : non mémorisable, le champ le rejette normalement
+                cle = None
+            try:
+                donnees[nom] = champ.clean(valeur)
+                if cle is not None:
+                    valides[cle] = donnees[nom]
+            except ValidationError as e:
+                erreurs[nom] = [
+                    {'message': m, 'code': erreur.code or ''} for erreur in e.error_list for m in erreur.messages
+                ]
+            if len(valides) > TAILLE_MEMO:
+                valides.clear()
+        if erreurs:
+            return None, erreurs
+        return donnees, None
+
+
+def valider_employes(lignes):
+    """Valide des lignes ``(numero, dict)`` ; produit ``(numero, donnees, erreurs)``."""
+    validateur = ValidateurEmployes()
+    for numero, ligne in lignes:
+        donnees, erreurs = validateur.valider(ligne)
+        yield numero, donnees, erreurs
+
+
+def lire_employes_csv(flux, delimiteur=','):
+    """Itère sur un CSV texte et valide chaque ligne avec les règles de BulletinPaieForm.
+
+    Produit des tuples ``(numero_ligne, donnees, erreurs)`` : ``donnees`` vaut
+    None pour une ligne invalide et ``erreurs`` est alors renseigné.
+    """
+    return valider_employes(iter_lignes_csv(flux, delimiteur))
+
+
+def lire_employes(fichier, nom_fichier, delimiteur=','):
+    """Comme lire_employes_csv pour un fichier binaire CSV, XLSX ou NDJSON (selon l'extension)."""
+    extension = os.path.splitext(nom_fichier)[1].lower()
+    if extension in ('.xlsx', '.xlsm'):
+        return valider_employes(iter_lignes_xlsx(fichier))
+    if extension in ('.ndjson', '.jsonl'):
+        return valider_employes(iter_lignes_ndjson(fichier))
+    return lire_employes_csv(codecs.iterdecode(fichier, 'utf-8-sig'), delimiteur)
+
+
+# === Calcul par lots ===
+def calculer_employes(employes, taille_lot=TAILLE_LOT):
+    """Calcule les bulletins des lignes valides par lots vectorisés, dans l'ordre du fichier.
+
+    ``employes`` est l'itérable produit par ``lire_employes`` ; produit des tuples
+    ``(numero, donnees, bulletin, erreurs)`` où ``bulletin`` (dict de montants)
+    vaut None pour une ligne invalide.
+    """
+    lot = []
+
+    def calculer_lot():
+        valides = [donnees for _, donnees, _ in lot if donnees is not None]
+        bulletins = iter_bulletins(calcul_auto_batch_par_periode(valides)) if valides else iter(())
+        for numero, donnees, erreurs in lot:
+            yield numero, donnees, (next(bulletins) if donnees is not None else None), erreurs
+        lot.clear()
+
+    for employe in employes:
+        lot.append(employe)
+        if len(lot) >= taille_lot:
+            yield from calculer_lot()
+    yield from calculer_lot()
+
+
+def _message_erreurs(erreurs):
+    return '; '.join(f"{champ} : {m['message']}" for champ, messages in erreurs.items() for m in messages)
+
+
+def iter_import_csv(employes, delimiteur=',', taille_lot=TAILLE_LOT):
+    """Produit, morceau par morceau, le CSV des bulletins calculés.
+
+    Chaque ligne du fichier d'entrée donne une ligne : montants calculés pour
+    une ligne valide, colonne ``erreurs`` renseignée sinon.
+    """
+    montants = list(calcul_auto_batch([{'salaire_base': 0}]))
+    tampon = io.StringIO()
+    writer = csv.writer(tampon, delimiter=delimiteur)
+    writer.writerow(('ligne',) + COLONNES_IDENTITE + tuple(montants) + ('erreurs',))
+
+    for numero, donnees, bulletin, erreurs in calculer_employes(employes, taille_lot):
+        if bulletin is None:
+            writer.writerow([numero] + [''] * (len(COLONNES_IDENTITE) + len(montants)) + [_message_erreurs(erreurs)])
+        else:
+            identite = ['' if donnees.get(c) is None else donnees[c] for c in COLONNES_IDENTITE]
+            writer.writerow([numero] + identite + [f"{bulletin[k]:.3f}" for k in montants] + [''])
+        if tampon.tell() >= 64 * 1024:
+            yield tampon.getvalue()
+            tampon.seek(0)
+            tampon.truncate()
+    yield tampon.getvalue()
+
+
+def ecrire_rapport_erreurs(flux, erreurs):
+    """Écrit le rapport CSV ``ligne, champ, message`` des lignes rejetées."""
+    writer = csv.writer(flux)
+    writer.writerow(['ligne', 'champ', 'message'])
+    for numero, erreurs_ligne in erreurs:
+        for champ, messages in erreurs_ligne.items():
+            for message in messages:
+                writer.writerow([numero, champ, message['message']])
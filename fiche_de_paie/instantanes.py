@@ -0,0 +1,135 @@
+# fiche_de_paie/instantanes.py
+"""Instantanés des bulletins émis (modèles PayrollRun / Payslip).
+
+Un bulletin est calculé une seule fois pour un jeu d'entrées et une version
+des règles ; les réimpressions relisent le résultat stocké. Seule l'émission
+(enregistrer_bulletin) écrit en base et alimente les cumuls annuels de
+l'employé (voir cumuls.py) ; prévisualisations et exports relisent un
+instantané existant (bulletin_stocke) ou calculent sans rien enregistrer.
+"""
+import hashlib
+import json
+from decimal import Decimal
+
+from django.db import transaction
+
+from .auto_calculs import plan_regles
+from .auto_config import REGLES_AUTOMATIQUES
+from .cumuls import cumuler_bulletin
+from .forms import BulletinPaieForm
+from .models import CumulAnnuel, PayrollRun, Payslip
+from .regles import numero_mois
+from .resultat import calcul_resultat
+
+
+def _valeur_json(valeur):
+    if isinstance(valeur, Decimal):
+        return float(valeur)
+    return valeur
+
+
+def grandeurs_bulletin(data):
+    """Champs indexés d'un bulletin calculé (voir Payslip et impact.py)."""
+    return {
+        'salaire_base': Decimal(str(data.get('salaire_base') or 0)),
+        'annees_anciennete': int(data.get('annees_anciennete') or 0),
+        'base_imposable': Decimal(str(data.get('base_imposable_nette') or 0)),
+        'brut_imposable': Decimal(str(data.get('brut_imposable') or 0)),
+    }
+
+
+def entrees_bulletin(data):
+    """Champs saisis d'un bulletin : ceux du formulaire, sans les primes calculées."""
+    return {
+        nom: data[nom] for nom in BulletinPaieForm.base_fields
+        if nom in data and REGLES_AUTOMATIQUES.get(nom, {}).get('type', 'manuel') == 'manuel'
+    }
+
+
+def empreinte_entrees(data):
+    """Empreinte des champs du formulaire, insensible à l'écriture des décimaux."""
+    entrees = {}
+    for nom in BulletinPaieForm.base_fields:
+        valeur = data.get(nom)
+        if isinstance(valeur, (Decimal, float)):
+            valeur = f"{Decimal(str(valeur)).normalize():f}"
+        entrees[nom] = valeur
+    return hashlib.sha1(json.dumps(entrees, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+
+
+def _periode(donnees_formulaire):
+    return {
+        'matricule': donnees_formulaire.get('matricule') or '',
+        'societe': donnees_formulaire.get('societe') or '',
+        'annee': donnees_formulaire.get('annee'),
+        'mois': donnees_formulaire.get('mois') or '',
+    }
+
+
+def bulletin_stocke(donnees_formulaire, version=None):
+    """Bulletin déjà émis pour ces entrées avec les règles en vigueur (``version``), ou None.
+
+    Simple lecture : sert aux prévisualisations et exports, qui n'émettent rien.
+    """
+    periode = _periode(donnees_formulaire)
+    if version is None:
+        version = plan_regles(periode['annee'], periode['mois']).version
+    return Payslip.objects.filter(
+        **periode, empreinte=empreinte_entrees(donnees_formulaire), version_regles=version,
+    ).first()
+
+
+def enregistrer_bulletin(donnees_formulaire, data=None):
+    """Émet le bulletin de ces entrées : instantané existant ou calculé et enregistré.
+
+    ``data`` est le résultat déjà calculé (calcul_resultat) de ces entrées, s'il y en a un.
+    """
+    periode = _periode(donnees_formulaire)
+    version = plan_regles(periode['annee'], periode['mois']).version
+    bulletin = bulletin_stocke(donnees_formulaire, version)
+    if bulletin is not None:
+        # Saisie revenue à un bulletin antérieur : c'est lui qui compte dans les cumuls
+        cumuler_bulletin(bulletin)
+        return bulletin
+
+    if data is None:
+        data = calcul_resultat(donnees_formulaire)
+    # Bulletin et cumuls ensemble : pas de bulletin émis absent des cumuls
+    with transaction.atomic():
+        run, _ = PayrollRun.objects.get_or_create(
+            societe=periode['societe'], annee=periode['annee'], mois=periode['mois'],
+        )
+        bulletin = Payslip.objects.create(
+            run=run,
+            **periode,
+            nom_prenom=data.get('nom_prenom') or '',
+            empreinte=empreinte_entrees(donnees_formulaire),
+            version_regles=version,
+            **grandeurs_bulletin(data),
+            donnees={k: _valeur_json(v) for k, v in data.items()},
+        )
+        cumuler_bulletin(bulletin)
+    return bulletin
+
+
+def bulletin_periode(matricule, societe, annee, mois):
+    """Bulletin émis en vigueur pour un employé et une période, ou None.
+
+    C'est celui que retiennent les cumuls annuels ; à défaut, le dernier enregistré.
+    Sans matricule, l'employé n'est pas identifiable : None.
+    """
+    if not matricule:
+        return None
+    numero = numero_mois(mois)
+    if annee is not None and numero is not None:
+        retenus = CumulAnnuel.objects.filter(
+            matricule=matricule, societe=societe, annee=annee,
+        ).values_list('bulletins', flat=True).first()
+        pk = (retenus or {}).get(str(numero))
+        if pk is not None:
+            bulletin = Payslip.objects.filter(pk=pk).first()
+            if bulletin is not None:
+                return bulletin
+    return Payslip.objects.filter(
+        matricule=matricule, societe=societe, annee=annee, mois=mois,
+    ).first()
@@ -0,0 +1,52 @@
+# fiche_de_paie/json_rapide.py
+"""Sérialisation JSON rapide pour les API de calcul en lot.
+
+orjson est utilisé s'il est installé (dépendance optionnelle), sinon le module
+json de la bibliothèque standard ; la sortie est la même. Les Decimal sont
+écrits comme des nombres et les dates au format ISO ; les autres mappings
+(ResultatBulletin) comme des objets.
+"""
+import json
+from collections.abc import Mapping
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.http import HttpResponse
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _valeur_json(valeur):
+    if isinstance(valeur, Decimal):
+        return float(valeur)
+    if isinstance(valeur, (datetime, date, time)):
+        return valeur.isoformat()
+    if isinstance(valeur, Mapping):
+        # ResultatBulletin imbriqué ; seul, il s'écrit sans copie avec sa méthode json()
+        return dict(valeur)
+    raise TypeError(f"Type non sérialisable en JSON : {type(valeur).__name__}")
+
+
+def dumps(objet):
+    """JSON compact (bytes UTF-8) de ``objet``."""
+    if orjson is not None:
+        return orjson.dumps(objet, default=_valeur_json)
+    return json.dumps(objet, default=_valeur_json, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def loads(contenu):
+    """Décode un document JSON (bytes ou str) ; ValueError s'il est invalide."""
+    if orjson is not None:
+        return orjson.loads(contenu)
+    return json.loads(contenu)
+
+
+class ReponseJSON(HttpResponse):
+    """Équivalent de JsonResponse sérialisé avec ``dumps``."""
+
+    def __init__(self, donnees, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(dumps(donnees), **kwargs)
@@ -0,0 +1,59 @@
+# fiche_de_paie/management/commands/paie_batch.py
+import csv
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fiche_de_paie.batch import COLONNES_ENTREE, calcul_auto_batch_par_periode, iter_bulletins
+
+# Colonnes d'identification recopiées telles quelles dans le fichier résultat
+COLONNES_IDENTITE = ('matricule', 'nom_prenom', 'cin', 'societe', 'mois', 'annee')
+VALEURS_VRAI = ('1', 'true', 'vrai', 'oui', 'on', 'x')
+
+
+class Command(BaseCommand):
+    help = "Calcule en une passe vectorisée les bulletins d'un fichier CSV d'employés"
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="CSV d'entrée (salaire_base, annees_anciennete, chef_famille, ...)")
+        parser.add_argument('-o', '--sortie', help="CSV de sortie (stdout par défaut)")
+        parser.add_argument('-d', '--delimiteur', default=',', help="Séparateur CSV (',' par défaut)")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['fichier'], newline='', encoding='utf-8-sig') as f:
+                lignes = list(csv.DictReader(f, delimiter=options['delimiteur']))
+        except OSError as e:
+            raise CommandError(f"Lecture impossible : {e}")
+
+        if not lignes or 'salaire_base' not in lignes[0]:
+            raise CommandError("Colonne 'salaire_base' absente du fichier")
+
+        for ligne in lignes:
+            ligne['chef_famille'] = str(ligne.get('chef_famille', '')).strip().lower() in VALEURS_VRAI
+
+        debut = time.perf_counter()
+        try:
+            resultats = calcul_auto_batch_par_periode(lignes)
+        except (ValueError, ArithmeticError) as e:
+            raise CommandError(f"Données invalides : {e}")
+        duree = time.perf_counter() - debut
+
+        identites = [c for c in COLONNES_IDENTITE if c in lignes[0]]
+        entrees = [c for c in COLONNES_ENTREE if c != 'salaire_base']
+        champs = identites + entrees + list(resultats)
+
+        sortie = open(options['sortie'], 'w', newline='', encoding='utf-8') if options['sortie'] else sys.stdout
+        try:
+            writer = csv.DictWriter(sortie, fieldnames=champs, delimiter=options['delimiteur'])
+            writer.writeheader()
+            for ligne, bulletin in zip(lignes, iter_bulletins(resultats)):
+                row = {c: ligne.get(c, '') for c in identites + entrees}
+                row.update({k: f"{v:.3f}" for k, v in bulletin.items()})
+                writer.writerow(row)
+        finally:
+            if sortie is not sys.stdout:
+                sortie.close()
+
+        self.stderr.write(f"{len(lignes)} bulletins calculés en {duree * 1000:.1f} ms")
@@ -0,0 +1,90 @@
+# fiche_de_paie/management/commands/paie_bench.py
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fiche_de_paie.benchmarks import (
+    PERFORMANCES_REFERENCE, SEUIL_REGRESSION, bench_irpp, bench_millimes, bench_pdf, bench_resultats, charger_reference,
+    comparer_reference, enregistrer_reference, figer_corpus, suite_performance, verifier_parite_millimes,
+)
+
+
+class Command(BaseCommand):
+    help = "Microbenchmarks du moteur de paie, ou suite de performance avec contrôle de régression (--suite)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('-n', '--iterations', type=int, default=20000, help="Appels mesurés par répétition")
+        parser.add_argument('--pdf', type=int, default=200, help="Bulletins PDF rendus par répétition (0 : ignoré)")
+        parser.add_argument('--suite', action='store_true',
+                            help="Suite complète : corpus de référence, latence, débits, PDF, AJAX concurrent")
+        parser.add_argument('--reference', default=PERFORMANCES_REFERENCE, help="Fichier de référence des débits")
+        parser.add_argument('--seuil', type=float, default=SEUIL_REGRESSION,
+                            help=f"Baisse de débit tolérée ({SEUIL_REGRESSION:.0%} par défaut)")
+        parser.add_argument('--enregistrer-reference', action='store_true',
+                            help="Remplace la référence par les mesures de cette exécution")
+        parser.add_argument('--sans-ajax', action='store_true', help="Ne pas mesurer l'endpoint AJAX")
+        parser.add_argument('--parite', type=int, default=0, metavar='N',
+                            help="Compare les moteurs decimal et millimes sur N entrées aléatoires puis s'arrête")
+        parser.add_argument('--figer-corpus', action='store_true',
+                            help="Régénère le corpus de référence avec les règles actuelles puis s'arrête")
+
+    def handle(self, *args, **options):
+        if options['figer_corpus']:
+            self.stdout.write(f"Corpus de référence : {figer_corpus()} bulletins figés")
+            return
+        if options['parite']:
+            ecarts = verifier_parite_millimes(options['parite'])
+            if ecarts:
+                raise CommandError(f"{len(ecarts)} écarts entre les moteurs decimal et millimes, ex. {ecarts[0]}")
+            self.stdout.write(self.style.SUCCESS(f"Moteurs decimal et millimes identiques sur {options['parite']} entrées"))
+            return
+        if options['suite']:
+            return self.suite(options)
+
+        resultat = bench_irpp(iterations=options['iterations'])
+        self.stdout.write(
+            f"calcul_irpp : {resultat['par_tranches_us']:.2f} µs/appel (par tranches) -> "
+            f"{resultat['precompile_us']:.2f} µs/appel (précompilé), x{resultat['acceleration']:.2f}"
+        )
+        resultat = bench_millimes(iterations=options['iterations'])
+        self.stdout.write(
+            f"calcul_auto : {resultat['decimal_us']:.2f} µs/bulletin (decimal) -> "
+            f"{resultat['millimes_us']:.2f} µs/bulletin (millimes), x{resultat['acceleration']:.2f}"
+        )
+        resultat = bench_resultats(iterations=options['iterations'])
+        self.stdout.write(
+            f"résultat de bulletin : {resultat['dict_octets']} o/bulletin (dict) -> "
+            f"{resultat['resultat_octets']} o (ResultatBulletin), {resultat['lot_octets']} o (LotResultats) ; "
+            f"JSON {resultat['dict_json_us']:.2f} µs (dict) -> {resultat['resultat_json_us']:.2f} µs"
+        )
+        if options['pdf']:
+            resultat = bench_pdf(iterations=options['pdf'])
+            self.stdout.write(
+                f"generate_pdf_fpdf : {resultat['classique_ms']:.2f} ms/bulletin (classique) -> "
+                f"{resultat['gabarit_ms']:.2f} ms/bulletin (gabarit), x{resultat['acceleration']:.2f}"
+            )
+
+    def suite(self, options):
+        try:
+            mesures = suite_performance(ajax=not options['sans_ajax'], pdf=bool(options['pdf']))
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        reference = charger_reference(options['reference']) if os.path.exists(options['reference']) else {}
+        for nom, valeur in sorted(mesures.items()):
+            precedent = reference.get(nom)
+            variation = f"  ({valeur / precedent - 1:+.1%})" if precedent else ''
+            self.stdout.write(f"{nom:24} {valeur:>12}{variation}")
+
+        if options['enregistrer_reference']:
+            enregistrer_reference(mesures, options['reference'])
+            self.stdout.write(self.style.SUCCESS(f"Référence enregistrée : {options['reference']}"))
+            return
+
+        regressions = comparer_reference(mesures, reference, options['seuil'])
+        if regressions:
+            details = ', '.join(f"{nom} {ref} -> {mesure} ({variation:+.1%})"
+                                for nom, ref, mesure, variation in regressions)
+            raise CommandError(f"Régression de débit au-delà de {options['seuil']:.0%} : {details}")
+        if reference:
+            self.stdout.write(self.style.SUCCESS(f"Aucune régression au-delà de {options['seuil']:.0%}"))
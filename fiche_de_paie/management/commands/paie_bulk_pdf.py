@@ -0,0 +1,36 @@
+# fiche_de_paie/management/commands/paie_bulk_pdf.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fiche_de_paie.bulk_pdf import iter_zip_bulletins
+from fiche_de_paie.import_employes import lire_employes_csv
+
+
+class Command(BaseCommand):
+    help = "Génère les bulletins PDF d'un fichier CSV d'employés dans une archive ZIP"
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="CSV d'employés (colonnes du formulaire de bulletin)")
+        parser.add_argument('-o', '--sortie', default='bulletins_paie.zip', help="Archive ZIP produite")
+        parser.add_argument('-p', '--processus', type=int, default=None,
+                            help="Nombre de processus de rendu (nombre de CPU par défaut)")
+        parser.add_argument('-d', '--delimiteur', default=',', help="Séparateur CSV (',' par défaut)")
+
+    def handle(self, *args, **options):
+        debut = time.perf_counter()
+        taille = 0
+        try:
+            with open(options['fichier'], newline='', encoding='utf-8-sig') as entree, \
+                    open(options['sortie'], 'wb') as sortie:
+                employes = lire_employes_csv(entree, delimiteur=options['delimiteur'])
+                for morceau in iter_zip_bulletins(employes, processus=options['processus']):
+                    sortie.write(morceau)
+                    taille += len(morceau)
+        except OSError as e:
+            raise CommandError(f"Lecture/écriture impossible : {e}")
+
+        duree = time.perf_counter() - debut
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['sortie']} : {taille / 1024:.0f} Ko écrits en {duree:.1f} s"
+        ))
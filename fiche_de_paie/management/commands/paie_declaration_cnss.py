@@ -0,0 +1,40 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fiche_de_paie.declaration_cnss import TotauxDeclaration, iter_declaration_csv, paies_trimestre
+
+
+class Command(BaseCommand):
+    help = "Déclaration trimestrielle CNSS d'une société : cotisations agrégées par ligne, en une passe"
+
+    def add_arguments(self, parser):
+        parser.add_argument('societe', help="Société")
+        parser.add_argument('annee', type=int, help="Année")
+        parser.add_argument('trimestre', type=int, choices=(1, 2, 3, 4), help="Trimestre (1-4)")
+        parser.add_argument('-o', '--sortie', help="CSV de sortie (stdout par défaut)")
+        parser.add_argument('-d', '--delimiteur', default=',', help="Séparateur CSV (',' par défaut)")
+
+    def handle(self, *args, **options):
+        paies = paies_trimestre(options['societe'], options['annee'], options['trimestre'])
+        if not paies:
+            raise CommandError("Aucune paie enregistrée pour ce trimestre")
+
+        totaux = TotauxDeclaration()
+        sortie = open(options['sortie'], 'w', newline='', encoding='utf-8') if options['sortie'] else sys.stdout
+        try:
+            for morceau in iter_declaration_csv(paies, totaux, delimiteur=options['delimiteur']):
+                sortie.write(morceau)
+        finally:
+            if sortie is not sys.stdout:
+                sortie.close()
+
+        resume = totaux.resume()
+        for ligne in resume['lignes']:
+            self.stderr.write(
+                f"{ligne['libelle']:<36} salarié {ligne['salarie']:>14.3f}  employeur {ligne['employeur']:>14.3f}"
+            )
+        self.stderr.write(
+            f"{resume['nb_employes']} employés, {resume['nb_bulletins']} bulletins, "
+            f"assiette {resume['assiette']:.3f}, total à déclarer {resume['total']:.3f}"
+        )
@@ -0,0 +1,82 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fiche_de_paie.auto_calculs import moteur_regles
+from fiche_de_paie.impact import moteur_modifie, recalcul_selectif
+from fiche_de_paie.models import Payslip
+
+COLONNES = ('bulletin', 'matricule', 'nom_prenom', 'annee', 'mois', 'motifs', 'montant', 'avant', 'apres', 'ecart')
+
+
+def _affectations(valeurs, option):
+    resultat = {}
+    for valeur in valeurs or ():
+        nom, egal, montant = valeur.partition('=')
+        if not egal:
+            raise CommandError(f"{option} attend NOM=VALEUR : {valeur}")
+        resultat[nom.strip()] = montant.strip()
+    return resultat
+
+
+class Command(BaseCommand):
+    help = ("Impact d'un changement de seuils ou de taux de primes : recalcule les seuls bulletins "
+            "touchés et produit le rapport avant / après (simulation, rien n'est enregistré)")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seuil', action='append', metavar='NOM=VALEUR',
+                            help="Seuil modifié, ex. prime_rendement_seuil=1800 (répétable)")
+        parser.add_argument('--taux', action='append', metavar='PRIME=TAUX',
+                            help="Taux de prime modifié, ex. prime_panier=0.025 (répétable)")
+        parser.add_argument('--a-partir-de', metavar='AAAA-MM',
+                            help="Changement en cours d'année : de ce mois à décembre")
+        parser.add_argument('--societe', help="Restreint l'analyse à une société")
+        parser.add_argument('--annee', type=int, help="Restreint l'analyse à une année")
+        parser.add_argument('-o', '--sortie', help="CSV du rapport (stdout par défaut)")
+        parser.add_argument('-d', '--delimiteur', default=',', help="Séparateur CSV (',' par défaut)")
+
+    def handle(self, *args, **options):
+        debut = None
+        if options['a_partir_de']:
+            try:
+                annee, mois = (int(v) for v in options['a_partir_de'].split('-'))
+            except ValueError:
+                raise CommandError("--a-partir-de attend AAAA-MM")
+            debut = (annee, mois)
+        try:
+            apres = moteur_modifie(
+                seuils=_affectations(options['seuil'], '--seuil'),
+                taux_primes=_affectations(options['taux'], '--taux'),
+                debut=debut,
+            )
+        except (ValueError, ArithmeticError) as e:
+            raise CommandError(str(e))
+
+        bulletins = Payslip.objects.all()
+        if options['societe']:
+            bulletins = bulletins.filter(societe=options['societe'])
+        if options['annee']:
+            bulletins = bulletins.filter(annee=options['annee'])
+        rapport = recalcul_selectif(moteur_regles(), apres, bulletins)
+
+        sortie = open(options['sortie'], 'w', newline='', encoding='utf-8') if options['sortie'] else sys.stdout
+        try:
+            writer = csv.writer(sortie, delimiter=options['delimiteur'])
+            writer.writerow(COLONNES)
+            for ligne in rapport['modifies']:
+                for montant, (avant, apres_) in ligne['ecarts'].items():
+                    writer.writerow((
+                        ligne['bulletin'], ligne['matricule'], ligne['nom_prenom'], ligne['annee'], ligne['mois'],
+                        ' | '.join(ligne['motifs']), montant, f"{avant:.3f}", f"{apres_:.3f}", f"{apres_ - avant:.3f}",
+                    ))
+        finally:
+            if sortie is not sys.stdout:
+                sortie.close()
+
+        for zone in rapport['zones']:
+            self.stderr.write(f"Règle modifiée : {zone}")
+        self.stderr.write(
+            f"{rapport['analyses']} bulletins analysés sur {bulletins.count()}, "
+            f"{len(rapport['modifies'])} modifiés, {rapport['inchanges']} inchangés"
+        )
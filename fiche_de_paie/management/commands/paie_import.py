@@ -0,0 +1,81 @@
+# fiche_de_paie/management/commands/paie_import.py
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fiche_de_paie.exports import iter_ndjson_employes
+from fiche_de_paie.import_employes import TAILLE_LOT, ecrire_rapport_erreurs, iter_import_csv, lire_employes
+from fiche_de_paie.pointages import ReleveHeures
+
+
+class Command(BaseCommand):
+    help = "Importe un fichier CSV/XLSX d'employés et calcule leurs bulletins par lots"
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="CSV, XLSX ou NDJSON d'employés (colonnes du formulaire de bulletin)")
+        parser.add_argument('-o', '--sortie', help="Bulletins calculés (stdout par défaut)")
+        parser.add_argument('-f', '--format', choices=('csv', 'ndjson'), default='csv',
+                            help="Format de sortie : CSV (par défaut) ou un objet JSON par ligne")
+        parser.add_argument('-e', '--erreurs', help="Rapport CSV des lignes rejetées (ligne, champ, message)")
+        parser.add_argument('-d', '--delimiteur', default=',', help="Séparateur CSV (',' par défaut)")
+        parser.add_argument('-p', '--pointages',
+                            help="Relevé CSV de pointages (matricule, date, heures) : heures_supp calculées")
+        parser.add_argument('--lot', type=int, default=TAILLE_LOT,
+                            help=f"Lignes calculées par passe vectorisée ({TAILLE_LOT} par défaut)")
+
+    def handle(self, *args, **options):
+        rejets = []
+        lignes = 0
+
+        def suivre(employes):
+            nonlocal lignes
+            for employe in employes:
+                lignes += 1
+                if employe[1] is None:
+                    rejets.append((employe[0], employe[2]))
+                yield employe
+
+        debut = time.perf_counter()
+        releve = None
+        if options['pointages']:
+            try:
+                with open(options['pointages'], newline='', encoding='utf-8-sig') as flux:
+                    releve = ReleveHeures.lire(flux, options['delimiteur'])
+            except OSError as e:
+                raise CommandError(f"Lecture du relevé de pointages impossible : {e}")
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stderr.write(
+                f"Pointages : {len(releve)} employés, {len(releve.erreurs)} lignes rejetées "
+                f"en {time.perf_counter() - debut:.2f} s"
+            )
+            for numero, message in releve.erreurs[:20]:
+                self.stderr.write(f"  ligne {numero} : {message}")
+
+        sortie = open(options['sortie'], 'w', newline='', encoding='utf-8') if options['sortie'] else sys.stdout
+        try:
+            with open(options['fichier'], 'rb') as entree:
+                employes = lire_employes(entree, options['fichier'], delimiteur=options['delimiteur'])
+                if releve is not None:
+                    employes = releve.appliquer(employes)
+                if options['format'] == 'ndjson':
+                    morceaux = iter_ndjson_employes(suivre(employes), options['lot'])
+                else:
+                    morceaux = iter_import_csv(suivre(employes), options['delimiteur'], options['lot'])
+                for morceau in morceaux:
+                    sortie.write(morceau)
+        except OSError as e:
+            raise CommandError(f"Lecture/écriture impossible : {e}")
+        except ValueError as e:
+            raise CommandError(str(e))
+        finally:
+            if sortie is not sys.stdout:
+                sortie.close()
+
+        if options['erreurs']:
+            with open(options['erreurs'], 'w', newline='', encoding='utf-8') as rapport:
+                ecrire_rapport_erreurs(rapport, rejets)
+
+        duree = time.perf_counter() - debut
+        self.stderr.write(f"{lignes - len(rejets)} bulletins calculés, {len(rejets)} lignes rejetées en {duree:.1f} s")
@@ -0,0 +1,36 @@
+# fiche_de_paie/management/commands/paie_recueil_pdf.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fiche_de_paie.import_employes import lire_employes_csv
+from fiche_de_paie.recueil_pdf import iter_recueil_pdf
+
+
+class Command(BaseCommand):
+    help = "Génère un PDF unique contenant les bulletins de tous les employés d'un fichier CSV"
+
+    def add_arguments(self, parser):
+        parser.add_argument('fichier', help="CSV d'employés (colonnes du formulaire de bulletin)")
+        parser.add_argument('-o', '--sortie', default='recueil_bulletins_paie.pdf', help="PDF produit")
+        parser.add_argument('-t', '--titre', default='', help="Titre de l'index (ex. 'Janvier 2025')")
+        parser.add_argument('--sans-index', action='store_true', help="Ne pas ajouter de page d'index")
+        parser.add_argument('-d', '--delimiteur', default=',', help="Séparateur CSV (',' par défaut)")
+
+    def handle(self, *args, **options):
+        debut = time.perf_counter()
+        taille = 0
+        try:
+            with open(options['fichier'], newline='', encoding='utf-8-sig') as entree, \
+                    open(options['sortie'], 'wb') as sortie:
+                employes = lire_employes_csv(entree, delimiteur=options['delimiteur'])
+                for morceau in iter_recueil_pdf(employes, index=not options['sans_index'], titre=options['titre']):
+                    sortie.write(morceau)
+                    taille += len(morceau)
+        except OSError as e:
+            raise CommandError(f"Lecture/écriture impossible : {e}")
+
+        duree = time.perf_counter() - debut
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['sortie']} : {taille / 1024:.0f} Ko écrits en {duree:.1f} s"
+        ))
@@ -0,0 +1,45 @@
+# fiche_de_paie/management/commands/paie_regularisation.py
+import csv
+import sys
+
+from django.core.management.base import BaseCommand
+
+from fiche_de_paie.cumuls import reconstruire_cumuls, regularisations_annuelles
+
+COLONNES = (
+    'matricule', 'mois_cumules', 'base_imposable', 'brut_imposable',
+    'irpp_du', 'irpp_retenu', 'regularisation_irpp',
+    'css_due', 'css_retenue', 'regularisation_css', 'regularisation',
+)
+
+
+class Command(BaseCommand):
+    help = "Régularisation annuelle IRPP / CSS d'une société à partir des cumuls de l'année"
+
+    def add_arguments(self, parser):
+        parser.add_argument('societe', help="Société")
+        parser.add_argument('annee', type=int, help="Année à régulariser")
+        parser.add_argument('-o', '--sortie', help="CSV de sortie (stdout par défaut)")
+        parser.add_argument('-d', '--delimiteur', default=',', help="Séparateur CSV (',' par défaut)")
+        parser.add_argument('--reconstruire', action='store_true',
+                            help="Recalcule d'abord les cumuls à partir des bulletins enregistrés")
+
+    def handle(self, *args, **options):
+        if options['reconstruire']:
+            nombre = reconstruire_cumuls(options['societe'], options['annee'])
+            self.stderr.write(f"{nombre} cumuls reconstruits")
+
+        sortie = open(options['sortie'], 'w', newline='', encoding='utf-8') if options['sortie'] else sys.stdout
+        total = 0
+        try:
+            writer = csv.DictWriter(sortie, fieldnames=COLONNES, delimiter=options['delimiteur'],
+                                    extrasaction='ignore')
+            writer.writeheader()
+            for ligne in regularisations_annuelles(options['societe'], options['annee']):
+                writer.writerow({k: f"{v:.3f}" if isinstance(v, float) else v for k, v in ligne.items()})
+                total += 1
+        finally:
+            if sortie is not sys.stdout:
+                sortie.close()
+
+        self.stderr.write(f"{total} employés régularisés")
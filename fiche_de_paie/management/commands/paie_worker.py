@@ -0,0 +1,42 @@
+# fiche_de_paie/management/commands/paie_worker.py
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from fiche_de_paie.import_employes import lire_employes
+from fiche_de_paie.travaux import lancer_workers, soumettre_paie, travailler
+
+
+class Command(BaseCommand):
+    help = "Lance les workers de la file des traitements de paie (soumet éventuellement un fichier d'abord)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('-p', '--processus', type=int, default=os.cpu_count() or 1,
+                            help="Nombre de workers (nombre de CPU par défaut)")
+        parser.add_argument('--une-fois', action='store_true',
+                            help="S'arrêter quand la file est vide au lieu d'attendre de nouveaux traitements")
+        parser.add_argument('--soumettre', metavar='FICHIER', help="CSV/XLSX d'employés à mettre en file avant de démarrer")
+        parser.add_argument('-t', '--titre', default='', help="Titre du traitement soumis")
+        parser.add_argument('-d', '--delimiteur', default=',', help="Séparateur CSV (',' par défaut)")
+
+    def handle(self, *args, **options):
+        if options['soumettre']:
+            try:
+                with open(options['soumettre'], 'rb') as entree:
+                    job = soumettre_paie(
+                        lire_employes(entree, options['soumettre'], delimiteur=options['delimiteur']),
+                        titre=options['titre'],
+                    )
+            except OSError as e:
+                raise CommandError(f"Lecture impossible : {e}")
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stderr.write(f"Traitement {job.pk} : {job.nb_employes} employés, {len(job.rejets)} lignes rejetées")
+
+        if options['processus'] <= 1:
+            lots = travailler(une_fois=options['une_fois'])
+            self.stderr.write(f"{lots} lots traités")
+        else:
+            codes = lancer_workers(options['processus'], une_fois=options['une_fois'])
+            if any(codes):
+                raise CommandError(f"Workers arrêtés en erreur : codes {codes}")
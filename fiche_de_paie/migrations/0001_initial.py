@@ -0,0 +1,52 @@
+# Generated by Django 4.2.13 on 2026-10-18 19:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('societe', models.CharField(max_length=100)),
+                ('annee', models.IntegerField(blank=True, null=True)),
+                ('mois', models.CharField(blank=True, max_length=20)),
+                ('cree_le', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Payslip',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('matricule', models.CharField(blank=True, max_length=50)),
+                ('nom_prenom', models.CharField(max_length=100)),
+                ('societe', models.CharField(max_length=100)),
+                ('annee', models.IntegerField(blank=True, null=True)),
+                ('mois', models.CharField(blank=True, max_length=20)),
+                ('empreinte', models.CharField(max_length=40)),
+                ('version_regles', models.CharField(max_length=12)),
+                ('donnees', models.JSONField()),
+                ('cree_le', models.DateTimeField(auto_now_add=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bulletins', to='fiche_de_paie.payrollrun')),
+            ],
+            options={
+                'ordering': ['-cree_le'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='payrollrun',
+            constraint=models.UniqueConstraint(fields=('societe', 'annee', 'mois'), name='paie_unique_par_periode'),
+        ),
+        migrations.AddIndex(
+            model_name='payslip',
+            index=models.Index(fields=['matricule', 'societe', 'annee', 'mois'], name='bulletin_employe_periode'),
+        ),
+    ]
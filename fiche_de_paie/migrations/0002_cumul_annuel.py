@@ -0,0 +1,33 @@
+# Generated by Django 4.2.13 on 2026-10-18 19:51
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fiche_de_paie', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CumulAnnuel',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('matricule', models.CharField(blank=True, max_length=50)),
+                ('societe', models.CharField(max_length=100)),
+                ('annee', models.IntegerField()),
+                ('base_imposable', models.DecimalField(decimal_places=3, default=Decimal('0'), max_digits=14)),
+                ('brut_imposable', models.DecimalField(decimal_places=3, default=Decimal('0'), max_digits=14)),
+                ('irpp', models.DecimalField(decimal_places=3, default=Decimal('0'), max_digits=14)),
+                ('css', models.DecimalField(decimal_places=3, default=Decimal('0'), max_digits=14)),
+                ('bulletins', models.JSONField(default=dict)),
+                ('modifie_le', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='cumulannuel',
+            constraint=models.UniqueConstraint(fields=('matricule', 'societe', 'annee'), name='cumul_unique_par_employe'),
+        ),
+    ]
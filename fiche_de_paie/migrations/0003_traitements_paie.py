@@ -0,0 +1,47 @@
+# Generated by Django 4.2.13 on 2026-10-18 19:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fiche_de_paie', '0002_cumul_annuel'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PayrollJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('titre', models.CharField(blank=True, max_length=200)),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('termine', 'Terminé')], default='en_attente', max_length=20)),
+                ('nb_employes', models.IntegerField(default=0)),
+                ('rejets', models.JSONField(default=list)),
+                ('cree_le', models.DateTimeField(auto_now_add=True)),
+                ('termine_le', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PayrollJobShard',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('numero', models.IntegerField()),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('termine', 'Terminé')], default='en_attente', max_length=20)),
+                ('entrees', models.JSONField()),
+                ('position', models.IntegerField(default=0)),
+                ('erreurs', models.JSONField(default=list)),
+                ('worker', models.CharField(blank=True, max_length=100)),
+                ('battement', models.DateTimeField(blank=True, null=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lots', to='fiche_de_paie.payrolljob')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['statut', 'battement'], name='lot_a_reserver')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='payrolljobshard',
+            constraint=models.UniqueConstraint(fields=('job', 'numero'), name='lot_unique_par_traitement'),
+        ),
+    ]
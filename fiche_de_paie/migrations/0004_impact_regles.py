@@ -0,0 +1,72 @@
+# Generated by Django 4.2.13 on 2026-10-18 20:22
+
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def remplir_grandeurs(apps, schema_editor):
+    """Grandeurs des bulletins existants, relues dans leur instantané."""
+    Payslip = apps.get_model('fiche_de_paie', 'Payslip')
+    modifies = []
+    for bulletin in Payslip.objects.only('pk', 'donnees').iterator(chunk_size=500):
+        donnees = bulletin.donnees
+        bulletin.salaire_base = Decimal(str(donnees.get('salaire_base') or 0))
+        bulletin.annees_anciennete = int(donnees.get('annees_anciennete') or 0)
+        bulletin.base_imposable = Decimal(str(donnees.get('base_imposable_nette') or 0))
+        bulletin.brut_imposable = Decimal(str(donnees.get('brut_imposable') or 0))
+        modifies.append(bulletin)
+        if len(modifies) >= 500:
+            Payslip.objects.bulk_update(
+                modifies, ['salaire_base', 'annees_anciennete', 'base_imposable', 'brut_imposable'],
+            )
+            modifies = []
+    if modifies:
+        Payslip.objects.bulk_update(modifies, ['salaire_base', 'annees_anciennete', 'base_imposable', 'brut_imposable'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fiche_de_paie', '0003_traitements_paie'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payslip',
+            name='annees_anciennete',
+            field=models.IntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='payslip',
+            name='base_imposable',
+            field=models.DecimalField(decimal_places=3, max_digits=14, null=True),
+        ),
+        migrations.AddField(
+            model_name='payslip',
+            name='brut_imposable',
+            field=models.DecimalField(decimal_places=3, max_digits=14, null=True),
+        ),
+        migrations.AddField(
+            model_name='payslip',
+            name='salaire_base',
+            field=models.DecimalField(decimal_places=3, max_digits=14, null=True),
+        ),
+        migrations.RunPython(remplir_grandeurs, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='payslip',
+            index=models.Index(fields=['version_regles', 'salaire_base'], name='bulletin_version_salaire'),
+        ),
+        migrations.AddIndex(
+            model_name='payslip',
+            index=models.Index(fields=['version_regles', 'annees_anciennete'], name='bulletin_version_anciennete'),
+        ),
+        migrations.AddIndex(
+            model_name='payslip',
+            index=models.Index(fields=['version_regles', 'base_imposable'], name='bulletin_version_base'),
+        ),
+        migrations.AddIndex(
+            model_name='payslip',
+            index=models.Index(fields=['version_regles', 'brut_imposable'], name='bulletin_version_brut'),
+        ),
+    ]
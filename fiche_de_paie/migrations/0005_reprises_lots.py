@@ -0,0 +1,28 @@
+# Generated by Django 4.2.13 on 2026-10-18 21:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('fiche_de_paie', '0004_impact_regles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payrolljobshard',
+            name='reprises',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='payrolljob',
+            name='statut',
+            field=models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('termine', 'Terminé'), ('echec', 'Échec')], default='en_attente', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='payrolljobshard',
+            name='statut',
+            field=models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', 'En cours'), ('termine', 'Terminé'), ('echec', 'Échec')], default='en_attente', max_length=20),
+        ),
+    ]
@@ -0,0 +1,240 @@
+# fiche_de_paie/millimes.py
+"""Moteur de paie en virgule fixe entière (millimes), pour un bulletin à la fois.
+
+Variante de calcul_auto sans objets Decimal : les montants sont des entiers
+Python en millimes et chaque ``quantize`` du moteur Decimal est remplacé par
+une division entière avec le même mode d'arrondi (ROUND_HALF_EVEN pour les
+primes, cotisations et frais professionnels, ROUND_HALF_UP pour l'IRPP et la
+CSS). Les résultats sont identiques au millime près ; les taux du plan de
+règles sont convertis une fois par plan.
+"""
+from bisect import bisect_left
+from datetime import datetime
+from decimal import Decimal
+
+from .regles import booleen_saisi
+
+MILLIMES = 1000
+ABSENT = -2 ** 63  # prime non accordée (clé absente du dictionnaire de calcul_auto)
+
+# Montants calculés de tout bulletin, dans l'ordre des clés de calcul_auto ;
+# suivent les cotisations et les primes du plan (PlanMillimes.cles)
+CHAMPS_MONTANTS = (
+    'salaire_base', 'total_brut', 'brut_imposable', 'retenue_cnss', 'total_cotisations_patronales',
+    'irpp', 'css', 'total_impots', 'salaire_net', 'net_a_payer',
+    'ded_situation', 'frais_prof', 'base_imposable_nette',
+)
+NB_MONTANTS = len(CHAMPS_MONTANTS)
+
+# Déductions familiales mensuelles (en millimes), comme dans calcul_auto
+DED_CHEF_FAMILLE = 25000    # 25 TND
+DED_PAR_ENFANT = 8330       # 8.33 TND
+
+
+# === Arrondis entiers ===
+def arrondi_half_up(numerateur, diviseur):
+    """numerateur / diviseur arrondi au plus proche, égalité loin de zéro (ROUND_HALF_UP)."""
+    quotient, reste = divmod(abs(numerateur), diviseur)
+    if 2 * reste >= diviseur:
+        quotient += 1
+    return -quotient if numerateur < 0 else quotient
+
+
+def arrondi_half_even(numerateur, diviseur):
+    """numerateur / diviseur arrondi au plus proche, égalité vers le pair (ROUND_HALF_EVEN)."""
+    quotient, reste = divmod(abs(numerateur), diviseur)
+    double = 2 * reste
+    if double > diviseur or (double == diviseur and quotient & 1):
+        quotient += 1
+    return -quotient if numerateur < 0 else quotient
+
+
+def en_millimes(valeur):
+    """Montant (nombre, chaîne ou Decimal) en millimes entiers ; ValueError au-delà du millime."""
+    if isinstance(valeur, int):
+        return valeur * MILLIMES
+    montant = Decimal(str(valeur if valeur not in (None, '') else 0)).scaleb(3)
+    if montant != montant.to_integral_value():
+        raise ValueError(f"Montant plus précis que le millime : {valeur}")
+    return int(montant)
+
+
+class Taux:
+    """Taux décimal appliqué à un montant en millimes avec ``quantize(10^-decimales)``."""
+    __slots__ = ('numerateur', 'diviseur', 'facteur')
+
+    def __init__(self, taux, decimales=2):
+        signe, chiffres, exposant = Decimal(str(taux)).as_tuple()
+        numerateur = int(''.join(map(str, chiffres))) * (-1 if signe else 1)
+        # montant (1e-3) × numerateur (1e-echelle) -> arrondi à 1e-decimales -> millimes
+        echelle = max(-exposant, 0)
+        numerateur *= 10 ** max(exposant, 0)
+        self.numerateur = numerateur
+        self.diviseur = 10 ** (3 + echelle - decimales)
+        self.facteur = 10 ** (3 - decimales)
+
+    def appliquer(self, montant, arrondi=arrondi_half_even):
+        return arrondi(montant * self.numerateur, self.diviseur) * self.facteur
+
+
+# === Plan de règles en millimes ===
+class PlanMillimes:
+    """Conversion entière d'un PlanRegles (voir regles.py)."""
+    __slots__ = (
+        'version', 'primes', 'anciennete', 'cotisations_salarie', 'cotisations_employeur',
+        'planchers', 'tranches', 'css_taux', 'cles', 'debut_primes', 'heures_supp_dans_brut',
+    )
+
+    def __init__(self, plan):
+        self.version = plan.version
+        self.primes = tuple(
+            (nom, Taux(taux), en_millimes(seuil) if seuil is not None else None)
+            for nom, taux, seuil, _ in plan.primes
+        )
+        # Années entières comparées à des entiers (comparaison int / Decimal évitée)
+        self.anciennete = tuple(
+            (int(seuil) if seuil == int(seuil) else seuil, Taux(taux)) for seuil, taux in plan.anciennete
+        )
+        self.cotisations_salarie = tuple((nom, Taux(taux)) for nom, taux in plan.cotisations_salarie)
+        self.cotisations_employeur = tuple((nom, Taux(taux)) for nom, taux in plan.cotisations_employeur)
+
+        planchers, tranches = plan.bareme
+        self.planchers = tuple(en_millimes(p) for p in planchers)
+        self.tranches = tuple(
+            (en_millimes(plancher), en_millimes(plafond) if plafond.is_finite() else None,
+             Taux(taux), en_millimes(cumul))
+            for plancher, plafond, taux, cumul in tranches
+        )
+        self.css_taux = Taux(plan.css_taux)
+        self.heures_supp_dans_brut = plan.heures_supp_dans_brut
+
+        # Clés des montants calculés : communes, cotisations, primes puis ancienneté
+        cotisations = tuple(f'cotisation_{nom}' for nom, _ in plan.cotisations_salarie) + tuple(
+            f'patronale_{nom}' for nom, _ in plan.cotisations_employeur
+        )
+        self.debut_primes = NB_MONTANTS + len(cotisations)
+        self.cles = CHAMPS_MONTANTS + cotisations + tuple(nom for nom, _, _ in self.primes) + ('prime_anciennete',)
+
+
+_PLANS = {}
+
+
+def plan_millimes(plan):
+    """PlanMillimes d'un plan compilé, converti une fois par version."""
+    entree = _PLANS.get(plan.version)
+    if entree is None or entree[0] is not plan:
+        if len(_PLANS) > 16:
+            _PLANS.clear()
+        entree = _PLANS[plan.version] = (plan, PlanMillimes(plan))
+    return entree[1]
+
+
+# === Calcul ===
+def irpp_millimes(base_mensuelle, plan):
+    """IRPP mensuel (millimes) sur base annualisée, comme calcul_irpp."""
+    base_annuelle = base_mensuelle * 12
+    i = bisect_left(plan.planchers, base_annuelle) - 1
+    if i < 0:
+        return 0
+    plancher, plafond, taux, cumul = plan.tranches[i]
+    tranche = (base_annuelle if plafond is None else min(base_annuelle, plafond)) - plancher
+    irpp_annuel = cumul + taux.appliquer(tranche, arrondi_half_up)
+    # irpp_annuel / 12 arrondi au centime
+    return arrondi_half_up(irpp_annuel // 10, 12) * 10
+
+
+def css_millimes(brut_imposable, plan):
+    """CSS mensuelle (millimes), comme calcul_css."""
+    if brut_imposable * 12 > 5000 * MILLIMES:
+        return plan.css_taux.appliquer(brut_imposable, arrondi_half_up)
+    return 0
+
+
+def remplir_millimes(data, p, montants, debut=0):
+    """Calcule le bulletin de ``data`` dans ``montants[debut:debut + len(p.cles)]``.
+
+    ``p`` est un PlanMillimes ; les montants sont écrits en millimes dans l'ordre
+    de ``p.cles``, une prime non accordée valant ABSENT. ``montants`` est une
+    liste ou un ``array('q')`` déjà dimensionné.
+    """
+    salaire_base = en_millimes(data.get('salaire_base', 0))
+    annees_anciennete = int(data.get('annees_anciennete', 0))
+    enfants = int(data.get('enfants', 0))
+
+    # Primes en pourcentage, puis ancienneté (échelon le plus haut atteint)
+    total_brut = salaire_base
+    i = debut + p.debut_primes
+    for _, taux, seuil in p.primes:
+        if seuil is not None and salaire_base < seuil:
+            montants[i] = ABSENT
+        else:
+            montant = montants[i] = taux.appliquer(salaire_base)
+            total_brut += montant
+        i += 1
+    montants[i] = ABSENT
+    for seuil, taux in p.anciennete:
+        if annees_anciennete >= seuil:
+            montant = taux.appliquer(salaire_base)
+            if montant > 0:
+                montants[i] = montant
+                total_brut += montant
+            break
+    # Heures supplémentaires (montant), ajoutées au brut
+    if p.heures_supp_dans_brut:
+        total_brut += en_millimes(data.get('heures_supp', 0))
+
+    i = debut + NB_MONTANTS
+    retenue_cnss = 0
+    for _, taux in p.cotisations_salarie:
+        montant = montants[i] = taux.appliquer(total_brut)
+        retenue_cnss += montant
+        i += 1
+    total_patronal = 0
+    for _, taux in p.cotisations_employeur:
+        montant = montants[i] = taux.appliquer(total_brut)
+        total_patronal += montant
+        i += 1
+
+    brut_imposable = total_brut - retenue_cnss
+    chef_famille = booleen_saisi(data.get('chef_famille', False))
+    ded_situation = (DED_CHEF_FAMILLE if chef_famille else 0) + DED_PAR_ENFANT * enfants
+    frais_prof = arrondi_half_even(brut_imposable, 10)
+    base_imposable_nette = max(brut_imposable - ded_situation - frais_prof, 0)
+
+    irpp = irpp_millimes(base_imposable_nette, p)
+    css = css_millimes(brut_imposable, p)
+    total_impots = irpp + css
+    salaire_net = total_brut - retenue_cnss - total_impots
+    avance = en_millimes(data.get('avance', 0))
+    autres_deductions = en_millimes(data.get('autres_deductions', 0))
+
+    # Dans l'ordre de CHAMPS_MONTANTS
+    montants[debut] = salaire_base
+    montants[debut + 1] = total_brut
+    montants[debut + 2] = brut_imposable
+    montants[debut + 3] = retenue_cnss
+    montants[debut + 4] = total_patronal
+    montants[debut + 5] = irpp
+    montants[debut + 6] = css
+    montants[debut + 7] = total_impots
+    montants[debut + 8] = salaire_net
+    montants[debut + 9] = salaire_net - avance - autres_deductions
+    montants[debut + 10] = ded_situation
+    montants[debut + 11] = frais_prof
+    montants[debut + 12] = base_imposable_nette
+    return montants
+
+
+def calcul_auto_millimes(data, plan):
+    """calcul_auto sur le moteur entier : met à jour et retourne ``data`` (mêmes clés, mêmes valeurs)."""
+    p = plan_millimes(plan)
+    cles = p.cles
+    montants = remplir_millimes(data, p, [0] * len(cles))
+    for i in range(NB_MONTANTS):
+        data[cles[i]] = montants[i] / MILLIMES
+    data['date_generation'] = datetime.now().strftime('%d/%m/%Y')
+    # Cotisations, puis primes accordées
+    for i in range(NB_MONTANTS, len(cles)):
+        if montants[i] != ABSENT:
+            data[cles[i]] = montants[i] / MILLIMES
+    return data
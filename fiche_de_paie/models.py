@@ -1 +1,140 @@
-     
\ No newline at end of file
+# fiche_de_paie/models.py
+from decimal import Decimal
+
+from django.db import models
+
+
+class PayrollRun(models.Model):
+    """Paie d'une société pour une période (mois, année)."""
+    societe = models.CharField(max_length=100)
+    annee = models.IntegerField(null=True, blank=True)
+    mois = models.CharField(max_length=20, blank=True)
+    cree_le = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['societe', 'annee', 'mois'], name='paie_unique_par_periode'),
+        ]
+
+    def __str__(self):
+        return f"Paie {self.societe} - {self.mois} {self.annee}"
+
+
+class Payslip(models.Model):
+    """Bulletin calculé, conservé tel qu'il a été émis.
+
+    ``donnees`` contient le dictionnaire produit par calcul_auto (entrées et
+    montants) : une réimpression relit ce résultat sans recalcul, et reste
+    identique même après un changement des règles (``version_regles``).
+    """
+    run = models.ForeignKey(PayrollRun, on_delete=models.CASCADE, related_name='bulletins')
+    # Clé employé / société / période dénormalisée : réimpression en une lecture indexée
+    matricule = models.CharField(max_length=50, blank=True)
+    nom_prenom = models.CharField(max_length=100)
+    societe = models.CharField(max_length=100)
+    annee = models.IntegerField(null=True, blank=True)
+    mois = models.CharField(max_length=20, blank=True)
+    # Empreinte des entrées du formulaire : un bulletin identique n'est pas recalculé
+    empreinte = models.CharField(max_length=40)
+    version_regles = models.CharField(max_length=12)
+    # Grandeurs qui déterminent les règles appliquées (primes à seuil, échelon
+    # d'ancienneté, tranche IRPP, CSS) : analyse d'impact par requêtes d'intervalle
+    salaire_base = models.DecimalField(max_digits=14, decimal_places=3, null=True)
+    annees_anciennete = models.IntegerField(null=True)
+    base_imposable = models.DecimalField(max_digits=14, decimal_places=3, null=True)
+    brut_imposable = models.DecimalField(max_digits=14, decimal_places=3, null=True)
+    donnees = models.JSONField()
+    cree_le = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['matricule', 'societe', 'annee', 'mois'], name='bulletin_employe_periode'),
+            models.Index(fields=['version_regles', 'salaire_base'], name='bulletin_version_salaire'),
+            models.Index(fields=['version_regles', 'annees_anciennete'], name='bulletin_version_anciennete'),
+            models.Index(fields=['version_regles', 'base_imposable'], name='bulletin_version_base'),
+            models.Index(fields=['version_regles', 'brut_imposable'], name='bulletin_version_brut'),
+        ]
+        ordering = ['-cree_le']
+
+    def __str__(self):
+        return f"Bulletin {self.nom_prenom} - {self.mois} {self.annee}"
+
+
+class CumulAnnuel(models.Model):
+    """Cumuls de l'année d'un employé, mis à jour à chaque bulletin émis.
+
+    Chaque mois compte une seule fois : ``bulletins`` associe le numéro du mois
+    au bulletin retenu, et un nouveau bulletin pour le même mois remplace
+    l'ancien dans les cumuls. La régularisation annuelle se fait à partir de
+    ces seuls montants, sans recalculer les douze mois.
+    """
+    matricule = models.CharField(max_length=50, blank=True)
+    societe = models.CharField(max_length=100)
+    annee = models.IntegerField()
+    base_imposable = models.DecimalField(max_digits=14, decimal_places=3, default=Decimal('0'))
+    brut_imposable = models.DecimalField(max_digits=14, decimal_places=3, default=Decimal('0'))
+    irpp = models.DecimalField(max_digits=14, decimal_places=3, default=Decimal('0'))
+    css = models.DecimalField(max_digits=14, decimal_places=3, default=Decimal('0'))
+    bulletins = models.JSONField(default=dict)
+    modifie_le = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['matricule', 'societe', 'annee'], name='cumul_unique_par_employe'),
+        ]
+
+    def __str__(self):
+        return f"Cumuls {self.matricule} - {self.societe} {self.annee}"
+
+
+class PayrollJob(models.Model):
+    """Traitement de paie en tâche de fond (voir travaux.py).
+
+    Les employés sont répartis en lots (PayrollJobShard) traités par les
+    workers ; l'avancement se lit sur les lots.
+    """
+    EN_ATTENTE, EN_COURS, TERMINE, ECHEC = 'en_attente', 'en_cours', 'termine', 'echec'
+    STATUTS = [(EN_ATTENTE, 'En attente'), (EN_COURS, 'En cours'), (TERMINE, 'Terminé'), (ECHEC, 'Échec')]
+
+    titre = models.CharField(max_length=200, blank=True)
+    statut = models.CharField(max_length=20, choices=STATUTS, default=EN_ATTENTE)
+    nb_employes = models.IntegerField(default=0)
+    # Lignes rejetées à la soumission : [[numero, erreurs], ...]
+    rejets = models.JSONField(default=list)
+    cree_le = models.DateTimeField(auto_now_add=True)
+    termine_le = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Traitement {self.pk} {self.titre} ({self.statut})"
+
+
+class PayrollJobShard(models.Model):
+    """Lot d'employés d'un traitement, réservé par un seul worker à la fois.
+
+    ``position`` est le point de reprise : nombre d'employés du lot déjà
+    enregistrés. Il avance dans la même transaction que les bulletins, et un
+    lot dont le worker ne donne plus signe de vie (``battement``) est repris
+    à cette position par un autre worker ; au-delà de quelques reprises
+    (``reprises``), il passe en échec.
+    """
+    job = models.ForeignKey(PayrollJob, on_delete=models.CASCADE, related_name='lots')
+    numero = models.IntegerField()
+    statut = models.CharField(max_length=20, choices=PayrollJob.STATUTS, default=PayrollJob.EN_ATTENTE)
+    entrees = models.JSONField()
+    position = models.IntegerField(default=0)
+    # Erreurs de calcul : [[numero_ligne, message], ...]
+    erreurs = models.JSONField(default=list)
+    worker = models.CharField(max_length=100, blank=True)
+    battement = models.DateTimeField(null=True, blank=True)
+    reprises = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['job', 'numero'], name='lot_unique_par_traitement'),
+        ]
+        indexes = [
+            models.Index(fields=['statut', 'battement'], name='lot_a_reserver'),
+        ]
+
+    def __str__(self):
+        return f"Lot {self.numero} du traitement {self.job_id}"
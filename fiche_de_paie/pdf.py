@@ -0,0 +1,505 @@
+# fiche_de_paie/pdf.py
+"""Rendu PDF des bulletins de paie.
+
+Deux chemins produisent le même rendu : le rendu classique dessine tout le
+bulletin, le mode gabarit rejoue une mise en page statique (bandeaux,
+bordures, libellés) construite une fois par société et forme de bulletin,
+puis n'écrit que les cellules propres à l'employé.
+"""
+import re
+import threading
+from collections import OrderedDict
+
+import fpdf.fpdf
+from django.conf import settings
+from fpdf import FPDF
+
+# Incrémentée à chaque modification de _dessiner_bulletin
+VERSION_MISE_EN_PAGE = 2
+TAILLE_MAX_GABARITS = 64
+
+# Police TrueType des bulletins dont les textes sortent du latin-1 (style -> fichier)
+POLICES_UNICODE = {
+    '': '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+    'B': '/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf',
+}
+ECRITURES_DROITE_GAUCHE = re.compile('[\u0590-\u08ff\ufb1d-\ufdff\ufe70-\ufeff]')
+
+LIGNES_GAINS = (
+    ("Salaire de base", 'salaire_base'),
+    ("Prime de presence", 'prime_presence'),
+    ("Indemnite de transport", 'indemn_transport'),
+    ("Prime panier", 'prime_panier'),
+    ("Prime de rendement", 'prime_rendement'),
+    ("Prime d'anciennete", 'prime_anciennete'),
+    ("Heures supplementaires", 'heures_supp'),
+)
+
+LIGNES_COTISATIONS = (
+    ("Assurances sociales (5%)", 'cotisation_assurances', 'patronale_assurances'),
+    ("Cotisation supp. maladie (1.43%)", 'cotisation_supp', 'patronale_supp'),
+    ("Regime de pensions (2.75%)", 'cotisation_pensions', 'patronale_pensions'),
+    ("Assurance chomage (0.5%)", 'cotisation_chomage', 'patronale_chomage'),
+    ("Majoration loi 74-101 (0.5%)", None, 'patronale_majoration_loi_74_101'),
+)
+
+# Lignes affichées seulement si le montant est positif
+LIGNES_OPTIONNELLES = tuple(cle for _, cle in LIGNES_GAINS) + (
+    'ded_situation', 'frais_prof', 'avance', 'autres_deductions',
+)
+
+
+def forme_bulletin(data):
+    """Lignes optionnelles présentes sur le bulletin de ``data``."""
+    return frozenset(cle for cle in LIGNES_OPTIONNELLES if (data.get(cle, 0) or 0) > 0)
+
+
+# --- Textes des cellules variables ---
+def _texte(cle):
+    return lambda d: str(d.get(cle, '-'))
+
+
+def _montant(cle, prefixe='', suffixe=''):
+    return lambda d: f"{prefixe}{d.get(cle, 0):.3f}{suffixe}"
+
+
+def _montant_ou_tiret(cle):
+    return lambda d: f"{d.get(cle, 0):.3f}" if cle and d.get(cle, 0) > 0 else "-"
+
+
+def _statut_familial(d):
+    statut = "Chef de famille" if d.get('chef_famille') else "Celibataire"
+    enfants = f" - {d.get('enfants', 0)} enfant(s)" if d.get('enfants', 0) > 0 else ""
+    return f"{statut}{enfants}"
+
+
+# --- Mise en page du bulletin ---
+def _dessiner_bulletin(pdf, data, forme, champ):
+    """Dessine le bulletin sur la page courante.
+
+    Les cellules dont le texte dépend de l'employé passent par
+    ``champ(w, h, texte, **options)`` où ``texte(data)`` produit le texte ;
+    les lignes optionnelles présentes sont listées dans ``forme``.
+    """
+    # Couleurs personnalisées
+    color_header = (52, 73, 94)      # Bleu foncé
+    color_section = (236, 240, 241)  # Gris clair
+    color_red = (231, 76, 60)        # Rouge
+    color_green = (39, 174, 96)      # Vert
+    
+    # --- En-tête ---
+    pdf.set_fill_color(*color_header)
+    pdf.set_text_color(255, 255, 255)
+    pdf.set_font("Arial", "B", 16)
+    pdf.cell(0, 12, data.get('societe', 'SOCIETE DIAMOND'), ln=True, align='C', fill=True)
+    
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font("Arial", "B", 13)
+    champ(0, 8, lambda d: f"Bulletin de Paie - {d.get('mois', '-')} {d.get('annee', '-')}", ln=True, align='C')
+    pdf.set_font("Arial", "", 11)
+    champ(0, 6, lambda d: f"CNSS : {d.get('cnss', '-')}", ln=True, align='C')
+    pdf.ln(5)
+    
+    # --- Informations employé ---
+    pdf.set_fill_color(*color_section)
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 8, "INFORMATIONS EMPLOYE", ln=True, fill=True)
+    pdf.set_font("Arial", "", 10)
+    
+    # Tableau informations
+    info_data = [
+        ["Nom & Prenom:", 'nom_prenom', "Matricule:", 'matricule'],
+        ["Emploi:", 'emploi', "CIN:", 'cin'],
+    ]
+    
+    for row in info_data:
+        pdf.set_font("Arial", "B", 10)
+        pdf.cell(45, 6, row[0], border=1)
+        pdf.set_font("Arial", "", 10)
+        champ(50, 6, _texte(row[1]), border=1)
+        pdf.set_font("Arial", "B", 10)
+        pdf.cell(40, 6, row[2], border=1)
+        pdf.set_font("Arial", "", 10)
+        champ(0, 6, _texte(row[3]), border=1, ln=True)
+    
+    # Statut familial
+    pdf.set_font("Arial", "B", 10)
+    pdf.cell(45, 6, "Statut familial:", border=1)
+    pdf.set_font("Arial", "", 10)
+    champ(0, 6, _statut_familial, border=1, ln=True)
+    pdf.ln(5)
+    
+    # --- Gains et Primes ---
+    pdf.set_fill_color(*color_section)
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 8, "GAINS ET PRIMES", ln=True, fill=True)
+    
+    # En-tête tableau
+    pdf.set_fill_color(*color_header)
+    pdf.set_text_color(255, 255, 255)
+    pdf.set_font("Arial", "B", 10)
+    pdf.cell(130, 7, "Designation", border=1, fill=True)
+    pdf.cell(0, 7, "Montant (TND)", border=1, align='R', fill=True, ln=True)
+    
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font("Arial", "", 10)
+    
+    # Lignes gains
+    for libelle, cle in LIGNES_GAINS:
+        if cle in forme:
+            pdf.cell(130, 6, libelle, border=1)
+            champ(0, 6, _montant(cle), border=1, align='R', ln=True)
+    
+    # Total brut
+    pdf.set_fill_color(*color_section)
+    pdf.set_font("Arial", "B", 10)
+    pdf.cell(130, 7, "TOTAL BRUT", border=1, fill=True)
+    champ(0, 7, _montant('total_brut'), border=1, align='R', fill=True, ln=True)
+    pdf.ln(5)
+    
+    # --- Cotisations Sociales ---
+    pdf.set_fill_color(*color_section)
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 8, "COTISATIONS SOCIALES", ln=True, fill=True)
+    
+    # En-tête tableau
+    pdf.set_fill_color(*color_header)
+    pdf.set_text_color(255, 255, 255)
+    pdf.set_font("Arial", "B", 9)
+    pdf.cell(90, 7, "Designation", border=1, fill=True)
+    pdf.cell(50, 7, "Part Salariale", border=1, align='R', fill=True)
+    pdf.cell(0, 7, "Part Patronale", border=1, align='R', fill=True, ln=True)
+    
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font("Arial", "", 9)
+    
+    for libelle, cle_s, cle_p in LIGNES_COTISATIONS:
+        pdf.cell(90, 6, libelle, border=1)
+        champ(50, 6, _montant_ou_tiret(cle_s), border=1, align='R')
+        champ(0, 6, _montant(cle_p), border=1, align='R', ln=True)
+    
+    # Total cotisations
+    pdf.set_fill_color(*color_section)
+    pdf.set_font("Arial", "B", 9)
+    pdf.cell(90, 7, "TOTAL COTISATIONS", border=1, fill=True)
+    champ(50, 7, _montant('retenue_cnss'), border=1, align='R', fill=True)
+    champ(0, 7, _montant('total_cotisations_patronales'), border=1, align='R', fill=True, ln=True)
+    pdf.ln(5)
+    
+    # --- Impôts et Contributions ---
+    pdf.set_fill_color(*color_section)
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 8, "IMPOTS ET CONTRIBUTIONS", ln=True, fill=True)
+    
+    # En-tête tableau
+    pdf.set_fill_color(*color_header)
+    pdf.set_text_color(255, 255, 255)
+    pdf.set_font("Arial", "B", 10)
+    pdf.cell(130, 7, "Designation", border=1, fill=True)
+    pdf.cell(0, 7, "Montant (TND)", border=1, align='R', fill=True, ln=True)
+    
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_font("Arial", "", 10)
+    
+    # Calcul imposable
+    pdf.cell(130, 6, "Salaire brut imposable", border=1)
+    champ(0, 6, _montant('brut_imposable'), border=1, align='R', ln=True)
+    
+    if 'ded_situation' in forme:
+        pdf.cell(130, 6, "Deduction situation familiale", border=1)
+        pdf.set_text_color(*color_red)
+        champ(0, 6, _montant('ded_situation', '-'), border=1, align='R', ln=True)
+        pdf.set_text_color(0, 0, 0)
+    
+    if 'frais_prof' in forme:
+        pdf.cell(130, 6, "Frais professionnels (10%)", border=1)
+        pdf.set_text_color(*color_red)
+        champ(0, 6, _montant('frais_prof', '-'), border=1, align='R', ln=True)
+        pdf.set_text_color(0, 0, 0)
+    
+    # Base imposable nette
+    pdf.set_fill_color(248, 249, 250)
+    pdf.set_font("Arial", "B", 10)
+    pdf.cell(130, 6, "Base imposable nette", border=1, fill=True)
+    champ(0, 6, _montant('base_imposable_nette'), border=1, align='R', fill=True, ln=True)
+    pdf.set_font("Arial", "", 10)
+    
+    # IRPP et CSS
+    pdf.cell(130, 6, "IRPP (Impot sur le revenu)", border=1)
+    pdf.set_text_color(*color_red)
+    champ(0, 6, _montant('irpp'), border=1, align='R', ln=True)
+    
+    pdf.set_text_color(0, 0, 0)
+    pdf.cell(130, 6, "CSS (Contribution solidarite - 0.5%)", border=1)
+    pdf.set_text_color(*color_red)
+    champ(0, 6, _montant('css'), border=1, align='R', ln=True)
+    
+    # Total impôts
+    pdf.set_text_color(0, 0, 0)
+    pdf.set_fill_color(*color_section)
+    pdf.set_font("Arial", "B", 10)
+    pdf.cell(130, 7, "TOTAL IMPOTS", border=1, fill=True)
+    pdf.set_text_color(*color_red)
+    champ(0, 7, _montant('total_impots'), border=1, align='R', fill=True, ln=True)
+    pdf.set_text_color(0, 0, 0)
+    pdf.ln(5)
+    
+    # --- Récapitulatif Final ---
+    pdf.set_fill_color(*color_section)
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(0, 8, "RECAPITULATIF", ln=True, fill=True)
+    
+    pdf.set_font("Arial", "", 10)
+    recap_data = [
+        ("Salaire brut total", 'total_brut', False),
+        ("Cotisations sociales salariales", 'retenue_cnss', True),
+        ("IRPP", 'irpp', True),
+        ("CSS", 'css', True),
+    ]
+    
+    if 'avance' in forme:
+        recap_data.append(("Avances et acomptes", 'avance', True))
+    
+    if 'autres_deductions' in forme:
+        recap_data.append(("Autres deductions", 'autres_deductions', True))
+    
+    for libelle, cle, is_negative in recap_data:
+        pdf.cell(130, 6, libelle, border=1)
+        if is_negative:
+            pdf.set_text_color(*color_red)
+            champ(0, 6, _montant(cle, '-'), border=1, align='R', ln=True)
+            pdf.set_text_color(0, 0, 0)
+        else:
+            champ(0, 6, _montant(cle), border=1, align='R', ln=True)
+    
+    # NET À PAYER
+    pdf.set_fill_color(39, 174, 96)
+    pdf.set_text_color(255, 255, 255)
+    pdf.set_font("Arial", "B", 12)
+    pdf.cell(130, 10, "NET A PAYER", border=1, fill=True)
+    champ(0, 10, _montant('net_a_payer', suffixe=' TND'), border=1, align='R', fill=True, ln=True)
+    pdf.set_text_color(0, 0, 0)
+    pdf.ln(10)
+    
+    # --- Signatures ---
+    # Bloc insécable : en bas de page, chaque cellule provoquerait son propre saut de page
+    if pdf.get_y() + 12 > pdf.page_break_trigger:
+        pdf.add_page()
+    y_position = pdf.get_y()
+    
+    # Signature responsable
+    pdf.set_xy(20, y_position)
+    pdf.set_font("Arial", "B", 10)
+    pdf.cell(80, 6, "Le responsable", align='C', ln=True)
+    pdf.set_x(20)
+    pdf.set_font("Arial", "", 9)
+    pdf.cell(80, 6, "Signature et cachet", align='C')
+    
+    # Signature employé
+    pdf.set_xy(110, y_position)
+    pdf.set_font("Arial", "B", 10)
+    pdf.cell(80, 6, "L'employe", align='C', ln=True)
+    pdf.set_xy(110, y_position + 6)
+    pdf.set_font("Arial", "", 9)
+    pdf.cell(80, 6, "Signature", align='C')
+    
+    pdf.ln(15)
+    
+    # --- Pied de page ---
+    pdf.set_y(-20)
+    pdf.set_font("Arial", "I", 8)
+    pdf.set_text_color(127, 140, 141)
+    champ(0, 5, lambda d: f"Bulletin etabli le {d.get('date_generation', '-')} - Conforme a la legislation tunisienne 2025", align='C')
+
+
+
+# --- Textes hors latin-1 : police TrueType Unicode ---
+def textes_latin1(data):
+    """Vrai si tous les textes de ``data`` s'écrivent avec les polices standard du PDF."""
+    for valeur in data.values():
+        if isinstance(valeur, str):
+            try:
+                valeur.encode('latin1')
+            except UnicodeEncodeError:
+                return False
+    return True
+
+
+def ordre_visuel(texte):
+    """Texte arabe ou hébreu mis en forme et en ordre d'affichage.
+
+    Utilise arabic-reshaper et python-bidi s'ils sont installés (dépendances
+    optionnelles). À défaut, le texte est simplement retourné, les suites de
+    chiffres et de lettres latines gardant leur sens : lettres non liées,
+    mais lues dans le bon ordre.
+    """
+    if not ECRITURES_DROITE_GAUCHE.search(texte):
+        return texte
+    try:
+        import arabic_reshaper
+        from bidi.algorithm import get_display
+    except ImportError:
+        return re.sub(r'[0-9A-Za-z\u00c0-\u024f][0-9A-Za-z\u00c0-\u024f.,:/-]*', lambda m: m.group()[::-1], texte[::-1])
+    return get_display(arabic_reshaper.reshape(texte))
+
+
+_polices_unicode = {}
+_verrou_polices = threading.Lock()
+
+
+def _police_unicode(style):
+    """Métriques de la police Unicode d'un style, lues une fois par processus."""
+    with _verrou_polices:
+        police = _polices_unicode.get(style)
+        if police is None:
+            chemin = getattr(settings, 'PAIE_POLICES_UNICODE', POLICES_UNICODE)[style]
+            pdf = FPDF()
+            # Pas de fichier de métriques .pkl écrit à côté de la police
+            mode, fpdf.fpdf.FPDF_CACHE_MODE = fpdf.fpdf.FPDF_CACHE_MODE, 1
+            try:
+                pdf.add_font('unicode', style, chemin, uni=True)
+            except RuntimeError as e:
+                raise ValueError(f"Police Unicode introuvable : {chemin}") from e
+            finally:
+                fpdf.fpdf.FPDF_CACHE_MODE = mode
+            cle = 'unicode' + style
+            police = _polices_unicode[style] = (pdf.fonts[cle], pdf.font_files[cle])
+    return police
+
+
+class PdfUnicode(FPDF):
+    """FPDF dont la famille Arial est remplacée par la police TrueType Unicode.
+
+    Seuls les glyphes utilisés sont intégrés au document (sous-ensemble) ; la
+    police n'a pas d'italique, remplacé par le style normal.
+    """
+
+    def __init__(self):
+        super().__init__('P', 'mm', 'A4')
+        for style in ('', 'B'):
+            police, fichier = _police_unicode(style)
+            cle = 'unicode' + style
+            self.fonts[cle] = dict(police, i=len(self.fonts) + 1, subset=list(range(32)))
+            self.font_files[cle] = dict(fichier)
+
+    def set_font(self, family, style='', size=0):
+        if family.lower() in ('arial', 'helvetica'):
+            family, style = 'unicode', 'B' if 'B' in style.upper() else ''
+        super().set_font(family, style, size)
+
+
+# --- Génération PDF améliorée avec FPDF ---
+def _nouveau_pdf(unicode=False):
+    pdf = PdfUnicode() if unicode else FPDF('P', 'mm', 'A4')
+    pdf.add_page()
+    pdf.set_auto_page_break(auto=True, margin=15)
+    return pdf
+
+
+def construire_pdf_bulletin(data, gabarit=False):
+    """Document FPDF du bulletin, pages dessinées mais non finalisées.
+
+    Avec ``gabarit=True``, la mise en page statique est reprise du cache de
+    gabarits et seules les cellules variables sont dessinées. Un bulletin dont
+    les textes sortent du latin-1 (noms accentués hors Europe de l'Ouest,
+    arabe...) est dessiné avec la police Unicode, sans gabarit.
+    """
+    unicode = not textes_latin1(data)
+    if gabarit and not unicode:
+        return gabarit_bulletin(data).remplir(data)
+
+    pdf = _nouveau_pdf(unicode)
+    if unicode:
+        data = {k: ordre_visuel(v) if isinstance(v, str) else v for k, v in data.items()}
+
+    def champ(w, h, texte, **options):
+        pdf.cell(w, h, texte(data), **options)
+
+    _dessiner_bulletin(pdf, data, forme_bulletin(data), champ)
+    return pdf
+
+
+def generate_pdf_fpdf(data, gabarit=False, compact=False):
+    """Génère un PDF professionnel avec FPDF
+
+    Avec ``compact=True``, le document est réécrit en PDF 1.5 compact (voir
+    recueil_pdf.bulletin_pdf_compact) : même rendu, moins d'octets.
+    """
+    if compact:
+        # recueil_pdf dépend de ce module : import à l'appel
+        from .recueil_pdf import bulletin_pdf_compact
+        return bulletin_pdf_compact(data, gabarit)
+    return construire_pdf_bulletin(data, gabarit).output(dest='S').encode('latin1')
+
+
+# --- Gabarits pré-rendus ---
+class GabaritBulletin:
+    """Mise en page statique d'un bulletin et emplacements des cellules variables."""
+
+    def __init__(self, data, forme):
+        pdf = _nouveau_pdf()
+        self.emplacements = []
+
+        def champ(w, h, texte, border=0, ln=0, align='', fill=False):
+            # Saut de page automatique : la cellule sera dessinée en haut de la page suivante
+            if pdf.y + h > pdf.page_break_trigger:
+                pdf.add_page()
+            # Couleur effective du texte : celle du remplissage si FPDF n'isole pas la couleur
+            couleur = pdf.text_color if pdf.color_flag else pdf.fill_color
+            self.emplacements.append((
+                pdf.page, pdf.x, pdf.y, w, h, align, texte,
+                pdf.font_family, pdf.font_style, pdf.font_size_pt, couleur,
+            ))
+            # Bordures et fond restent dans le contenu statique
+            pdf.cell(w, h, '', border, ln, align, fill)
+
+        _dessiner_bulletin(pdf, data, forme, champ)
+        self.pages = dict(pdf.pages)
+        self.polices = pdf.fonts
+
+    def remplir(self, data):
+        pdf = _nouveau_pdf()
+        for _ in range(1, len(self.pages)):
+            pdf.add_page()
+        pdf.pages.update(self.pages)
+        pdf.page = 0
+        # Mêmes numéros de police que le contenu statique (copie : _putfonts les modifie)
+        pdf.fonts = {nom: dict(police) for nom, police in self.polices.items()}
+        pdf.color_flag = True
+        for page, x, y, w, h, align, texte, famille, style, taille, couleur in self.emplacements:
+            if page != pdf.page:
+                # La police courante du flux est celle de la fin du contenu statique
+                pdf.page = page
+                pdf.font_family = ''
+            pdf.set_font(famille, style, taille)
+            pdf.text_color = couleur
+            pdf.set_xy(x, y)
+            pdf.cell(w, h, texte(data), 0, 0, align)
+        pdf.page = len(self.pages)
+        return pdf
+
+
+_gabarits = OrderedDict()
+_verrou_gabarits = threading.Lock()
+
+
+def gabarit_bulletin(data):
+    """Gabarit (mis en cache) pour la société et la forme du bulletin de ``data``."""
+    forme = forme_bulletin(data)
+    cle = (VERSION_MISE_EN_PAGE, data.get('societe', 'SOCIETE DIAMOND'), forme)
+    with _verrou_gabarits:
+        modele = _gabarits.get(cle)
+        if modele is not None:
+            _gabarits.move_to_end(cle)
+    if modele is None:
+        modele = GabaritBulletin(data, forme)
+        with _verrou_gabarits:
+            _gabarits[cle] = modele
+            while len(_gabarits) > TAILLE_MAX_GABARITS:
+                _gabarits.popitem(last=False)
+    return modele
+
+
+def nom_fichier_bulletin(data):
+    """Nom du fichier PDF d'un bulletin"""
+    return f"bulletin_paie_{data.get('nom_prenom', 'employe').replace(' ', '_')}_{data.get('mois', '')}_{data.get('annee', '')}.pdf"
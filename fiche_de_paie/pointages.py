@@ -0,0 +1,267 @@
+# fiche_de_paie/pointages.py
+"""Heures supplémentaires calculées des pointages.
+
+Un relevé de pointages est un CSV d'heures travaillées par jour et par employé
+(colonnes ``matricule``, ``date``, ``heures`` ; plusieurs lignes d'un même
+jour s'additionnent). Les heures sont lues en minutes entières, cumulées par
+semaine (du lundi au dimanche) avec NumPy, puis réparties entre les tranches
+de majoration de HEURES_SUPPLEMENTAIRES : une semaine de 50 h donne, au régime
+de 40 h, 8 h majorées de 25 % et 2 h majorées de 75 %. Une semaine à cheval
+sur deux mois est décomptée avec les seuls jours présents dans le relevé.
+Une date à plus de ``PAIE_POINTAGES_MAX_SEMAINES`` semaines (6 par défaut) de
+la date médiane du relevé est rejetée comme une ligne invalide : une faute de
+frappe (``01/01/0001``) ne doit pas gonfler le cumul hebdomadaire.
+
+Le montant vaut ``salaire_base / heures_mensuelles`` × heures majorées,
+arrondi au centime comme les primes, et est calculé en entiers (millimes) :
+aucune erreur d'arrondi d'un employé à l'autre. ReleveHeures.appliquer
+renseigne ``heures_supp`` des employés importés (import_employes) ; le montant
+du relevé remplace alors la saisie manuelle.
+"""
+import csv
+from datetime import datetime
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+
+from .auto_config import HEURES_SUPPLEMENTAIRES
+from .batch import _arrondi_half_even, _taux_entier
+from .millimes import MILLIMES, arrondi_half_even, en_millimes
+
+COLONNES_POINTAGES = ('matricule', 'date', 'heures')
+FORMATS_DATE = ('%Y-%m-%d', '%d/%m/%Y')
+MAX_SEMAINES = 6
+
+
+# === Lecture du relevé ===
+def _minutes(texte):
+    """Durée '7.5', '7,5' ou '7:30' en minutes entières ; ValueError sinon."""
+    texte = texte.strip()
+    if ':' in texte:
+        heures, _, minutes = texte.partition(':')
+        heures, minutes = int(heures), int(minutes)
+        if not 0 <= minutes < 60:
+            raise ValueError(texte)
+        total = heures * 60 + minutes
+    else:
+        total = Decimal(texte.replace(',', '.')) * 60
+        if total != total.to_integral_value():
+            raise ValueError(texte)
+        total = int(total)
+    if not 0 <= total <= 24 * 60:
+        raise ValueError(texte)
+    return total
+
+
+def _jour(texte):
+    """Date ISO ou JJ/MM/AAAA en numéro de jour (date.toordinal) ; ValueError sinon."""
+    texte = texte.strip()
+    for format_date in FORMATS_DATE:
+        try:
+            return datetime.strptime(texte, format_date).toordinal()
+        except ValueError:
+            pass
+    raise ValueError(texte)
+
+
+class Pointages:
+    """Relevé lu en colonnes : indice d'employé, jour (ordinal) et minutes de chaque ligne."""
+    __slots__ = ('matricules', 'employe', 'jour', 'minutes', 'erreurs')
+
+    def __init__(self, matricules, employe, jour, minutes, erreurs):
+        self.matricules = matricules
+        self.employe = employe
+        self.jour = jour
+        self.minutes = minutes
+        self.erreurs = erreurs
+
+    def __len__(self):
+        return len(self.employe)
+
+
+def lire_pointages(flux, delimiteur=',', max_semaines=None):
+    """Lit un relevé CSV texte ; les lignes invalides sont écartées dans ``erreurs``.
+
+    ``erreurs`` liste des ``(numero_ligne, message)`` ; ValueError si une
+    colonne obligatoire manque. Les dates et durées, très répétées, ne sont
+    analysées qu'une fois chacune. Les dates à plus de ``max_semaines``
+    semaines de la date médiane (réglage PAIE_POINTAGES_MAX_SEMAINES par
+    défaut) sont hors relevé.
+    """
+    if max_semaines is None:
+        max_semaines = getattr(settings, 'PAIE_POINTAGES_MAX_SEMAINES', MAX_SEMAINES)
+    lecteur = csv.reader(flux, delimiter=delimiteur)
+    entetes = [nom.strip().lower() for nom in next(lecteur, [])]
+    manquantes = [nom for nom in COLONNES_POINTAGES if nom not in entetes]
+    if manquantes:
+        raise ValueError(f"Colonnes manquantes dans le relevé de pointages : {', '.join(manquantes)}")
+    i_matricule, i_date, i_heures = (entetes.index(nom) for nom in COLONNES_POINTAGES)
+    largeur = max(i_matricule, i_date, i_heures) + 1
+
+    index, matricules, erreurs = {}, [], []
+    numeros, employe, jour, minutes = [], [], [], []
+    jours_lus, durees_lues = {}, {}
+    for numero, ligne in enumerate(lecteur, start=2):
+        if not ligne:
+            continue
+        if len(ligne) < largeur:
+            erreurs.append((numero, "Ligne incomplète"))
+            continue
+        matricule = ligne[i_matricule].strip()
+        if not matricule:
+            erreurs.append((numero, "Matricule manquant"))
+            continue
+        texte_date, texte_heures = ligne[i_date], ligne[i_heures]
+        try:
+            j = jours_lus[texte_date]
+        except KeyError:
+            try:
+                j = jours_lus[texte_date] = _jour(texte_date)
+            except ValueError:
+                erreurs.append((numero, f"Date invalide : {texte_date!r}"))
+                continue
+        try:
+            m = durees_lues[texte_heures]
+        except KeyError:
+            try:
+                m = durees_lues[texte_heures] = _minutes(texte_heures)
+            except (ValueError, ArithmeticError):
+                erreurs.append((numero, f"Durée invalide : {texte_heures!r}"))
+                continue
+        e = index.get(matricule)
+        if e is None:
+            e = index[matricule] = len(matricules)
+            matricules.append(matricule)
+        numeros.append(numero)
+        employe.append(e)
+        jour.append(j)
+        minutes.append(m)
+
+    employe = np.array(employe, dtype=np.int64)
+    jour = np.array(jour, dtype=np.int64)
+    minutes = np.array(minutes, dtype=np.int64)
+    if len(jour):
+        # La médiane ignore quelques dates aberrantes, quel que soit leur écart
+        mediane = int(np.median(jour))
+        hors_releve = np.abs(jour - mediane) > 7 * max_semaines
+        if hors_releve.any():
+            for i in np.flatnonzero(hors_releve).tolist():
+                date = datetime.fromordinal(int(jour[i])).date()
+                erreurs.append((numeros[i], f"Date hors du relevé : {date.isoformat()}"))
+            erreurs.sort()
+            gardees = ~hors_releve
+            employe, jour, minutes = employe[gardees], jour[gardees], minutes[gardees]
+
+    return Pointages(matricules, employe, jour, minutes, erreurs)
+
+
+# === Heures supplémentaires ===
+def _seuils_minutes(tranches):
+    return [int(Decimal(seuil) * 60) for seuil, _ in tranches]
+
+
+def heures_par_tranche(pointages, tranches=None):
+    """Minutes de chaque tranche de majoration, par employé : tableau (employés × tranches).
+
+    Les minutes sont cumulées par employé et par semaine, puis chaque semaine
+    est découpée entre les seuils des tranches. Seuls les couples (employé,
+    semaine) présents dans le relevé sont comptés.
+    """
+    tranches = HEURES_SUPPLEMENTAIRES['tranches'] if tranches is None else tranches
+    nb_employes = len(pointages.matricules)
+    resultat = np.zeros((nb_employes, len(tranches)), dtype=np.int64)
+    if not len(pointages):
+        return resultat
+
+    # date.toordinal(1) est un lundi : (jour - 1) // 7 numérote les semaines du lundi au dimanche
+    semaine = (pointages.jour - 1) // 7
+    semaine -= semaine.min()
+    nb_semaines = int(semaine.max()) + 1
+    # Clés (employé, semaine) compactées : un tableau par couple présent, pas employés × semaines
+    cles, inverse = np.unique(pointages.employe * nb_semaines + semaine, return_inverse=True)
+    # Poids entiers : les sommes restent exactes en float64 (bien en deçà de 2**53)
+    totaux = np.bincount(inverse, weights=pointages.minutes, minlength=len(cles)).astype(np.int64)
+    employe_cle = cles // nb_semaines
+
+    seuils = _seuils_minutes(tranches)
+    for k, seuil in enumerate(seuils):
+        tranche = totaux - seuil
+        if k + 1 < len(seuils):
+            tranche = np.minimum(tranche, seuils[k + 1] - seuil)
+        tranche = np.maximum(tranche, 0)
+        resultat[:, k] = np.bincount(employe_cle, weights=tranche, minlength=nb_employes).astype(np.int64)
+    return resultat
+
+
+def _coefficients(regles):
+    """Coefficients (1 + majoration) entiers à l'échelle 10^-decimales et rapport des heures mensuelles."""
+    taux = [_taux_entier(Decimal(1) + Decimal(majoration)) for _, majoration in regles['tranches']]
+    decimales = max((d for _, d in taux), default=0)
+    coefficients = [numerateur * 10 ** (decimales - d) for numerateur, d in taux]
+    numerateur, denominateur = Decimal(regles['heures_mensuelles']).as_integer_ratio()
+    # centimes = millimes × Σ minutes × coefficient × denominateur / diviseur
+    diviseur = (MILLIMES // 100) * 10 ** decimales * 60 * numerateur
+    return coefficients, denominateur, diviseur
+
+
+def montant_heures_supp(minutes, salaire_base, regles=None):
+    """Montant (Decimal, au centime) des minutes ``minutes`` de chaque tranche pour ``salaire_base``."""
+    coefficients, denominateur, diviseur = _coefficients(regles or HEURES_SUPPLEMENTAIRES)
+    ponderees = sum(int(m) * c for m, c in zip(minutes, coefficients))
+    centimes = arrondi_half_even(en_millimes(salaire_base) * ponderees * denominateur, diviseur)
+    return Decimal(centimes).scaleb(-2)
+
+
+def montants_heures_supp(minutes, salaires, regles=None):
+    """Montants en millimes pour un tableau (employés × tranches) de minutes et des salaires en millimes.
+
+    Version vectorisée de montant_heures_supp ; les produits intermédiaires
+    tiennent en int64 pour des salaires jusqu'à 10^6 dinars.
+    """
+    coefficients, denominateur, diviseur = _coefficients(regles or HEURES_SUPPLEMENTAIRES)
+    ponderees = np.asarray(minutes, dtype=np.int64) @ np.array(coefficients, dtype=np.int64)
+    numerateur = np.asarray(salaires, dtype=np.int64) * ponderees * denominateur
+    return _arrondi_half_even(numerateur, diviseur) * (MILLIMES // 100)
+
+
+class ReleveHeures:
+    """Heures supplémentaires d'un relevé de pointages, par matricule."""
+
+    def __init__(self, pointages, regles=None):
+        self.regles = regles or HEURES_SUPPLEMENTAIRES
+        self.matricules = pointages.matricules
+        self.index = {matricule: i for i, matricule in enumerate(pointages.matricules)}
+        self.minutes = heures_par_tranche(pointages, self.regles['tranches'])
+        self.erreurs = pointages.erreurs
+
+    @classmethod
+    def lire(cls, flux, delimiteur=',', regles=None, max_semaines=None):
+        """Relevé calculé d'un CSV texte de pointages (voir lire_pointages)."""
+        return cls(lire_pointages(flux, delimiteur, max_semaines), regles)
+
+    def __len__(self):
+        return len(self.matricules)
+
+    def __contains__(self, matricule):
+        return str(matricule).strip() in self.index
+
+    def minutes_par_tranche(self, matricule):
+        """Minutes de chaque tranche pour ``matricule`` (KeyError s'il n'a pas de pointage)."""
+        return tuple(int(m) for m in self.minutes[self.index[str(matricule).strip()]])
+
+    def montant(self, matricule, salaire_base):
+        """Montant des heures supplémentaires de ``matricule`` (Decimal, au centime)."""
+        return montant_heures_supp(self.minutes_par_tranche(matricule), salaire_base, self.regles)
+
+    def appliquer(self, employes):
+        """Renseigne ``heures_supp`` des employés pointés dans les tuples ``(numero, donnees, erreurs)``.
+
+        ``employes`` est l'itérable produit par ``lire_employes`` ; un employé
+        absent du relevé garde sa saisie.
+        """
+        for numero, donnees, erreurs in employes:
+            matricule = donnees.get('matricule') if donnees is not None else None
+            if matricule and matricule in self:
+                donnees['heures_supp'] = self.montant(matricule, donnees.get('salaire_base') or 0)
+            yield numero, donnees, erreurs
@@ -0,0 +1,472 @@
+# fiche_de_paie/recueil_pdf.py
+"""Recueil PDF : tous les bulletins d'une paie dans un seul document.
+
+Les pages reprennent la mise en page de generate_pdf_fpdf et sont écrites au
+fil de l'eau dans le flux de sortie : seules les positions des objets PDF
+restent en mémoire, quel que soit le nombre de bulletins. La page d'index,
+optionnelle, est écrite en fin de fichier mais placée en tête du document.
+
+Les polices et dictionnaires de ressources sont partagés par toutes les pages ;
+une police TrueType (textes hors latin-1) est intégrée une seule fois, en fin
+de document, réduite aux glyphes utilisés par l'ensemble des bulletins. En mode
+compact (PDF 1.5), les flux de contenu sont allégés avant compression et les
+petits objets sont regroupés dans des flux d'objets compressés.
+"""
+import io
+import math
+import re
+import struct
+import zlib
+
+from fpdf import FPDF
+from fpdf.ttfonts import TTFontFile
+
+from .pdf import PdfUnicode, construire_pdf_bulletin, ordre_visuel
+from .resultat import calcul_resultat
+
+LIGNES_PAR_PAGE_INDEX = 36
+TAILLE_MORCEAU = 64 * 1024
+
+# Dimensions A4 en points, identiques à celles de FPDF
+LARGEUR_PAGE, HAUTEUR_PAGE = 595.28, 841.89
+POINTS_PAR_MM = 72 / 25.4
+
+# Mode compact : objets regroupés par flux d'objets, niveau de compression
+OBJETS_PAR_FLUX = 100
+NIVEAU_COMPRESSION = 9
+
+CMAP_IDENTITE = (
+    b'/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n'
+    b'/CIDSystemInfo <</Registry (Adobe) /Ordering (UCS) /Supplement 0>> def\n'
+    b'/CMapName /Adobe-Identity-UCS def\n/CMapType 2 def\n'
+    b'1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n'
+    b'1 beginbfrange\n<0000> <FFFF> <0000>\nendbfrange\n'
+    b'endcmap\nCMapName currentdict /CMap defineresource pop\nend\nend'
+)
+
+
+def _chaine(texte):
+    """Chaîne littérale PDF (latin-1, caractères spéciaux échappés)."""
+    texte = texte.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return b'(%s)' % texte.encode('latin1', 'replace')
+
+
+def _latin1(texte):
+    try:
+        str(texte).encode('latin1')
+    except UnicodeEncodeError:
+        return False
+    return True
+
+
+# --- Allègement des flux de contenu (mode compact) ---
+_CHAINES = re.compile(r'(\((?:\\.|[^\\)])*\))', re.S)
+_DECIMAUX = re.compile(r'(?<![\w.])(-?)(\d+)\.(\d+)')
+_CHOIX_POLICE = re.compile(r'BT (/F\d+ [\d.]+ Tf) ET')
+
+
+def _decimal_court(m):
+    signe, entier, decimales = m.groups()
+    decimales = decimales.rstrip('0')
+    entier = entier.lstrip('0')
+    if not decimales:
+        return f"{signe}{entier}" if entier else '0'
+    return f"{signe}{entier}.{decimales}"
+
+
+def contenu_compact(contenu):
+    """Flux de contenu FPDF au rendu identique, en moins d'octets.
+
+    Les nombres perdent leurs zéros non significatifs (``1.000`` -> ``1``,
+    ``0.57`` -> ``.57``) hors des chaînes de texte, et les changements de
+    police sans texte entre eux ne gardent que le dernier.
+    """
+    # Les chaînes de texte (qui peuvent contenir des sauts de ligne en UTF-16)
+    # sont mises de côté pendant le traitement des opérateurs
+    morceaux = _CHAINES.split(contenu)
+    chaines = morceaux[1::2]
+    operateurs = '\0'.join(_DECIMAUX.sub(_decimal_court, m) for m in morceaux[::2])
+
+    lignes = []
+    police_active = police_attente = None
+    for ligne in operateurs.split('\n'):
+        choix = _CHOIX_POLICE.fullmatch(ligne)
+        if choix:
+            police_attente = choix.group(1)
+            continue
+        if police_attente != police_active and ('Tj' in ligne or 'TJ' in ligne):
+            lignes.append(f"BT {police_attente} ET")
+            police_active = police_attente
+        lignes.append(ligne)
+
+    morceaux = '\n'.join(lignes).split('\0')
+    return ''.join(m + c for m, c in zip(morceaux, chaines + ['']))
+
+
+# --- Polices TrueType intégrées ---
+def _somme_ttf(donnees):
+    donnees += b'\0' * (-len(donnees) % 4)
+    return sum(struct.unpack('>%dI' % (len(donnees) // 4), donnees)) & 0xFFFFFFFF
+
+
+def table_noms_minimale(fichier, nom):
+    """Police TrueType dont la table 'name' (licence, descriptions...) est réduite au nom de la police.
+
+    La table d'origine pèse souvent plus que les glyphes d'un sous-ensemble ;
+    le rendu n'en dépend pas.
+    """
+    nb_tables = struct.unpack('>H', fichier[4:6])[0]
+    tables = {}
+    for i in range(nb_tables):
+        etiquette, _, debut, longueur = struct.unpack('>4sIII', fichier[12 + 16 * i:28 + 16 * i])
+        tables[etiquette] = fichier[debut:debut + longueur]
+
+    texte = nom.encode('utf-16-be')
+    enregistrements = [(3, 1, 0x409, identifiant) for identifiant in (1, 2, 4, 6)]
+    chaines = [texte, 'Regular'.encode('utf-16-be'), texte, texte]
+    table = struct.pack('>HHH', 0, len(enregistrements), 6 + 12 * len(enregistrements))
+    decalage = 0
+    for (plateforme, encodage, langue, identifiant), chaine in zip(enregistrements, chaines):
+        table += struct.pack('>HHHHHH', plateforme, encodage, langue, identifiant, len(chaine), decalage)
+        decalage += len(chaine)
+    tables[b'name'] = table + b''.join(chaines)
+    # checkSumAdjustment recalculé plus bas
+    tables[b'head'] = tables[b'head'][:8] + b'\0\0\0\0' + tables[b'head'][12:]
+
+    puissance = 2 ** (len(tables).bit_length() - 1)
+    entete = fichier[:4] + struct.pack('>HHHH', len(tables), puissance * 16, puissance.bit_length() - 1,
+                                       (len(tables) - puissance) * 16)
+    repertoire, corps = [], []
+    position = 12 + 16 * len(tables)
+    for etiquette in sorted(tables):
+        donnees = tables[etiquette]
+        repertoire.append(struct.pack('>4sIII', etiquette, _somme_ttf(donnees), position, len(donnees)))
+        donnees += b'\0' * (-len(donnees) % 4)
+        corps.append(donnees)
+        position += len(donnees)
+    police = bytearray(entete + b''.join(repertoire) + b''.join(corps))
+    debut_head = 12 + 16 * len(tables) + sum(len(d) for e, d in zip(sorted(tables), corps) if e < b'head')
+    ajustement = (0xB1B0AFBA - _somme_ttf(bytes(police))) & 0xFFFFFFFF
+    police[debut_head + 8:debut_head + 12] = struct.pack('>I', ajustement)
+    return bytes(police)
+
+
+class RecueilBulletins:
+    """Écrit un document PDF multi-pages dans ``flux`` (binaire, non positionnable).
+
+    Appeler ``ajouter_bulletin`` pour chaque employé puis ``terminer``. Avec
+    ``compact=True``, le document est écrit en PDF 1.5 (flux d'objets et table
+    des références compressés).
+    """
+
+    def __init__(self, flux, index=True, titre='', compact=False):
+        self.flux = flux
+        self.index = index
+        self.titre = titre
+        self.compact = compact
+        self.position = 0
+        # Numéro d'objet -> position dans le fichier, ou (flux d'objets, rang) en mode compact
+        self.positions = {}
+        # Objet 1 réservé à l'arbre des pages, écrit par terminer()
+        self.nb_objets = 1
+        self.pages = []
+        self.entrees = []
+        self.rejets = []
+        self._polices = {}
+        self._polices_ttf = {}
+        self._ressources = {}
+        self._objets_en_attente = []
+        self._ecrire(b'%%PDF-%s\n%%\xe2\xe3\xcf\xd3\n' % (b'1.5' if compact else b'1.3'))
+
+    # --- Écriture bas niveau ---
+    def _ecrire(self, octets):
+        self.flux.write(octets)
+        self.position += len(octets)
+
+    def _reserver(self):
+        self.nb_objets += 1
+        return self.nb_objets
+
+    def _objet(self, corps, numero=None):
+        if numero is None:
+            numero = self._reserver()
+        if self.compact:
+            # Les petits objets sont regroupés dans un flux d'objets compressé
+            self._objets_en_attente.append((numero, corps))
+            if len(self._objets_en_attente) >= OBJETS_PAR_FLUX:
+                self._vider_objets()
+            return numero
+        self.positions[numero] = self.position
+        self._ecrire(b'%d 0 obj\n%s\nendobj\n' % (numero, corps))
+        return numero
+
+    def _flux(self, donnees, dictionnaire=b''):
+        """Objet flux compressé (jamais placé dans un flux d'objets)."""
+        donnees = zlib.compress(donnees, NIVEAU_COMPRESSION if self.compact else -1)
+        numero = self._reserver()
+        self.positions[numero] = self.position
+        self._ecrire(
+            b'%d 0 obj\n<<%s/Filter /FlateDecode /Length %d>>\nstream\n%s\nendstream\nendobj\n'
+            % (numero, dictionnaire, len(donnees), donnees)
+        )
+        return numero
+
+    def _vider_objets(self):
+        if not self._objets_en_attente:
+            return
+        numero_flux = self._reserver()
+        entetes, corps, decalage = [], [], 0
+        for rang, (numero, contenu) in enumerate(self._objets_en_attente):
+            entetes.append(b'%d %d' % (numero, decalage))
+            corps.append(contenu)
+            decalage += len(contenu) + 1
+            self.positions[numero] = (numero_flux, rang)
+        entete = b' '.join(entetes) + b'\n'
+        donnees = zlib.compress(entete + b'\n'.join(corps), NIVEAU_COMPRESSION)
+        self.positions[numero_flux] = self.position
+        self._ecrire(
+            b'%d 0 obj\n<</Type /ObjStm /N %d /First %d /Filter /FlateDecode /Length %d>>\nstream\n%s\nendstream\nendobj\n'
+            % (numero_flux, len(corps), len(entete), len(donnees), donnees)
+        )
+        self._objets_en_attente = []
+
+    # --- Polices et ressources partagées ---
+    def _police(self, nom):
+        numero = self._polices.get(nom)
+        if numero is None:
+            encodage = b'' if nom in ('Symbol', 'ZapfDingbats') else b' /Encoding /WinAnsiEncoding'
+            numero = self._objet(b'<</Type /Font /BaseFont /%s /Subtype /Type1%s>>' % (nom.encode('latin1'), encodage))
+            self._polices[nom] = numero
+        return numero
+
+    def _police_ttf(self, police):
+        """Numéro réservé à une police TrueType, dont les glyphes utilisés sont cumulés."""
+        entree = self._polices_ttf.get(police['name'])
+        if entree is None:
+            entree = self._polices_ttf[police['name']] = (self._reserver(), police, set())
+        entree[2].update(police['subset'])
+        return entree[0]
+
+    def _ressources_page(self, polices):
+        """Dictionnaire de ressources partagé par les pages utilisant les mêmes polices."""
+        cle = tuple(sorted((police['i'], police['name']) for police in polices.values()))
+        for police in polices.values():
+            if police['type'] == 'TTF':
+                self._police_ttf(police)
+            elif police['type'] != 'core':
+                raise ValueError(f"Police non prise en charge dans le recueil : {police['name']}")
+        numero = self._ressources.get(cle)
+        if numero is None:
+            numeros = {
+                police['name']: self._police_ttf(police) if police['type'] == 'TTF' else self._police(police['name'])
+                for police in polices.values()
+            }
+            references = b' '.join(b'/F%d %d 0 R' % (i, numeros[nom]) for i, nom in cle)
+            procset = b'' if self.compact else b'/ProcSet [/PDF /Text] '
+            numero = self._objet(b'<<%s/Font <<%s>>>>' % (procset, references))
+            self._ressources[cle] = numero
+        return numero
+
+    def _ecrire_police_ttf(self, numero, police, codes):
+        """Police TrueType réduite aux glyphes ``codes`` (CID = point de code Unicode)."""
+        ttf = TTFontFile()
+        fichier = ttf.makeSubset(police['ttffile'], sorted(c for c in codes if c))
+        if self.compact:
+            fichier = table_noms_minimale(fichier, police['name'])
+        correspondance = ttf.codeToGlyph
+        table = bytearray(2 * (max(correspondance, default=0) + 1))
+        for code, glyphe in correspondance.items():
+            table[2 * code:2 * code + 2] = glyphe.to_bytes(2, 'big')
+
+        largeurs, suite = [], []
+        for code in sorted(correspondance):
+            largeur = police['cw'][code] if code < len(police['cw']) else 0
+            largeur = 0 if largeur == 65535 else largeur
+            if suite and code == suite[0] + len(suite) - 1:
+                suite.append(largeur)
+            else:
+                suite = [code, largeur]
+                largeurs.append(suite)
+        largeurs = b' '.join(
+            b'%d [%s]' % (suite[0], b' '.join(b'%d' % l for l in suite[1:])) for suite in largeurs
+        )
+
+        nom = b'AAAAAA+' + police['name'].encode('latin1')
+        desc = dict(police['desc'], Flags=(police['desc']['Flags'] | 4) & ~32)
+        descripteur = self._objet(b'<</Type /FontDescriptor /FontName /%s %s /FontFile2 %d 0 R>>' % (
+            nom,
+            b' '.join(b'/%s %s' % (k.encode(), str(desc[k]).encode()) for k in (
+                'Ascent', 'Descent', 'CapHeight', 'Flags', 'FontBBox', 'ItalicAngle', 'StemV', 'MissingWidth',
+            )),
+            self._flux(fichier, b'/Length1 %d ' % len(fichier)),
+        ))
+        cid = self._objet(
+            b'<</Type /Font /Subtype /CIDFontType2 /BaseFont /%s '
+            b'/CIDSystemInfo <</Registry (Adobe) /Ordering (UCS) /Supplement 0>> '
+            b'/FontDescriptor %d 0 R /DW %d /W [%s] /CIDToGIDMap %d 0 R>>'
+            % (nom, descripteur, police['desc']['MissingWidth'], largeurs, self._flux(bytes(table)))
+        )
+        self._objet(
+            b'<</Type /Font /Subtype /Type0 /BaseFont /%s /Encoding /Identity-H '
+            b'/DescendantFonts [%d 0 R] /ToUnicode %d 0 R>>' % (nom, cid, self._flux(CMAP_IDENTITE)),
+            numero=numero,
+        )
+
+    def _page(self, contenu, polices, annotations=b''):
+        ressources = self._ressources_page(polices)
+        if self.compact:
+            contenu = contenu_compact(contenu)
+        contenu = self._flux(contenu.encode('latin1'))
+        return self._objet(
+            b'<</Type /Page /Parent 1 0 R /Resources %d 0 R /Contents %d 0 R%s>>'
+            % (ressources, contenu, annotations)
+        )
+
+    # --- Bulletins ---
+    def ajouter_bulletin(self, data, gabarit=True):
+        """Écrit les pages du bulletin ``data`` (montants déjà calculés)."""
+        pdf = construire_pdf_bulletin(data, gabarit)
+        premiere_page = len(self.pages) + 1
+        for n in range(1, pdf.page + 1):
+            self.pages.append(self._page(pdf.pages[n], pdf.fonts))
+        if self.index:
+            self.entrees.append((
+                premiere_page, str(data.get('nom_prenom', '-')),
+                str(data.get('matricule', '-')), data.get('net_a_payer', 0),
+            ))
+
+    def rejeter(self, numero, erreurs):
+        """Note une ligne d'entrée invalide, listée en fin d'index."""
+        if self.index:
+            self.rejets.append((numero, ', '.join(erreurs)))
+
+    # --- Index ---
+    def _pages_index(self):
+        lignes = self.entrees + self.rejets
+        nb_pages = max(1, math.ceil(len(lignes) / LIGNES_PAR_PAGE_INDEX))
+        unicode = not all(_latin1(texte) for ligne in lignes for texte in ligne[1:3])
+        pdf = PdfUnicode() if unicode else FPDF('P', 'mm', 'A4')
+        pdf.set_auto_page_break(False)
+        liens = []
+
+        for debut in range(0, nb_pages * LIGNES_PAR_PAGE_INDEX, LIGNES_PAR_PAGE_INDEX):
+            pdf.add_page()
+            pdf.set_fill_color(52, 73, 94)
+            pdf.set_text_color(255, 255, 255)
+            pdf.set_font("Arial", "B", 14)
+            pdf.cell(0, 10, f"INDEX DES BULLETINS {self.titre}".strip(), ln=True, align='C', fill=True)
+            pdf.ln(4)
+
+            pdf.set_fill_color(236, 240, 241)
+            pdf.set_text_color(0, 0, 0)
+            pdf.set_font("Arial", "B", 10)
+            pdf.cell(20, 7, "Page", border=1, align='C', fill=True)
+            pdf.cell(95, 7, "Nom & Prenom", border=1, fill=True)
+            pdf.cell(40, 7, "Matricule", border=1, fill=True)
+            pdf.cell(0, 7, "Net a payer", border=1, align='R', fill=True, ln=True)
+
+            pdf.set_font("Arial", "", 10)
+            for ligne in lignes[debut:debut + LIGNES_PAR_PAGE_INDEX]:
+                if len(ligne) == 4:
+                    page, nom, matricule, net = ligne
+                    liens.append((pdf.page, pdf.y, page))
+                    pdf.cell(20, 6, str(nb_pages + page), border=1, align='C')
+                    pdf.cell(95, 6, ordre_visuel(nom) if unicode else nom, border=1)
+                    pdf.cell(40, 6, ordre_visuel(matricule) if unicode else matricule, border=1)
+                    pdf.cell(0, 6, f"{net:.3f}", border=1, align='R', ln=True)
+                else:
+                    numero, champs = ligne
+                    pdf.set_text_color(231, 76, 60)
+                    pdf.cell(0, 6, f"Ligne {numero} rejetee : {champs}", border=1, ln=True)
+                    pdf.set_text_color(0, 0, 0)
+
+        # Liens de chaque ligne vers la première page du bulletin
+        annotations = {n: [] for n in range(1, nb_pages + 1)}
+        x1, x2 = pdf.l_margin * POINTS_PAR_MM, (pdf.w - pdf.r_margin) * POINTS_PAR_MM
+        for page_index, y, page in liens:
+            haut = HAUTEUR_PAGE - y * POINTS_PAR_MM
+            annotations[page_index].append(
+                b'<</Type /Annot /Subtype /Link /Rect [%.2f %.2f %.2f %.2f] /Border [0 0 0] '
+                b'/Dest [%d 0 R /XYZ 0 %.2f null]>>'
+                % (x1, haut - 6 * POINTS_PAR_MM, x2, haut, self.pages[page - 1], HAUTEUR_PAGE)
+            )
+        return [
+            self._page(pdf.pages[n], pdf.fonts, b' /Annots [%s]' % b' '.join(annotations[n]))
+            for n in range(1, nb_pages + 1)
+        ]
+
+    def terminer(self):
+        """Écrit l'index éventuel, l'arbre des pages et la table des références."""
+        pages = self.pages
+        if self.index:
+            pages = self._pages_index() + pages
+        self._objet(
+            b'<</Type /Pages /Kids [%s] /Count %d /MediaBox [0 0 %.2f %.2f]>>'
+            % (b' '.join(b'%d 0 R' % p for p in pages), len(pages), LARGEUR_PAGE, HAUTEUR_PAGE),
+            numero=1,
+        )
+        for numero, police, codes in self._polices_ttf.values():
+            self._ecrire_police_ttf(numero, police, codes)
+        infos = self._objet(b'<</Producer (PyFPDF) /Title %s>>' % _chaine(f"Bulletins de paie {self.titre}".strip()))
+        catalogue = self._objet(b'<</Type /Catalog /Pages 1 0 R>>')
+        if self.compact:
+            self._terminer_compact(catalogue, infos)
+            return
+
+        debut_xref = self.position
+        references = [b'xref\n0 %d\n0000000000 65535 f \n' % (self.nb_objets + 1)]
+        references += [b'%010d 00000 n \n' % self.positions[n] for n in range(1, self.nb_objets + 1)]
+        self._ecrire(b''.join(references))
+        self._ecrire(
+            b'trailer\n<</Size %d /Root %d 0 R /Info %d 0 R>>\nstartxref\n%d\n%%%%EOF\n'
+            % (self.nb_objets + 1, catalogue, infos, debut_xref)
+        )
+
+    def _terminer_compact(self, catalogue, infos):
+        """Table des références en flux compressé (PDF 1.5)."""
+        self._vider_objets()
+        numero_xref = self._reserver()
+        self.positions[numero_xref] = self.position
+        entrees = [b'\x00\x00\x00\x00\x00\xff\xff']
+        for numero in range(1, numero_xref + 1):
+            position = self.positions[numero]
+            if isinstance(position, tuple):
+                entrees.append(b'\x02' + position[0].to_bytes(4, 'big') + position[1].to_bytes(2, 'big'))
+            else:
+                entrees.append(b'\x01' + position.to_bytes(4, 'big') + b'\x00\x00')
+        donnees = zlib.compress(b''.join(entrees), NIVEAU_COMPRESSION)
+        self._ecrire(
+            b'%d 0 obj\n<</Type /XRef /Size %d /W [1 4 2] /Root %d 0 R /Info %d 0 R /Filter /FlateDecode /Length %d>>'
+            b'\nstream\n%s\nendstream\nendobj\nstartxref\n%d\n%%%%EOF\n'
+            % (numero_xref, numero_xref + 1, catalogue, infos, len(donnees), donnees, self.positions[numero_xref])
+        )
+
+
+def bulletin_pdf_compact(data, gabarit=True):
+    """PDF compact d'un seul bulletin : même rendu que generate_pdf_fpdf, moins d'octets."""
+    tampon = io.BytesIO()
+    recueil = RecueilBulletins(tampon, index=False, compact=True)
+    recueil.ajouter_bulletin(data, gabarit)
+    recueil.terminer()
+    return tampon.getvalue()
+
+
+def iter_recueil_pdf(employes, index=True, titre='', compact=False):
+    """Produit les octets du recueil PDF au fur et à mesure du rendu.
+
+    ``employes`` est l'itérable produit par ``import_employes.lire_employes`` ;
+    les lignes invalides sont listées à la fin de l'index.
+    """
+    tampon = io.BytesIO()
+    recueil = RecueilBulletins(tampon, index=index, titre=titre, compact=compact)
+    for numero, donnees, erreurs in employes:
+        if donnees is None:
+            recueil.rejeter(numero, erreurs)
+        else:
+            recueil.ajouter_bulletin(calcul_resultat(donnees))
+        if tampon.tell() >= TAILLE_MORCEAU:
+            yield tampon.getvalue()
+            tampon.seek(0)
+            tampon.truncate()
+    recueil.terminer()
+    yield tampon.getvalue()
@@ -0,0 +1,156 @@
+# fiche_de_paie/regles.py
+"""Moteur de règles daté : primes, cotisations et barème compilés par période.
+
+Chaque jeu de règles (règles de base ou jeu daté avec ses dates d'effet) est
+compilé une fois en un PlanRegles : tuples plats de taux et seuils déjà
+convertis, barème IRPP précompilé. Le plan d'un bulletin est retrouvé par une
+seule recherche dans un dict indexé par mois (annee * 12 + mois - 1).
+"""
+import hashlib
+import unicodedata
+from decimal import Decimal, ROUND_HALF_UP
+
+MOIS = (
+    'janvier', 'février', 'mars', 'avril', 'mai', 'juin',
+    'juillet', 'août', 'septembre', 'octobre', 'novembre', 'décembre',
+)
+
+
+def _sans_accents(texte):
+    return unicodedata.normalize('NFKD', texte).encode('ascii', 'ignore').decode('ascii')
+
+
+def _ecritures_mois():
+    """Toutes les écritures courantes, pour éviter toute normalisation dans le cas usuel."""
+    ecritures = {}
+    for numero, nom in enumerate(MOIS, start=1):
+        for variante in (nom, _sans_accents(nom), str(numero), f"{numero:02d}"):
+            for ecriture in (variante, variante.capitalize(), variante.upper()):
+                ecritures[ecriture] = numero
+    return ecritures
+
+
+_NUMEROS_MOIS = _ecritures_mois()
+
+
+def numero_mois(mois):
+    """Numéro (1-12) d'un mois donné par son nom français ou son numéro, sinon None."""
+    if isinstance(mois, int):
+        return mois if 1 <= mois <= 12 else None
+    if not mois:
+        return None
+    numero = _NUMEROS_MOIS.get(mois)
+    if numero is None:
+        numero = _NUMEROS_MOIS.get(_sans_accents(str(mois)).strip().lower())
+    return numero
+
+
+# Écritures d'une case décochée : l'import (CSV, NDJSON) et les API JSON les envoient en texte
+VALEURS_FAUX = ('', '0', 'false', 'faux', 'non', 'n', 'off')
+
+
+def booleen_saisi(valeur):
+    """Case à cocher saisie : fausse pour une chaîne de VALEURS_FAUX, sinon ``bool(valeur)``."""
+    if isinstance(valeur, str):
+        return valeur.strip().lower() not in VALEURS_FAUX
+    return bool(valeur)
+
+
+def index_periode(annee, mois=None):
+    """Index du mois (annee * 12 + mois - 1) ; janvier si le mois est absent ou inconnu."""
+    return int(annee) * 12 + (numero_mois(mois) or 1) - 1
+
+
+# === Barème IRPP précompilé ===
+def compiler_bareme(bareme):
+    """Précompile le barème : bornes et taux en Decimal, impôt cumulé au plancher de chaque tranche.
+
+    Retourne ``(planchers, tranches)`` où ``tranches[i] = (plancher, plafond, taux, cumul)``
+    et ``cumul`` est la somme des impôts arrondis des tranches pleines inférieures.
+    """
+    planchers, tranches = [], []
+    cumul = Decimal('0')
+    for min_val, max_val, taux in bareme:
+        plancher, plafond, taux = Decimal(str(min_val)), Decimal(str(max_val)), Decimal(str(taux))
+        planchers.append(plancher)
+        tranches.append((plancher, plafond, taux, cumul))
+        if plafond.is_finite():
+            cumul += ((plafond - plancher) * taux).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    return tuple(planchers), tuple(tranches)
+
+
+# === Plan d'évaluation ===
+class PlanRegles:
+    """Règles d'une période, prêtes à l'emploi par le calcul de paie.
+
+    - ``primes`` : ``(nom, taux, seuil | None, libelle)`` des primes en pourcentage,
+      dans l'ordre de REGLES_AUTOMATIQUES ;
+    - ``anciennete`` : échelons ``(annees, taux)`` du plus haut au plus bas ;
+    - ``cotisations_salarie`` / ``cotisations_employeur`` : ``(nom, taux)`` ;
+    - ``bareme`` : barème IRPP précompilé (voir compiler_bareme) ;
+    - ``heures_supp_dans_brut`` : montant ``heures_supp`` ajouté au brut.
+    """
+    __slots__ = (
+        'version', 'primes', 'anciennete', 'libelle_anciennete',
+        'cotisations_salarie', 'cotisations_employeur', 'bareme', 'css_taux', 'heures_supp_dans_brut',
+    )
+
+    def __init__(self, regles, seuils, cotisations_salarie, cotisations_employeur, bareme, css_taux,
+                 heures_supp_dans_brut=False):
+        self.primes = tuple(
+            (nom, Decimal(regle['valeur']), seuils.get(f'{nom}_seuil'), regle['libelle'])
+            for nom, regle in regles.items() if regle['type'] == 'pourcentage'
+        )
+        anciennete = regles['prime_anciennete']
+        self.anciennete = tuple(reversed([(Decimal(s), Decimal(t)) for s, t in anciennete['echelons']]))
+        self.libelle_anciennete = anciennete['libelle']
+        self.cotisations_salarie = tuple((nom, Decimal(taux)) for nom, taux in cotisations_salarie)
+        self.cotisations_employeur = tuple((nom, Decimal(taux)) for nom, taux in cotisations_employeur)
+        self.bareme = compiler_bareme(bareme)
+        self.css_taux = Decimal(css_taux)
+        self.heures_supp_dans_brut = bool(heures_supp_dans_brut)
+        composantes = (
+            self.primes, self.anciennete, self.cotisations_salarie,
+            self.cotisations_employeur, self.bareme, self.css_taux,
+        )
+        # Marqueur ajouté seulement s'il est actif : un plan sans heures supplémentaires
+        # dans le brut garde la version des bulletins calculés avant leur prise en compte
+        if self.heures_supp_dans_brut:
+            composantes += ('heures_supp_dans_brut',)
+        empreinte = repr(composantes)
+        self.version = hashlib.sha1(empreinte.encode('utf-8')).hexdigest()[:12]
+
+
+class MoteurRegles:
+    """Plans compilés des règles de base et des jeux datés.
+
+    ``jeux_dates`` est une suite de dicts ``{'debut': (annee, mois), 'fin': (annee, mois), ...}``
+    dont les autres clés remplacent celles des règles de base sur la période
+    (bornes incluses). Hors de toute période datée, les règles de base s'appliquent.
+    """
+
+    def __init__(self, regles_de_base, jeux_dates=()):
+        self.defaut = PlanRegles(**regles_de_base)
+        self._par_periode = {}
+        for jeu in jeux_dates:
+            surcharges = {k: v for k, v in jeu.items() if k not in ('debut', 'fin')}
+            plan = PlanRegles(**{**regles_de_base, **surcharges})
+            for periode in range(index_periode(*jeu['debut']), index_periode(*jeu['fin']) + 1):
+                if periode in self._par_periode:
+                    annee, mois = divmod(periode, 12)
+                    raise ValueError(f"Jeux de règles qui se chevauchent en {mois + 1:02d}/{annee}")
+                self._par_periode[periode] = plan
+
+    def periodes(self):
+        """Index (annee * 12 + mois - 1) des mois couverts par un jeu daté, dans l'ordre."""
+        return sorted(self._par_periode)
+
+    def plan(self, annee=None, mois=None):
+        """Plan applicable à la période ; règles de base si l'année est absente ou invalide."""
+        if annee in (None, '') or not self._par_periode:
+            return self.defaut
+        try:
+            periode = index_periode(annee, mois)
+        except (TypeError, ValueError):
+            return self.defaut
+        return self._par_periode.get(periode, self.defaut)
@@ -0,0 +1,184 @@
+# fiche_de_paie/resultat.py
+"""Résultats de bulletin compacts, remplis par le moteur entier (millimes).
+
+Un ResultatBulletin ne copie ni ne modifie la saisie : il garde une référence
+aux entrées et range les montants calculés, en millimes, dans un ``array('q')``
+dont l'ordre est celui des clés du plan (PlanMillimes.cles). Il se lit comme
+le dictionnaire de calcul_auto — mêmes clés, même ordre, mêmes valeurs — et
+peut donc être passé tel quel au rendu PDF et aux gabarits HTML ; ``json()``
+l'écrit sans conserver de dictionnaire.
+
+LotResultats range les montants d'un lot de bulletins d'une même période dans
+un seul tableau ; ses éléments sont des ResultatBulletin qui le partagent.
+Les montants doivent être exprimés au millime, comme pour le moteur 'millimes'.
+"""
+from array import array
+from collections.abc import Mapping, Sequence
+from datetime import datetime
+
+from .auto_calculs import plan_regles
+from .json_rapide import dumps
+from .millimes import ABSENT, MILLIMES, NB_MONTANTS, plan_millimes, remplir_millimes
+
+
+class SchemaResultat:
+    """Disposition des montants d'un plan : position de chaque clé dans le tableau."""
+    __slots__ = ('plan', 'cles', 'index', 'largeur', 'zeros')
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.cles = plan.cles
+        self.index = {cle: i for i, cle in enumerate(plan.cles)}
+        self.largeur = len(plan.cles)
+        self.zeros = array('q', bytes(8 * self.largeur))
+
+
+_SCHEMAS = {}
+
+
+def schema_resultat(plan):
+    """SchemaResultat d'un plan compilé (PlanRegles), construit une fois par version."""
+    p = plan_millimes(plan)
+    entree = _SCHEMAS.get(p.version)
+    if entree is None or entree[0] is not p:
+        if len(_SCHEMAS) > 16:
+            _SCHEMAS.clear()
+        entree = _SCHEMAS[p.version] = (p, SchemaResultat(p))
+    return entree[1]
+
+
+def _date_generation():
+    return datetime.now().strftime('%d/%m/%Y')
+
+
+class ResultatBulletin(Mapping):
+    """Bulletin calculé : entrées (référencées) et montants en millimes, lu comme un dict."""
+    __slots__ = ('schema', 'montants', 'debut', 'entrees', 'date_generation')
+
+    def __init__(self, schema, montants, debut, entrees, date_generation):
+        self.schema = schema
+        self.montants = montants
+        self.debut = debut
+        self.entrees = entrees
+        self.date_generation = date_generation
+
+    def millimes(self, cle):
+        """Montant calculé ``cle`` en millimes entiers ; KeyError s'il n'est pas calculé."""
+        montant = self.montants[self.debut + self.schema.index[cle]]
+        if montant == ABSENT:
+            raise KeyError(cle)
+        return montant
+
+    def __getitem__(self, cle):
+        i = self.schema.index.get(cle)
+        if i is not None:
+            montant = self.montants[self.debut + i]
+            if montant != ABSENT:
+                return montant / MILLIMES
+        elif cle == 'date_generation':
+            return self.date_generation
+        return self.entrees[cle]
+
+    def get(self, cle, defaut=None):
+        try:
+            return self[cle]
+        except KeyError:
+            return defaut
+
+    def __iter__(self):
+        # Ordre du dictionnaire de calcul_auto : entrées (un montant recalculé garde
+        # leur place), montants communs, date de génération, cotisations et primes
+        entrees = self.entrees
+        yield from entrees
+        montants, debut = self.montants, self.debut
+        for i, cle in enumerate(self.schema.cles):
+            if i == NB_MONTANTS and 'date_generation' not in entrees:
+                yield 'date_generation'
+            if cle not in entrees and montants[debut + i] != ABSENT:
+                yield cle
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def en_dict(self):
+        """Dictionnaire équivalent (copie), construit en une passe."""
+        schema, montants, debut = self.schema, self.montants, self.debut
+        data = dict(self.entrees)
+        cles = schema.cles
+        for i in range(NB_MONTANTS):
+            data[cles[i]] = montants[debut + i] / MILLIMES
+        data['date_generation'] = self.date_generation
+        for i in range(NB_MONTANTS, schema.largeur):
+            montant = montants[debut + i]
+            if montant != ABSENT:
+                data[cles[i]] = montant / MILLIMES
+        return data
+
+    def json(self):
+        """Objet JSON compact (bytes UTF-8), comme json_rapide.dumps du dictionnaire équivalent.
+
+        Le dictionnaire n'existe que le temps de la sérialisation : le formatage
+        des nombres par json_rapide (orjson) reste plus rapide qu'une écriture
+        morceau par morceau en Python (voir benchmarks.bench_resultats).
+        """
+        return dumps(self.en_dict())
+
+    def __repr__(self):
+        return f"<ResultatBulletin {self.get('nom_prenom', '-')} net={self.get('net_a_payer')}>"
+
+
+def calcul_resultat(data, plan=None):
+    """Calcule le bulletin de ``data`` sans le modifier ; ``plan`` vaut celui de la période.
+
+    Mêmes clés et mêmes valeurs que ``calcul_auto(dict(data))``.
+    """
+    plan = plan or plan_regles(data.get('annee'), data.get('mois'))
+    schema = schema_resultat(plan)
+    montants = remplir_millimes(data, schema.plan, schema.zeros[:])
+    return ResultatBulletin(schema, montants, 0, data, _date_generation())
+
+
+class LotResultats(Sequence):
+    """Bulletins d'une même période dont les montants partagent un seul ``array('q')``."""
+    __slots__ = ('schema', 'montants', 'entrees', 'date_generation')
+
+    def __init__(self, plan=None):
+        self.schema = schema_resultat(plan or plan_regles())
+        self.montants = array('q')
+        self.entrees = []
+        self.date_generation = _date_generation()
+
+    @classmethod
+    def calculer(cls, employes, annee=None, mois=None):
+        """Lot calculé pour les dicts ``employes`` de la période ``annee``/``mois``."""
+        lot = cls(plan_regles(annee, mois))
+        for data in employes:
+            lot.ajouter(data)
+        return lot
+
+    def ajouter(self, data):
+        """Calcule le bulletin de ``data`` à la suite du lot et le retourne."""
+        debut = len(self.montants)
+        self.montants.extend(self.schema.zeros)
+        remplir_millimes(data, self.schema.plan, self.montants, debut)
+        self.entrees.append(data)
+        return ResultatBulletin(self.schema, self.montants, debut, data, self.date_generation)
+
+    def __len__(self):
+        return len(self.entrees)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        entrees = self.entrees[i]
+        i = range(len(self.entrees))[i]
+        return ResultatBulletin(self.schema, self.montants, i * self.schema.largeur, entrees, self.date_generation)
+
+    def colonne(self, cle):
+        """Montants ``cle`` de tout le lot, en millimes (ABSENT pour une prime non accordée)."""
+        i, largeur = self.schema.index[cle], self.schema.largeur
+        return self.montants[i::largeur]
+
+    def json(self):
+        """Tableau JSON compact (bytes UTF-8) des bulletins du lot."""
+        return b'[' + b','.join(resultat.json() for resultat in self) + b']'
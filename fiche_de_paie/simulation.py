@@ -0,0 +1,120 @@
+# fiche_de_paie/simulation.py
+"""Balayage de salaires : courbes net / brut pour plusieurs situations familiales.
+
+Toute la grille (salaires × situations) est calculée en une seule passe du
+moteur vectorisé (batch.calcul_batch_millimes), avec les règles de la période
+demandée. Le résultat est organisé en colonnes, directement exploitable par
+une bibliothèque de graphiques.
+"""
+import csv
+import io
+
+import numpy as np
+
+from .auto_calculs import plan_regles
+from .batch import MILLIMES, _en_millimes, calcul_batch_millimes
+
+LIMITE_POINTS = 1_000_000
+SITUATIONS_DEFAUT = ((False, 0),)
+
+# Courbes de chaque situation (montants en TND, taux_marginal en fraction)
+COURBES = ('total_brut', 'retenue_cnss', 'irpp', 'css', 'salaire_net', 'cout_employeur', 'taux_marginal')
+
+
+def _montant(valeur, nom):
+    return int(_en_millimes([valeur], nom)[0])
+
+
+def lire_situations(texte):
+    """Situations ``"chef:enfants"`` séparées par des virgules, ex. ``"0:0,1:2"``."""
+    situations = []
+    for element in str(texte).split(','):
+        if not element.strip():
+            continue
+        chef, _, enfants = element.partition(':')
+        situations.append((chef.strip().lower() in ('1', 'oui', 'true', 'on'), int(enfants or 0)))
+    return tuple(situations) or SITUATIONS_DEFAUT
+
+
+def balayage_salaires(minimum, maximum, pas=1, situations=SITUATIONS_DEFAUT,
+                      annees_anciennete=0, annee=None, mois=None):
+    """Calcule les courbes de paie de ``minimum`` à ``maximum`` (inclus) par pas de ``pas`` TND.
+
+    ``situations`` est une suite de couples ``(chef_famille, enfants)``. Retourne
+    ``{'salaire_base': ndarray, 'situations': [{'chef_famille', 'enfants', courbe: ndarray...}]}``
+    (montants en TND ; voir COURBES). ``taux_marginal`` est la part d'une hausse
+    du brut prélevée en cotisations et impôts, entre deux points consécutifs.
+    """
+    minimum, maximum = _montant(minimum, 'minimum'), _montant(maximum, 'maximum')
+    pas = _montant(pas, 'pas')
+    if pas <= 0:
+        raise ValueError("Le pas doit être positif")
+    if minimum < 0 or maximum < minimum:
+        raise ValueError("Intervalle de salaires invalide")
+    situations = [(bool(chef), int(enfants)) for chef, enfants in situations]
+    points = (maximum - minimum) // pas + 1
+    if points * len(situations) > LIMITE_POINTS:
+        raise ValueError(f"Grille trop grande : {points * len(situations)} points (limite {LIMITE_POINTS})")
+
+    salaires = minimum + pas * np.arange(points, dtype=np.int64)
+    nb = len(situations)
+    table = {
+        'salaire_base': np.tile(salaires, nb),
+        'annees_anciennete': np.full(points * nb, int(annees_anciennete), dtype=np.int64),
+        'chef_famille': np.repeat(np.array([c for c, _ in situations], dtype=bool), points),
+        'enfants': np.repeat(np.array([e for _, e in situations], dtype=np.int64), points),
+        'avance': np.zeros(points * nb, dtype=np.int64),
+        'autres_deductions': np.zeros(points * nb, dtype=np.int64),
+        'heures_supp': np.zeros(points * nb, dtype=np.int64),
+    }
+    resultats = calcul_batch_millimes(table, plan_regles(annee, mois))
+    resultats['cout_employeur'] = resultats['total_brut'] + resultats['total_cotisations_patronales']
+
+    courbes = []
+    for i, (chef_famille, enfants) in enumerate(situations):
+        tranche = slice(i * points, (i + 1) * points)
+        courbe = {'chef_famille': chef_famille, 'enfants': enfants}
+        for nom in COURBES[:-1]:
+            courbe[nom] = resultats[nom][tranche] / MILLIMES
+        courbe['taux_marginal'] = _taux_marginal(resultats['total_brut'][tranche], resultats['salaire_net'][tranche])
+        courbes.append(courbe)
+    return {'salaire_base': salaires / MILLIMES, 'situations': courbes}
+
+
+def _taux_marginal(brut, net):
+    """1 - Δnet / Δbrut entre points consécutifs ; le premier point reprend le premier écart."""
+    if len(brut) < 2:
+        return np.zeros(len(brut))
+    delta_brut, delta_net = np.diff(brut), np.diff(net)
+    taux = np.zeros(len(delta_brut))
+    np.divide(delta_brut - delta_net, delta_brut, out=taux, where=delta_brut != 0)
+    return np.round(np.concatenate((taux[:1], taux)), 4)
+
+
+# === Sorties ===
+def balayage_json(balayage):
+    """Dict JSON-sérialisable (listes de nombres) d'un balayage."""
+    return {
+        'salaire_base': balayage['salaire_base'].tolist(),
+        'situations': [
+            {k: v.tolist() if isinstance(v, np.ndarray) else v for k, v in courbe.items()}
+            for courbe in balayage['situations']
+        ],
+    }
+
+
+def balayage_csv(balayage):
+    """CSV d'un balayage, une ligne par point : situation, salaire de base puis courbes."""
+    tampon = io.StringIO()
+    writer = csv.writer(tampon)
+    writer.writerow(('chef_famille', 'enfants', 'salaire_base') + COURBES)
+    salaires = [f"{s:.3f}" for s in balayage['salaire_base'].tolist()]
+    for courbe in balayage['situations']:
+        colonnes = [
+            [f"{v:.4f}" for v in courbe[nom].tolist()] if nom == 'taux_marginal'
+            else [f"{v:.3f}" for v in courbe[nom].tolist()]
+            for nom in COURBES
+        ]
+        situation = (int(courbe['chef_famille']), courbe['enfants'])
+        writer.writerows(situation + ligne for ligne in zip(salaires, *colonnes))
+    return tampon.getvalue()
@@ -0,0 +1,147 @@
+# fiche_de_paie/solveur.py
+"""Solveur net -> brut : quel salaire de base donne un net à payer cible ?
+
+Le net est une fonction croissante (aux arrondis près) et affine par morceaux
+du salaire de base (primes à seuils, tranches du barème). On encadre la solution puis
+on resserre l'intervalle par fausse position (exacte sur un morceau affine),
+avec repli sur la bisection quand la fausse position progresse mal. La
+recherche porte sur des millimes entiers : on obtient un salaire de base s
+tel que net(s - 1 millime) < cible <= net(s).
+"""
+from decimal import Decimal
+
+import numpy as np
+
+from .auto_calculs import calcul_auto, plan_regles
+from .batch import COLONNES_ENTREE, MILLIMES, _en_millimes, calcul_batch_millimes, preparer_table
+
+MAX_ITERATIONS = 64
+
+
+def _fausse_position(evaluer, cibles, haut):
+    """Salaire (millimes) où evaluer(salaire) franchit la cible, élément par élément.
+
+    ``evaluer(salaires, indices)`` retourne le salaire net (millimes) des
+    employés ``indices`` pour les salaires donnés. Retourne ``(salaires, evaluations)``.
+    """
+    tous = np.arange(len(cibles))
+    bas = np.zeros_like(cibles)
+    f_bas = evaluer(bas, tous) - cibles
+    f_haut = evaluer(haut, tous) - cibles
+    evaluations = 2
+
+    # Élargit la borne haute tant que la cible n'est pas atteinte
+    for _ in range(MAX_ITERATIONS):
+        manquants = np.flatnonzero(f_haut < 0)
+        if not len(manquants):
+            break
+        haut[manquants] *= 2
+        f_haut[manquants] = evaluer(haut[manquants], manquants) - cibles[manquants]
+        evaluations += 1
+
+    # Cible déjà atteinte avec un salaire nul
+    atteints = f_bas >= 0
+    haut[atteints] = 0
+    f_haut[atteints] = f_bas[atteints]
+
+    largeur_precedente = haut - bas
+    for _ in range(MAX_ITERATIONS):
+        actifs = np.flatnonzero(haut - bas > 1)
+        if not len(actifs):
+            break
+        b, h = bas[actifs], haut[actifs]
+        fb, fh = f_bas[actifs], f_haut[actifs]
+
+        # Fausse position (calcul en flottants : seule l'estimation en dépend)
+        secante = b + np.floor(-fb / np.maximum(fh - fb, 1) * (h - b)).astype(np.int64)
+        milieu = (b + h) // 2
+        lent = (h - b) * 2 > largeur_precedente[actifs]
+        candidats = np.clip(np.where(lent, milieu, secante), b + 1, h - 1)
+        largeur_precedente[actifs] = h - b
+
+        f = evaluer(candidats, actifs) - cibles[actifs]
+        evaluations += 1
+        au_dessus = f >= 0
+        haut[actifs[au_dessus]] = candidats[au_dessus]
+        f_haut[actifs[au_dessus]] = f[au_dessus]
+        bas[actifs[~au_dessus]] = candidats[~au_dessus]
+        f_bas[actifs[~au_dessus]] = f[~au_dessus]
+
+    return haut, evaluations
+
+
+def _borne_haute(cibles):
+    # Net >= 40 % du brut même dans la tranche marginale la plus haute
+    return np.maximum(cibles, MILLIMES) * 5 // 2
+
+
+def salaires_pour_nets(cibles, annee=None, mois=None):
+    """Résout en une passe vectorisée un lot de cibles de net à payer.
+
+    ``cibles`` est une liste de dicts ou un dict de colonnes contenant
+    ``net_cible`` et, optionnellement, les colonnes de ``batch.COLONNES_ENTREE``
+    (hors salaire_base). Les règles sont celles de la période ``annee``/``mois``.
+    Retourne un dict de tableaux : salaire_base, net_a_payer, ecart (net obtenu
+    - cible) en TND, et le nombre d'évaluations vectorisées.
+    """
+    if not isinstance(cibles, dict):
+        cibles = list(cibles)
+        cibles = {k: [c.get(k, 0) for c in cibles] for k in ('net_cible',) + COLONNES_ENTREE}
+    table = preparer_table({**cibles, 'salaire_base': np.zeros(len(cibles['net_cible']), dtype=np.int64)})
+    retenues = table['avance'] + table['autres_deductions']
+    nets = _en_millimes(cibles['net_cible'], 'net_cible') + retenues
+    plan = plan_regles(annee, mois)
+
+    def evaluer(salaires, indices):
+        sous_table = {k: v[indices] for k, v in table.items()}
+        sous_table['salaire_base'] = salaires
+        return calcul_batch_millimes(sous_table, plan)['salaire_net']
+
+    salaires, evaluations = _fausse_position(evaluer, nets, _borne_haute(nets))
+    obtenus = evaluer(salaires, np.arange(len(salaires))) - retenues
+    return {
+        'salaire_base': salaires / MILLIMES,
+        'net_a_payer': obtenus / MILLIMES,
+        'ecart': (obtenus - nets + retenues) / MILLIMES,
+        'evaluations': evaluations,
+    }
+
+
+def salaire_pour_net(net_cible, chef_famille=False, enfants=0, annees_anciennete=0,
+                     avance=0, autres_deductions=0, annee=None, mois=None):
+    """Salaire de base donnant ``net_cible`` de net à payer (calcul Decimal unitaire).
+
+    Les règles sont celles de la période ``annee``/``mois``, comme pour calcul_auto.
+    """
+    entrees = {
+        'chef_famille': chef_famille,
+        'enfants': int(enfants),
+        'annees_anciennete': int(annees_anciennete),
+        'avance': avance,
+        'autres_deductions': autres_deductions,
+        'annee': annee,
+        'mois': mois,
+    }
+    evaluations = []
+
+    def net_a_payer(salaire_millimes):
+        evaluations.append(salaire_millimes)
+        data = calcul_auto(dict(entrees, salaire_base=Decimal(salaire_millimes) / MILLIMES))
+        return int(Decimal(str(data['net_a_payer'])) * MILLIMES)
+
+    def evaluer(salaires, indices):
+        return np.array([net_a_payer(int(s)) for s in salaires], dtype=np.int64)
+
+    cible = int(Decimal(str(net_cible)) * MILLIMES)
+    cibles = np.array([cible], dtype=np.int64)
+    salaires, _ = _fausse_position(evaluer, cibles, _borne_haute(cibles))
+
+    salaire_base = Decimal(int(salaires[0])) / MILLIMES
+    data = calcul_auto(dict(entrees, salaire_base=salaire_base))
+    return {
+        'salaire_base': float(salaire_base),
+        'net_a_payer': data['net_a_payer'],
+        'ecart': float((Decimal(str(data['net_a_payer'])) * MILLIMES - cible) / MILLIMES),
+        'evaluations': len(evaluations),
+        'bulletin': data,
+    }
@@ -1,3 +1,1272 @@
-from django.test import TestCase
+import csv
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import zipfile
+import zlib
+from decimal import Decimal
+from fractions import Fraction
+from unittest import mock
 
-# Create your tests here.
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError
+from django.template.loader import render_to_string
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import auto_calculs, travaux
+from .archive_pdf import ArchivePdf, archive_pdf, empreinte_pdf, pdf_bulletin
+from .auto_calculs import calcul_auto, calcul_irpp, calcul_irpp_annuel, moteur_regles
+from .auto_config import HEURES_SUPPLEMENTAIRES, REGLES_AUTOMATIQUES, SEUILS_AUTOMATIQUES
+from .batch import calcul_auto_batch, calcul_auto_batch_par_periode, iter_bulletins
+from .benchmarks import (
+    bases_aleatoires, bulletins_aleatoires, calcul_irpp_par_tranches, charger_corpus, charger_reference,
+    comparer_reference, ecarts_corpus, entrees_aleatoires, verifier_parite_millimes,
+)
+from .cache import CacheCalculs, calcul_auto_cache, cle_calcul
+from .calcul_incremental import EtatInconnu, MagasinEtats, calcul_delta
+from .chronometrage import statistiques_etapes
+from .cumuls import reconstruire_cumuls, regularisations_annuelles
+from .declaration_cnss import TotauxDeclaration, iter_declaration_csv, paies_trimestre, resume_declaration
+from .forms import BulletinPaieForm
+from .impact import ecarts_bulletin, moteur_modifie, recalcul_selectif, zones_impactees
+from .import_employes import ValidateurEmployes
+from .instantanes import bulletin_periode, enregistrer_bulletin, entrees_bulletin
+from .json_rapide import dumps
+from .millimes import arrondi_half_even, arrondi_half_up, calcul_auto_millimes, en_millimes
+from .models import CumulAnnuel, PayrollJob, PayrollJobShard, PayrollRun, Payslip
+from .pdf import gabarit_bulletin, generate_pdf_fpdf
+from .pointages import ReleveHeures, heures_par_tranche, lire_pointages, montant_heures_supp, montants_heures_supp
+from .recueil_pdf import contenu_compact, iter_recueil_pdf
+from .regles import MOIS, MoteurRegles, numero_mois
+from .resultat import LotResultats, calcul_resultat
+from .simulation import balayage_salaires
+from .solveur import salaire_pour_net, salaires_pour_nets
+from .travaux import DELAI_REPRISE, REPRISES_MAX, progression, reserver_lot, soumettre_paie, travailler
+from .views import export_calculs_json, preview_bulletin
+
+
+def corpus_aleatoire(taille, graine=2025):
+    """Corpus reproductible d'employés, seuils et bornes du barème inclus."""
+    rng = random.Random(graine)
+    salaires = [Decimal(rng.randint(0, 30_000_000)) / 1000 for _ in range(taille)]
+    # Valeurs limites : seuils des primes et bornes annuelles des tranches IRPP
+    salaires[:12] = [Decimal(v) for v in (
+        '0', '999.999', '1000', '1999.999', '2000', '416.667',
+        '666.666', '833.334', '1666.667', '5833.334', '12500', '0.005',
+    )]
+    return [
+        {
+            'salaire_base': salaire,
+            'annees_anciennete': rng.randint(0, 40),
+            'chef_famille': rng.random() < 0.5,
+            'enfants': rng.randint(0, 6),
+            'avance': Decimal(rng.randint(0, 500_000)) / 1000,
+            'autres_deductions': Decimal(rng.randint(0, 200_000)) / 1000,
+        }
+        for salaire in salaires
+    ]
+
+
+class CalculBatchTests(SimpleTestCase):
+    def test_parite_avec_calcul_auto(self):
+        employes = corpus_aleatoire(20000)
+        resultats = calcul_auto_batch(employes)
+
+        for i, (employe, bulletin) in enumerate(zip(employes, iter_bulletins(resultats))):
+            reference = calcul_auto(dict(employe))
+            for champ, valeur in bulletin.items():
+                self.assertEqual(
+                    valeur, reference.get(champ, 0.0),
+                    f"ligne {i} ({employe['salaire_base']}) : écart sur {champ}",
+                )
+
+    def test_colonnes_numpy(self):
+        import numpy as np
+
+        employes = corpus_aleatoire(500, graine=7)
+        colonnes = {
+            'salaire_base': np.array([float(e['salaire_base']) for e in employes]),
+            'annees_anciennete': np.array([e['annees_anciennete'] for e in employes]),
+            'chef_famille': np.array([e['chef_famille'] for e in employes]),
+            'enfants': np.array([e['enfants'] for e in employes]),
+        }
+        depuis_colonnes = calcul_auto_batch(colonnes)
+        depuis_dicts = calcul_auto_batch([
+            {k: e[k] for k in colonnes} for e in employes
+        ])
+        for champ in depuis_dicts:
+            self.assertTrue((depuis_colonnes[champ] == depuis_dicts[champ]).all(), champ)
+
+    def test_precision_superieure_au_millime(self):
+        with self.assertRaises(ValueError):
+            calcul_auto_batch([{'salaire_base': Decimal('1000.0005')}])
+
+
+class BulletinsZipTests(SimpleTestCase):
+    CSV = (
+        "nom_prenom,matricule,salaire_base,annees_anciennete,chef_famille,enfants,mois,annee\n"
+        "Ali Ben Salah,M1,1850.500,4,oui,2,Janvier,2025\n"
+        "Sonia Trabelsi,M2,3200,12,non,0,Janvier,2025\n"
+        "Ligne invalide,M3,abc,1,non,0,Janvier,2025\n"
+    )
+
+    def test_archive_en_flux(self):
+        fichier = SimpleUploadedFile('employes.csv', self.CSV.encode('utf-8'), content_type='text/csv')
+        response = self.client.post(reverse('bulletins_zip'), {'fichier': fichier})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content)))
+        noms = sorted(archive.namelist())
+        self.assertEqual(noms, [
+            '000002_bulletin_paie_Ali_Ben_Salah_Janvier_2025.pdf',
+            '000003_bulletin_paie_Sonia_Trabelsi_Janvier_2025.pdf',
+            'erreurs.csv',
+        ])
+        self.assertTrue(archive.read(noms[0]).startswith(b'%PDF'))
+        self.assertIn('4,salaire_base', archive.read('erreurs.csv').decode('utf-8'))
+
+    def test_import_csv_calcul_par_lots(self):
+        fichier = SimpleUploadedFile('employes.csv', self.CSV.encode('utf-8'), content_type='text/csv')
+        response = self.client.post(reverse('import_employes'), {'fichier': fichier})
+
+        self.assertTrue(response.streaming)
+        lignes = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        self.assertEqual([ligne['ligne'] for ligne in lignes], ['2', '3', '4'])
+        reference = calcul_auto({
+            'salaire_base': Decimal('1850.500'), 'annees_anciennete': 4, 'chef_famille': True, 'enfants': 2,
+            'annee': 2025, 'mois': 'Janvier',
+        })
+        self.assertEqual(float(lignes[0]['net_a_payer']), reference['net_a_payer'])
+        self.assertEqual(lignes[1]['matricule'], 'M2')
+        self.assertTrue(lignes[2]['erreurs'].startswith('salaire_base : '))
+        self.assertEqual(lignes[2]['net_a_payer'], '')
+
+    def test_export_ndjson_en_flux(self):
+        fichier = SimpleUploadedFile('employes.csv', self.CSV.encode('utf-8'), content_type='text/csv')
+        response = self.client.post(reverse('export_ndjson'), {'fichier': fichier})
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lignes = [json.loads(l) for l in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual([l['ligne'] for l in lignes], [2, 3, 4])
+        self.assertEqual(lignes[0]['nom_prenom'], 'Ali Ben Salah')
+        self.assertEqual(lignes[0]['salaire_base'], 1850.5)
+        self.assertIn('salaire_base', lignes[2]['erreurs'])
+
+        # Corps NDJSON lu au fil du calcul, lignes invalides signalées sans interrompre le flux
+        corps = '\n'.join([
+            json.dumps({'nom_prenom': 'Ali', 'salaire_base': 1850.5, 'annees_anciennete': 4,
+                        'chef_famille': True, 'enfants': 2, 'mois': 'Janvier', 'annee': 2025}),
+            '{pas du json',
+            json.dumps({'nom_prenom': 'Sonia', 'salaire_base': '3200'}),
+            json.dumps({'nom_prenom': 'Liste', 'salaire_base': [1], 'societe': {}}),
+            json.dumps({'nom_prenom': 'Karim', 'salaire_base': '2000'}),
+        ])
+        response = self.client.post(reverse('export_ndjson'), corps, content_type='application/x-ndjson')
+        lignes = [json.loads(l) for l in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        reference = calcul_auto({
+            'salaire_base': Decimal('1850.500'), 'annees_anciennete': 4, 'chef_famille': True, 'enfants': 2,
+            'annee': 2025, 'mois': 'Janvier',
+        })
+        self.assertEqual(lignes[0]['net_a_payer'], reference['net_a_payer'])
+        self.assertIn('JSON invalide', lignes[1]['erreurs']['__all__'][0]['message'])
+        self.assertEqual(lignes[2]['nom_prenom'], 'Sonia')
+        self.assertIn('salaire_base', lignes[3]['erreurs'])
+        self.assertEqual(lignes[4]['nom_prenom'], 'Karim')
+
+    def test_validation_identique_au_formulaire(self):
+        lignes = [
+            {'nom_prenom': 'A', 'salaire_base': '1200.5', 'chef_famille': 'on', 'enfants': ''},
+            {'nom_prenom': 'B', 'salaire_base': '1200.5555', 'annees_anciennete': '51', 'chef_famille': 'false'},
+            {'nom_prenom': '', 'salaire_base': '', 'annee': 'deux mille', 'enfants': '-1'},
+            {'nom_prenom': ' C ', 'salaire_base': 900, 'annees_anciennete': 3.0, 'chef_famille': True, 'annee': 2024},
+        ]
+        validateur = ValidateurEmployes()
+        for ligne in lignes:
+            initiaux = {n: c.initial for n, c in BulletinPaieForm.base_fields.items()
+                        if c.initial is not None and ligne.get(n) in (None, '')}
+            form = BulletinPaieForm(dict(ligne, **initiaux))
+            donnees, erreurs = validateur.valider(dict(ligne))
+            if form.is_valid():
+                self.assertEqual(donnees, form.cleaned_data)
+            else:
+                self.assertIsNone(donnees)
+                self.assertEqual(erreurs, form.errors.get_json_data())
+
+    def test_fichier_manquant(self):
+        response = self.client.post(reverse('bulletins_zip'))
+        self.assertEqual(response.status_code, 400)
+
+
+def operations_pdf(pdf_bytes):
+    """Tracés (rectangles) et textes positionnés des flux de contenu d'un PDF."""
+    contenu = b''.join(
+        zlib.decompress(flux) for flux in re.findall(rb'stream\n(.*?)\nendstream', pdf_bytes, re.S)
+    )
+    traces = re.findall(rb'[\d.]+ [\d.]+ [\d.]+ -[\d.]+ re [SBf]', contenu)
+    textes = re.findall(rb'(?:q ([\d. ]+rg|[\d.]+ g) )?BT ([\d.]+ [\d.]+) Td (\(.*?\)) Tj ET', contenu)
+    return sorted(traces), sorted(textes)
+
+
+class GabaritPdfTests(SimpleTestCase):
+    def test_gabarit_identique_au_rendu_classique(self):
+        bulletins = bulletins_aleatoires(30, graine=4)
+        bulletins[0].update(avance=120.5, autres_deductions=33.0, societe='ACME', cnss='1234567')
+        for data in bulletins:
+            classique = operations_pdf(generate_pdf_fpdf(data))
+            gabarit = operations_pdf(generate_pdf_fpdf(data, gabarit=True))
+            self.assertEqual(gabarit, classique, data['salaire_base'])
+
+    def test_gabarit_partage_entre_employes(self):
+        premier = dict(bulletins_aleatoires(1, graine=8)[0], cnss='1111111')
+        second = dict(premier, cnss='2222222', nom_prenom='Sonia Trabelsi')
+        self.assertIs(gabarit_bulletin(premier), gabarit_bulletin(second))
+        textes = [texte for _, _, texte in operations_pdf(generate_pdf_fpdf(second, gabarit=True))[1]]
+        self.assertIn(b'(CNSS : 2222222)', textes)
+
+    def test_pdf_compact(self):
+        data = bulletins_aleatoires(1, graine=5)[0]
+        normal = generate_pdf_fpdf(data, gabarit=True)
+        compact = generate_pdf_fpdf(data, gabarit=True, compact=True)
+        self.assertTrue(compact.startswith(b'%PDF-1.5'))
+        self.assertIn(b'/Type /XRef', compact)
+        self.assertLess(len(compact), len(normal))
+
+    def test_contenu_compact_conserve_les_textes(self):
+        contenu = 'BT /F1 9.00 Tf ET\nBT /F1 9.00 Tf ET\nBT 10.00 0.50 Td (1850.500 00.10) Tj ET'
+        self.assertEqual(contenu_compact(contenu), 'BT /F1 9 Tf ET\nBT 10 .5 Td (1850.500 00.10) Tj ET')
+
+    def test_bulletin_unicode(self):
+        data = dict(bulletins_aleatoires(1, graine=6)[0], nom_prenom='محمد بن علي', emploi='Łukasz Ćwik')
+        normal = generate_pdf_fpdf(data, gabarit=True)
+        compact = generate_pdf_fpdf(data, gabarit=True, compact=True)
+        self.assertIn(b'/FontFile2', normal)
+        self.assertTrue(compact.startswith(b'%PDF-1.5'))
+        self.assertLess(len(compact), len(normal))
+
+    def test_recueil_pdf_en_flux(self):
+        csv_employes = BulletinsZipTests.CSV.encode('utf-8')
+        fichier = SimpleUploadedFile('employes.csv', csv_employes, content_type='text/csv')
+        response = self.client.post(reverse('recueil_pdf'), {'fichier': fichier, 'titre': 'Janvier 2025'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        contenu = b''.join(response.streaming_content)
+        self.assertTrue(contenu.startswith(b'%PDF') and contenu.endswith(b'%%EOF\n'))
+        # Table des références : chaque entrée pointe sur le début de son objet
+        debut_xref = int(re.search(rb'startxref\n(\d+)', contenu).group(1))
+        positions = re.findall(rb'(\d{10}) 00000 n ', contenu[debut_xref:])
+        for numero, position in enumerate(positions, start=1):
+            self.assertTrue(contenu[int(position):].startswith(b'%d 0 obj' % numero), numero)
+        # Index en tête puis les pages des deux bulletins valides
+        nb_pages = int(re.search(rb'/Count (\d+)', contenu).group(1))
+        self.assertEqual(nb_pages, contenu.count(b'/Type /Page '))
+        self.assertGreaterEqual(nb_pages, 3)
+        textes = [texte for _, _, texte in operations_pdf(contenu)[1]]
+        self.assertIn(b'(Sonia Trabelsi)', textes)
+        self.assertIn(b'(Ligne 4 rejetee : salaire_base)', textes)
+
+    def test_recueil_partage_les_polices(self):
+        noms = ['محمد بن علي', 'Łukasz Ćwik', 'Ahmed Żółw']
+        employes = [
+            (i + 1, dict(data, nom_prenom=nom), None)
+            for i, (data, nom) in enumerate(zip(bulletins_aleatoires(3, graine=7), noms))
+        ]
+        recueil = b''.join(iter_recueil_pdf(employes, index=False))
+        # Une police normale et une grasse pour tout le recueil
+        self.assertEqual(recueil.count(b'/FontFile2'), 2)
+
+
+class BaremeIrppTests(SimpleTestCase):
+    def test_bareme_precompile_identique_au_parcours(self):
+        bornes = [Decimal(v) / 12 for v in (
+            '0', '5000', '5000.001', '5000.012', '10000', '10000.001', '20000',
+            '30000', '40000', '50000', '70000', '70000.001', '1000000',
+        )]
+        for base in bornes + bases_aleatoires(20000, graine=3):
+            self.assertEqual(calcul_irpp(base), calcul_irpp_par_tranches(base), base)
+
+
+class CacheCalculsTests(SimpleTestCase):
+    ENTREES = {
+        'nom_prenom': 'Ali Ben Salah', 'salaire_base': Decimal('2450.750'),
+        'annees_anciennete': 6, 'chef_famille': True, 'enfants': 2, 'avance': Decimal('100'),
+    }
+
+    def test_resultat_identique_a_calcul_auto(self):
+        attendu = calcul_auto(dict(self.ENTREES))
+        for _ in range(2):
+            obtenu = calcul_auto_cache(dict(self.ENTREES))
+            self.assertEqual(obtenu, attendu)
+
+    def test_cle_ignore_identite(self):
+        autre = dict(self.ENTREES, nom_prenom='Sonia Trabelsi', matricule='M9', salaire_base='2450.75')
+        self.assertEqual(cle_calcul(autre), cle_calcul(self.ENTREES))
+
+    def test_api_lot_erreurs_par_element(self):
+        lot = [
+            {'salaire_base': '2450.750', 'annees_anciennete': 6, 'chef_famille': True, 'enfants': 2, 'avance': 100},
+            {'salaire_base': 'abc'},
+            'pas un objet',
+            {'salaire_base': 1200.5, 'annee': 2024, 'mois': 'Juin'},
+        ]
+        reponse = self.client.post(reverse('calcul_auto_lot'), json.dumps(lot), content_type='application/json')
+        contenu = reponse.json()
+        self.assertEqual((contenu['total'], contenu['erreurs']), (4, 2))
+        resultats = contenu['resultats']
+        self.assertEqual([r['success'] for r in resultats], [True, False, False, True])
+        attendu = calcul_auto(dict(self.ENTREES))
+        self.assertEqual(resultats[0]['data']['net_a_payer'], attendu['net_a_payer'])
+        self.assertEqual(
+            resultats[3]['data']['irpp'],
+            calcul_auto({'salaire_base': '1200.5', 'annee': 2024, 'mois': 'Juin'})['irpp'],
+        )
+
+        corps = json.dumps({'employes': lot[:1], 'moteur': 'millimes'})
+        reponse = self.client.post(reverse('calcul_auto_lot'), corps, content_type='application/json')
+        self.assertEqual(reponse.json()['resultats'][0]['data']['net_a_payer'], attendu['net_a_payer'])
+        self.assertEqual(self.client.post(reverse('calcul_auto_lot'), '{', content_type='application/json').status_code, 400)
+
+    def test_json_rapide_decimal(self):
+        self.assertEqual(json.loads(dumps({'a': Decimal('1.250'), 'b': [1, 'é']})), {'a': 1.25, 'b': [1, 'é']})
+
+    def test_hits_misses_et_lru(self):
+        cache = CacheCalculs(taille_max=2, ttl=60)
+        for cle in ('a', 'b', 'a', 'c', 'b'):
+            cache.obtenir(cle, lambda: cle.upper())
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (1, 4, 2))
+
+    def test_expiration(self):
+        cache = CacheCalculs(ttl=0)
+        cache.obtenir('a', lambda: 1)
+        cache.obtenir('a', lambda: 1)
+        self.assertEqual(cache.stats()['expirations'], 1)
+
+    def test_invalidation_sur_changement_de_regles(self):
+        cache = CacheCalculs()
+        cache.obtenir('a', lambda: 1)
+        seuil = SEUILS_AUTOMATIQUES['prime_rendement_seuil']
+        try:
+            SEUILS_AUTOMATIQUES['prime_rendement_seuil'] = Decimal('1500')
+            self.assertEqual(cache.obtenir('a', lambda: 2), 2)
+        finally:
+            SEUILS_AUTOMATIQUES['prime_rendement_seuil'] = seuil
+        self.assertEqual(cache.stats()['invalidations'], 1)
+
+    def test_changement_de_bareme_recompile(self):
+        base = Decimal('2000')
+        avant = calcul_irpp(base)
+        tranche = auto_calculs.BARÈME_IRPP[1]
+        try:
+            auto_calculs.BARÈME_IRPP[1] = (tranche[0], tranche[1], 0.20)
+            auto_calculs.version_regles()
+            self.assertGreater(calcul_irpp(base), avant)
+        finally:
+            auto_calculs.BARÈME_IRPP[1] = tranche
+            auto_calculs.version_regles()
+        self.assertEqual(calcul_irpp(base), avant)
+
+
+class CalculIncrementalTests(SimpleTestCase):
+    ENTREES = {
+        'salaire_base': '2450.750', 'annees_anciennete': '6', 'chef_famille': 'true',
+        'enfants': '2', 'avance': '100', 'autres_deductions': '0',
+    }
+    SORTIES_CALCUL_AUTO = ('date_generation', 'salaire_base', 'annees_anciennete', 'chef_famille',
+                           'enfants', 'avance', 'autres_deductions')
+
+    def attendu(self, entrees):
+        entrees = dict(entrees, chef_famille=entrees.get('chef_famille') == 'true')
+        return {k: v for k, v in calcul_auto(entrees).items() if k not in self.SORTIES_CALCUL_AUTO}
+
+    def test_saisie_complete_identique_a_calcul_auto(self):
+        resultat = calcul_delta(dict(self.ENTREES), magasin=MagasinEtats())
+        self.assertEqual(resultat['modifies'], self.attendu(self.ENTREES))
+        self.assertEqual(resultat['etapes'], ['gains', 'cotisations', 'deductions', 'impots', 'net'])
+
+    def test_seules_les_etapes_dependantes_sont_recalculees(self):
+        magasin = MagasinEtats()
+        etat = calcul_delta(dict(self.ENTREES), magasin=magasin)['etat']
+        complet = self.attendu(self.ENTREES)
+        for modification, etapes in (
+            ({'enfants': '3'}, ['deductions', 'impots', 'net']),
+            ({'avance': '250'}, ['net']),
+            ({'annees_anciennete': '12'}, ['gains', 'cotisations', 'impots', 'net']),
+        ):
+            resultat = calcul_delta(modification, etat, magasin=magasin)
+            self.assertEqual(resultat['etapes'], etapes)
+            etat = resultat['etat']
+            precedent, complet = complet, self.attendu(dict(self.ENTREES, **modification))
+            self.assertEqual(resultat['modifies'], {k: v for k, v in complet.items() if precedent[k] != v})
+            self.ENTREES = dict(self.ENTREES, **modification)
+
+    def test_sans_changement_et_prime_supprimee(self):
+        magasin = MagasinEtats()
+        etat = calcul_delta(dict(self.ENTREES), magasin=magasin)['etat']
+        resultat = calcul_delta({'enfants': '2', 'nom_prenom': 'Ali'}, etat, magasin=magasin)
+        self.assertEqual((resultat['etat'], resultat['modifies'], resultat['etapes']), (etat, {}, []))
+
+        # Prime de rendement soumise à un seuil de salaire de base
+        resultat = calcul_delta({'salaire_base': '300'}, etat, magasin=magasin)
+        attendu = self.attendu(dict(self.ENTREES, salaire_base='300'))
+        self.assertTrue(resultat['supprimes'])
+        self.assertEqual(resultat['supprimes'], sorted(set(self.attendu(self.ENTREES)) - set(attendu)))
+
+    def test_changement_de_regles_recalcule(self):
+        magasin = MagasinEtats()
+        etat = calcul_delta(dict(self.ENTREES), magasin=magasin)['etat']
+        tranche = auto_calculs.BARÈME_IRPP[1]
+        try:
+            auto_calculs.BARÈME_IRPP[1] = (tranche[0], tranche[1], 0.20)
+            resultat = calcul_delta({}, etat, magasin=magasin)
+            self.assertIn('irpp', resultat['modifies'])
+            self.assertNotEqual(resultat['etat'], etat)
+        finally:
+            auto_calculs.BARÈME_IRPP[1] = tranche
+            auto_calculs.version_regles()
+
+    def test_api_delta(self):
+        reponse = self.client.post(reverse('calcul_auto_delta'), self.ENTREES)
+        contenu = reponse.json()
+        self.assertEqual(contenu['modifies']['net_a_payer'], self.attendu(self.ENTREES)['net_a_payer'])
+
+        reponse = self.client.post(reverse('calcul_auto_delta'), {'etat': contenu['etat'], 'chef_famille': 'false'})
+        contenu = reponse.json()
+        self.assertEqual(contenu['etapes'], ['deductions', 'impots', 'net'])
+        attendu = calcul_auto(dict(self.ENTREES, chef_famille=False))
+        self.assertEqual(contenu['modifies']['net_a_payer'], attendu['net_a_payer'])
+
+        reponse = self.client.post(reverse('calcul_auto_delta'), {'etat': 'inconnu', 'enfants': '1'})
+        self.assertEqual((reponse.status_code, reponse.json()['etat_inconnu']), (409, True))
+        reponse = self.client.post(reverse('calcul_auto_delta'), {'salaire_base': 'abc'})
+        self.assertEqual(reponse.status_code, 400)
+
+    def test_case_decochee_comme_le_calcul_complet(self):
+        coche = calcul_auto(dict(self.ENTREES, chef_famille=True))['net_a_payer']
+        decoche = calcul_auto(dict(self.ENTREES, chef_famille=False))['net_a_payer']
+        for texte, attendu in (('false', decoche), ('Non', decoche), ('0', decoche), ('oui', coche), ('on', coche)):
+            entrees = dict(self.ENTREES, chef_famille=texte)
+            delta = calcul_delta(dict(entrees), magasin=MagasinEtats())
+            self.assertEqual(delta['modifies']['net_a_payer'], attendu, texte)
+            self.assertEqual(calcul_auto(dict(entrees))['net_a_payer'], attendu, texte)
+            self.assertEqual(calcul_auto(dict(entrees), 'millimes')['net_a_payer'], attendu, texte)
+
+    def test_magasin_expiration_et_lru(self):
+        magasin = MagasinEtats(taille_max=1, ttl=60)
+        premier = calcul_delta({'salaire_base': '1000'}, magasin=magasin)['etat']
+        calcul_delta({'salaire_base': '2000'}, magasin=magasin)
+        with self.assertRaises(EtatInconnu):
+            calcul_delta({}, premier, magasin=magasin)
+        self.assertEqual(magasin.stats()['evictions'], 1)
+
+
+class ReglesDateesTests(SimpleTestCase):
+    def test_numero_mois(self):
+        for mois, numero in (('Janvier', 1), ('fevrier', 2), ('Février', 2), ('AOÛT', 8), (' décembre ', 12),
+                             ('03', 3), (11, 11), ('Brumaire', None), ('', None)):
+            self.assertEqual(numero_mois(mois), numero, mois)
+
+    def test_bareme_selon_la_periode(self):
+        employe = {'salaire_base': Decimal('3000'), 'chef_famille': True, 'enfants': 1}
+        bulletin_2024 = calcul_auto(dict(employe, annee=2024, mois='Décembre'))
+        bulletin_2025 = calcul_auto(dict(employe, annee=2025, mois='Janvier'))
+        base = Decimal(str(bulletin_2024['base_imposable_nette']))
+        bareme_2024 = auto_calculs.MOTEUR_REGLES.plan(2024, 12).bareme
+
+        self.assertEqual(bulletin_2024['irpp'], float(calcul_irpp(base, bareme_2024)))
+        self.assertEqual(bulletin_2025['irpp'], float(calcul_irpp(base)))
+        self.assertNotEqual(bulletin_2024['irpp'], bulletin_2025['irpp'])
+        # Sans période : règles courantes
+        self.assertEqual(calcul_auto(dict(employe))['irpp'], bulletin_2025['irpp'])
+
+    def test_batch_par_periode(self):
+        employes = [dict(e, annee=annee, mois='Juin') for e, annee in
+                    zip(corpus_aleatoire(600, graine=9), [2024, 2025, None] * 200)]
+        resultats = calcul_auto_batch_par_periode(employes)
+        for employe, bulletin in zip(employes, iter_bulletins(resultats)):
+            reference = calcul_auto(dict(employe))
+            self.assertEqual(bulletin['net_a_payer'], reference['net_a_payer'], employe)
+
+    def test_chevauchement_refuse(self):
+        base = auto_calculs._regles_en_vigueur()
+        jeux = [
+            {'debut': (2024, 1), 'fin': (2024, 12), 'css_taux': Decimal('0.01')},
+            {'debut': (2024, 6), 'fin': (2025, 6), 'css_taux': Decimal('0.02')},
+        ]
+        with self.assertRaises(ValueError):
+            MoteurRegles(base, jeux)
+
+
+class MoteurMillimesTests(SimpleTestCase):
+    def test_arrondis_entiers_identiques_a_quantize(self):
+        rng = random.Random(7)
+        for _ in range(5000):
+            numerateur, diviseur = rng.randint(-10 ** 7, 10 ** 7), rng.choice((2, 10, 12, 100, 1000))
+            valeur = Decimal(numerateur) / diviseur
+            for arrondi, mode in ((arrondi_half_up, 'ROUND_HALF_UP'), (arrondi_half_even, 'ROUND_HALF_EVEN')):
+                self.assertEqual(arrondi(numerateur, diviseur), valeur.quantize(Decimal('1'), rounding=mode))
+
+    def test_parite_avec_le_moteur_decimal(self):
+        for entrees in corpus_aleatoire(5000):
+            entrees.update(annee=random.Random(entrees['enfants']).choice((None, 2024, 2025)), mois='Juin')
+            attendu = calcul_auto(dict(entrees))
+            obtenu = calcul_auto(dict(entrees), 'millimes')
+            attendu.pop('date_generation'), obtenu.pop('date_generation')
+            self.assertEqual(list(obtenu.items()), list(attendu.items()), entrees)
+        self.assertEqual(verifier_parite_millimes(20000, graine=11), [])
+
+    def test_montant_plus_precis_que_le_millime(self):
+        self.assertEqual(en_millimes('1234.567'), 1234567)
+        self.assertEqual(en_millimes(''), 0)
+        with self.assertRaises(ValueError):
+            calcul_auto({'salaire_base': '1000.0005'}, 'millimes')
+        with self.assertRaises(ValueError):
+            calcul_auto({'salaire_base': 1000}, 'flottant')
+
+
+class ResultatBulletinTests(SimpleTestCase):
+    def test_lu_comme_le_dictionnaire_de_calcul_auto(self):
+        for entrees in corpus_aleatoire(2000):
+            entrees.update(nom_prenom='Ali Ben Salah', prime_rendement=None, annee=2025, mois='Juin')
+            resultat = calcul_resultat(entrees)
+            attendu = calcul_auto(dict(entrees))
+            attendu['date_generation'] = resultat['date_generation']
+            self.assertEqual(list(resultat.items()), list(attendu.items()), entrees)
+            self.assertEqual(resultat.json(), dumps(attendu))
+        # La saisie n'est ni copiée ni modifiée
+        self.assertIs(resultat.entrees, entrees)
+        self.assertIsNone(entrees['prime_rendement'])
+
+    def test_prime_non_accordee_absente(self):
+        resultat = calcul_resultat({'salaire_base': Decimal('1500')})
+        self.assertNotIn('prime_rendement', resultat)
+        self.assertEqual(resultat.get('prime_rendement', 0), 0)
+        self.assertEqual(resultat.millimes('prime_presence'), 75000)
+        with self.assertRaises(KeyError):
+            resultat.millimes('prime_rendement')
+
+    def test_lot_partage_un_tableau(self):
+        entrees = entrees_aleatoires(50, graine=3)
+        lot = LotResultats.calculer(entrees, 2025, 'Janvier')
+        self.assertEqual(len(lot.montants), 50 * lot.schema.largeur)
+        for resultat, data in zip(lot, entrees):
+            self.assertEqual(dict(resultat), dict(calcul_resultat(data), date_generation=lot.date_generation))
+        self.assertEqual(json.loads(lot.json())[-1]['net_a_payer'], lot[-1]['net_a_payer'])
+        self.assertEqual(list(lot.colonne('irpp')), [r.millimes('irpp') for r in lot])
+
+    def test_pdf_et_apercu(self):
+        data = entrees_aleatoires(1, graine=8)[0]
+        resultat = calcul_resultat(data)
+        self.assertEqual(
+            operations_pdf(generate_pdf_fpdf(resultat, gabarit=True)),
+            operations_pdf(generate_pdf_fpdf(calcul_auto(dict(data)), gabarit=True)),
+        )
+        self.assertEqual(
+            render_to_string('fiche_de_paie/bulletin.html', {'data': resultat}),
+            render_to_string('fiche_de_paie/bulletin.html', {'data': resultat.en_dict()}),
+        )
+
+
+class HeuresSupplementairesTests(SimpleTestCase):
+    # Semaine du lundi 3 au dimanche 9 mars 2025 puis semaine du 10 mars
+    POINTAGES = (
+        "matricule,date,heures\n"
+        + "".join(f"M1,2025-03-0{j},10\n" for j in range(3, 8))
+        + "M1,08/03/2025,4:30\nM1,08/03/2025,1,5\n"
+        + "".join(f"M1,2025-03-1{j},7.5\n" for j in range(0, 5))
+        + "M2,2025-03-03,9\nM3,2025-03-03,abc\n,2025-03-03,8\nM3,2025-13-01,8\n"
+    ).replace(",1,5", ',"1,5"')
+
+    def test_repartition_par_semaine_et_par_tranche(self):
+        pointages = lire_pointages(io.StringIO(self.POINTAGES))
+        self.assertEqual(pointages.matricules, ['M1', 'M2'])
+        self.assertEqual([numero for numero, _ in pointages.erreurs], [15, 16, 17])
+        # Semaine 1 : 50 h + 4 h 30 + 1 h 30 = 56 h -> 8 h à 25 %, 8 h à 75 % ; semaine 2 : 37 h 30
+        self.assertEqual(heures_par_tranche(pointages).tolist(), [[480, 480], [0, 0]])
+        self.assertEqual(heures_par_tranche(pointages, [(Decimal('48'), Decimal('0.75'))]).tolist(), [[480], [0]])
+        with self.assertRaises(ValueError):
+            lire_pointages(io.StringIO("matricule,jour,heures\nM1,2025-03-03,8\n"))
+
+    def test_dates_hors_releve_rejetees(self):
+        releve = self.POINTAGES + "M2,01/01/0001,8\nM2,1925-03-03,8\n"
+        pointages = lire_pointages(io.StringIO(releve))
+        self.assertEqual(pointages.erreurs[3:], [
+            (18, "Date hors du relevé : 0001-01-01"), (19, "Date hors du relevé : 1925-03-03"),
+        ])
+        self.assertEqual(len(pointages), 13)
+        self.assertEqual(heures_par_tranche(pointages).tolist(), [[480, 480], [0, 0]])
+        # Fenêtre nulle : seul le jour médian (vendredi 7 mars) est gardé
+        with override_settings(PAIE_POINTAGES_MAX_SEMAINES=0):
+            self.assertEqual(len(lire_pointages(io.StringIO(releve))), 1)
+
+    def test_montant_exact_au_centime(self):
+        rng = random.Random(5)
+        minutes = [[rng.randint(0, 480), rng.randint(0, 2000)] for _ in range(2000)]
+        salaires = [rng.randint(0, 30_000_000) for _ in range(2000)]
+        vectoriels = montants_heures_supp(minutes, salaires)
+        for (m25, m75), salaire, vectoriel in zip(minutes, salaires, vectoriels):
+            montant = montant_heures_supp((m25, m75), Decimal(salaire) / 1000)
+            exact = Fraction(salaire, 1000) / Fraction('173.33') * (
+                Fraction(m25, 60) * Fraction('1.25') + Fraction(m75, 60) * Fraction('1.75')
+            )
+            # round() d'une Fraction : arrondi exact, égalité vers le pair
+            self.assertEqual(montant, Decimal(round(exact * 100)).scaleb(-2))
+            self.assertEqual(int(vectoriel), montant * 1000)
+        self.assertEqual(montant_heures_supp((300, 60), '1733.3'), Decimal('80.00'))
+
+    def test_heures_supp_dans_le_brut_de_chaque_moteur(self):
+        employes = entrees_aleatoires(300, graine=4)
+        rng = random.Random(4)
+        for data in employes:
+            data['heures_supp'] = Decimal(rng.randint(0, 900_000)) / 1000
+        lot = list(iter_bulletins(calcul_auto_batch([dict(data) for data in employes])))
+        for data, ligne in zip(employes, lot):
+            attendu = calcul_auto(dict(data))
+            sans = calcul_auto(dict(data, heures_supp=0))
+            self.assertEqual(attendu['total_brut'], round(sans['total_brut'] + float(data['heures_supp']), 3))
+            obtenu = calcul_auto(dict(data), 'millimes')
+            attendu.pop('date_generation'), obtenu.pop('date_generation')
+            self.assertEqual(list(obtenu.items()), list(attendu.items()))
+            self.assertEqual({k: ligne[k] for k in ligne if k in attendu}, {k: attendu[k] for k in ligne if k in attendu})
+        self.assertNotEqual(cle_calcul(employes[0]), cle_calcul(dict(employes[0], heures_supp=0)))
+        etat = calcul_delta({'salaire_base': 1500})
+        delta = calcul_delta({'heures_supp': 100}, etat['etat'])
+        self.assertEqual(delta['modifies']['total_brut'], calcul_auto({'salaire_base': 1500, 'heures_supp': 100})['total_brut'])
+
+    def test_import_avec_releve_de_pointages(self):
+        employes = (
+            "nom_prenom,matricule,salaire_base,annees_anciennete,chef_famille,enfants,heures_supp,mois,annee\n"
+            "Ali Ben Salah,M1,1733.300,4,oui,2,,Mars,2025\n"
+            "Sonia Trabelsi,M2,3200,12,non,0,,Mars,2025\n"
+            "Karim Jaziri,M9,2000,1,non,0,50,Mars,2025\n"
+        )
+        response = self.client.post(reverse('import_employes'), {
+            'fichier': SimpleUploadedFile('employes.csv', employes.encode('utf-8'), content_type='text/csv'),
+            'pointages': SimpleUploadedFile('pointages.csv', self.POINTAGES.encode('utf-8'), content_type='text/csv'),
+        })
+        lignes = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode('utf-8'))))
+        base = {'annees_anciennete': 4, 'chef_famille': True, 'enfants': 2, 'annee': 2025, 'mois': 'Mars'}
+        # 8 h à 10 DT/h × 1,25 + 8 h × 1,75
+        releve = ReleveHeures.lire(io.StringIO(self.POINTAGES))
+        self.assertEqual(releve.montant('M1', Decimal('1733.300')), Decimal('240.00'))
+        attendu = calcul_auto(dict(base, salaire_base=Decimal('1733.300'), heures_supp=Decimal('240')))
+        self.assertEqual(float(lignes[0]['total_brut']), attendu['total_brut'])
+        # Pointé sans heures supplémentaires, puis absent du relevé : la saisie est conservée
+        self.assertEqual(float(lignes[1]['total_brut']), calcul_auto({'salaire_base': 3200, 'annees_anciennete': 12})['total_brut'])
+        self.assertEqual(
+            float(lignes[2]['total_brut']),
+            calcul_auto({'salaire_base': 2000, 'annees_anciennete': 1, 'heures_supp': 50})['total_brut'],
+        )
+
+        response = self.client.post(reverse('import_employes'), {
+            'fichier': SimpleUploadedFile('employes.csv', employes.encode('utf-8'), content_type='text/csv'),
+            'pointages': SimpleUploadedFile('pointages.csv', b'matricule;heures\n', content_type='text/csv'),
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+class CorpusReferenceTests(SimpleTestCase):
+    def test_corpus_fige(self):
+        corpus = charger_corpus()
+        self.assertGreaterEqual(len(corpus), 240)
+        self.assertGreaterEqual(sum(1 for cas in corpus if cas['entrees'].get('heures_supp')), 40)
+        self.assertEqual(ecarts_corpus(corpus), [])
+
+    def test_regression_de_debit(self):
+        reference = {'debit_batch': 100000, 'debit_pdf_gabarit': 1000, 'pdf_gabarit_ms': 1.0}
+        self.assertEqual(comparer_reference({'debit_batch': 91000, 'debit_pdf_gabarit': 1200}, reference), [])
+        self.assertEqual(
+            comparer_reference({'debit_batch': 85000, 'pdf_gabarit_ms': 5.0}, reference),
+            [('debit_batch', 100000, 85000, -0.15)],
+        )
+        self.assertEqual(comparer_reference({'debit_batch': 85000}, reference, seuil=0.2), [])
+
+    def test_reference_couvre_les_debits_suivis(self):
+        # Un débit absent de la référence n'est jamais comparé
+        reference = charger_reference()
+        for nom in ('debit_unitaire', 'debit_unitaire_millimes', 'debit_batch', 'debit_balayage'):
+            self.assertIn(nom, reference)
+
+
+class SolveurNetBrutTests(SimpleTestCase):
+    def test_salaire_minimal_pour_la_cible(self):
+        for cible in ('450', '1000', '2500', '2500.5', '9000', '40000'):
+            resultat = salaire_pour_net(cible, chef_famille=True, enfants=2, annees_anciennete=6)
+            self.assertGreaterEqual(resultat['net_a_payer'], float(cible))
+            self.assertLess(resultat['evaluations'], 30)
+            precedent = calcul_auto({
+                'salaire_base': Decimal(str(resultat['salaire_base'])) - Decimal('0.001'),
+                'chef_famille': True, 'enfants': 2, 'annees_anciennete': 6,
+            })
+            self.assertLess(precedent['net_a_payer'], float(cible))
+
+    def test_lot_coherent_avec_le_calcul_unitaire(self):
+        rng = random.Random(11)
+        cibles = [
+            {
+                'net_cible': Decimal(rng.randint(0, 12_000_000)) / 1000,
+                'chef_famille': rng.random() < 0.5,
+                'enfants': rng.randint(0, 4),
+                'annees_anciennete': rng.randint(0, 30),
+                'avance': Decimal(rng.randint(0, 300)),
+            }
+            for _ in range(40)
+        ]
+        lot = salaires_pour_nets(cibles)
+        for i, cible in enumerate(cibles):
+            unitaire = salaire_pour_net(**cible)
+            # Les arrondis rendent le net localement non monotone : les deux
+            # solutions peuvent différer de quelques millimes
+            self.assertAlmostEqual(lot['salaire_base'][i], unitaire['salaire_base'], delta=0.1)
+            self.assertGreaterEqual(lot['net_a_payer'][i], float(cible['net_cible']))
+
+    def test_endpoint_json(self):
+        response = self.client.post(
+            reverse('salaire_brut_ajax'),
+            data='{"cibles": [{"net_cible": 2500}, {"net_cible": 1800, "chef_famille": true, "enfants": 1}]}',
+            content_type='application/json',
+        )
+        resultats = response.json()['resultats']
+        self.assertEqual(len(resultats), 2)
+        self.assertGreaterEqual(resultats[0]['net_a_payer'], 2500)
+        with override_settings(PAIE_LOT_MAX=1):
+            response = self.client.post(
+                reverse('salaire_brut_ajax'), data='{"cibles": [{"net_cible": 1}, {"net_cible": 2}]}',
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 413)
+        for corps in ('{', '{"cibles": [1]}', '{"cibles": [{"net_cible": "abc"}]}'):
+            response = self.client.post(reverse('salaire_brut_ajax'), data=corps, content_type='application/json')
+            self.assertEqual(response.status_code, 400, corps)
+
+    def test_regles_de_la_periode(self):
+        employe = {'chef_famille': True, 'enfants': 1}
+        unitaire = salaire_pour_net('2500', annee=2024, mois='Décembre', **employe)
+        courant = salaire_pour_net('2500', **employe)
+        self.assertNotEqual(unitaire['salaire_base'], courant['salaire_base'])
+        bulletin = calcul_auto(dict(employe, salaire_base=Decimal(str(unitaire['salaire_base'])),
+                                    annee=2024, mois='Décembre'))
+        self.assertEqual(bulletin['net_a_payer'], unitaire['net_a_payer'])
+        lot = salaires_pour_nets([dict(employe, net_cible='2500')], annee=2024, mois='Décembre')
+        self.assertAlmostEqual(lot['salaire_base'][0], unitaire['salaire_base'], delta=0.1)
+        response = self.client.post(
+            reverse('salaire_brut_ajax'),
+            data=json.dumps({'annee': 2024, 'mois': 'Décembre', 'cibles': [dict(employe, net_cible=2500)]}),
+            content_type='application/json',
+        )
+        self.assertAlmostEqual(response.json()['resultats'][0]['salaire_base'], unitaire['salaire_base'], delta=0.1)
+
+
+class BalayageSimulateurTests(SimpleTestCase):
+    def test_courbes_identiques_au_calcul_unitaire(self):
+        balayage = balayage_salaires('500', '15000', '7.5', situations=[(False, 0), (True, 3)], annee=2024)
+        self.assertEqual(len(balayage['salaire_base']), 1934)
+        for courbe in balayage['situations']:
+            for i in (0, 66, 200, 1000, 1933):
+                data = calcul_auto({
+                    'salaire_base': str(balayage['salaire_base'][i]), 'annee': 2024,
+                    'chef_famille': courbe['chef_famille'], 'enfants': courbe['enfants'],
+                })
+                self.assertEqual(courbe['salaire_net'][i], data['salaire_net'])
+                self.assertEqual(courbe['irpp'][i], data['irpp'])
+                self.assertEqual(courbe['cout_employeur'][i], data['total_brut'] + data['total_cotisations_patronales'])
+            self.assertTrue(((courbe['taux_marginal'] > 0) & (courbe['taux_marginal'] < 1)).all())
+
+    def test_endpoint_json_et_csv(self):
+        url = reverse('balayage_simulateur')
+        reponse = self.client.get(url, {'minimum': 1000, 'maximum': 1010, 'situations': '0:0,1:2'})
+        contenu = reponse.json()
+        self.assertEqual(contenu['points'], 11)
+        self.assertEqual([s['enfants'] for s in contenu['situations']], [0, 2])
+        self.assertEqual(len(contenu['situations'][1]['irpp']), 11)
+
+        reponse = self.client.post(url, {'minimum': 1000, 'maximum': 1010, 'pas': 5, 'format': 'csv'})
+        lignes = list(csv.reader(io.StringIO(reponse.content.decode())))
+        self.assertEqual(lignes[0][:3], ['chef_famille', 'enfants', 'salaire_base'])
+        self.assertEqual([l[2] for l in lignes[1:]], ['1000.000', '1005.000', '1010.000'])
+
+        self.assertEqual(self.client.get(url, {'minimum': 0, 'maximum': 1e7, 'pas': 1}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'pas': 0}).status_code, 400)
+
+
+class ArchiveTemporaire:
+    """Archive des PDF dans un répertoire temporaire : les tests n'écrivent rien sous MEDIA_ROOT."""
+
+    def setUp(self):
+        super().setUp()
+        repertoire = tempfile.TemporaryDirectory()
+        self.addCleanup(repertoire.cleanup)
+        reglage = override_settings(PAIE_ARCHIVE_PDF=repertoire.name)
+        reglage.enable()
+        self.addCleanup(reglage.disable)
+        self.repertoire = repertoire.name
+
+
+class InstantanesBulletinTests(ArchiveTemporaire, TestCase):
+    FORMULAIRE = {
+        'nom_prenom': 'Ali Ben Salah', 'matricule': 'M1', 'societe': 'SOCIETE DIAMOND',
+        'annee': '2025', 'mois': 'Janvier', 'salaire_base': '2450.750', 'annees_anciennete': '6',
+        'chef_famille': 'on', 'enfants': '2', 'prime_presence': '0', 'indemn_transport': '0',
+        'prime_panier': '0', 'prime_rendement': '0', 'prime_anciennete': '0', 'heures_supp': '0',
+        'avance': '100', 'autres_deductions': '0',
+    }
+
+    def test_reimpression_sans_recalcul(self):
+        premier = self.client.post(reverse('generate_paie'), self.FORMULAIRE)
+        self.assertEqual(premier['Content-Type'], 'application/pdf')
+        bulletin = Payslip.objects.get()
+
+        # Même saisie (décimaux écrits autrement) : relecture de l'instantané
+        self.client.post(reverse('generate_paie'), dict(self.FORMULAIRE, salaire_base='2450.75'))
+        self.assertEqual(Payslip.objects.count(), 1)
+
+        # Nouvelle saisie : nouvel instantané pour la même période
+        self.client.post(reverse('generate_paie'), dict(self.FORMULAIRE, avance='0'))
+        self.assertEqual(Payslip.objects.count(), 2)
+
+        reponse = self.client.get(reverse('bulletin_enregistre', args=[bulletin.pk, 'json']))
+        self.assertEqual(reponse.json()['net_a_payer'], bulletin.donnees['net_a_payer'])
+
+    def test_export_ndjson_d_une_paie(self):
+        self.client.post(reverse('generate_paie'), self.FORMULAIRE)
+        self.client.post(reverse('generate_paie'), dict(self.FORMULAIRE, matricule='M2', nom_prenom='Sonia'))
+        run = PayrollRun.objects.get()
+        response = self.client.get(reverse('export_paie_ndjson', args=[run.pk]))
+        lignes = [json.loads(l) for l in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual([l['matricule'] for l in lignes], ['M1', 'M2'])
+        self.assertEqual(lignes[0]['net_a_payer'], Payslip.objects.get(matricule='M1').donnees['net_a_payer'])
+
+    def test_bulletin_historique_apres_changement_de_regles(self):
+        self.client.post(reverse('generate_paie'), self.FORMULAIRE)
+        net = Payslip.objects.get().donnees['net_a_payer']
+        seuil = SEUILS_AUTOMATIQUES['prime_rendement_seuil']
+        try:
+            SEUILS_AUTOMATIQUES['prime_rendement_seuil'] = Decimal('1500')
+            reponse = self.client.get(reverse('reimpression_bulletin'), {
+                'matricule': 'M1', 'societe': 'SOCIETE DIAMOND', 'annee': 2025, 'mois': 'Janvier', 'format': 'json',
+            })
+        finally:
+            SEUILS_AUTOMATIQUES['prime_rendement_seuil'] = seuil
+        self.assertEqual(reponse.json()['net_a_payer'], net)
+
+    def test_previsualisation_et_export_sans_emission(self):
+        requetes = RequestFactory()
+        preview_bulletin(requetes.post('/', self.FORMULAIRE))
+        export_calculs_json(requetes.post('/', dict(self.FORMULAIRE, avance='0')))
+        self.assertFalse(Payslip.objects.exists())
+
+        self.client.post(reverse('generate_paie'), self.FORMULAIRE)
+        emis = Payslip.objects.get()
+        reponse = export_calculs_json(requetes.post('/', self.FORMULAIRE))
+        self.assertEqual(json.loads(reponse.content)['net_a_payer'], emis.donnees['net_a_payer'])
+        # Autre saisie prévisualisée : rien d'enregistré, le bulletin émis reste en vigueur
+        reponse = export_calculs_json(requetes.post('/', dict(self.FORMULAIRE, avance='0')))
+        self.assertNotEqual(json.loads(reponse.content)['net_a_payer'], emis.donnees['net_a_payer'])
+        self.assertEqual(Payslip.objects.count(), 1)
+        self.assertEqual(bulletin_periode('M1', 'SOCIETE DIAMOND', 2025, 'Janvier'), emis)
+
+    def test_vues_servies_par_resultat_bulletin(self):
+        form = BulletinPaieForm(self.FORMULAIRE)
+        self.assertTrue(form.is_valid())
+        attendu = json.loads(calcul_resultat(dict(form.cleaned_data)).json())
+
+        reponse = export_calculs_json(RequestFactory().post('/', self.FORMULAIRE))
+        self.assertEqual(reponse['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(reponse.content), attendu)
+        self.assertEqual(preview_bulletin(RequestFactory().post('/', self.FORMULAIRE)).status_code, 200)
+
+        self.client.post(reverse('generate_paie'), self.FORMULAIRE)
+        self.assertEqual(list(Payslip.objects.get().donnees.items()), list(attendu.items()))
+
+    def test_bulletin_reemis_apres_changement_de_regles(self):
+        self.client.post(reverse('generate_paie'), self.FORMULAIRE)
+        ancien = Payslip.objects.get()
+        taux = REGLES_AUTOMATIQUES['prime_rendement']['valeur']
+        try:
+            REGLES_AUTOMATIQUES['prime_rendement']['valeur'] = Decimal('0.05')
+            self.client.post(reverse('generate_paie'), self.FORMULAIRE)
+            nouveau = Payslip.objects.exclude(pk=ancien.pk).get()
+        finally:
+            REGLES_AUTOMATIQUES['prime_rendement']['valeur'] = taux
+        self.assertNotEqual(nouveau.version_regles, ancien.version_regles)
+        self.assertGreater(nouveau.donnees['total_brut'], ancien.donnees['total_brut'])
+
+        # Retour aux règles d'origine : l'ancien instantané est réémis et redevient celui en vigueur
+        self.client.post(reverse('generate_paie'), self.FORMULAIRE)
+        self.assertEqual(Payslip.objects.count(), 2)
+        self.assertEqual(bulletin_periode('M1', 'SOCIETE DIAMOND', 2025, 'Janvier'), ancien)
+
+
+class ArchivePdfTests(ArchiveTemporaire, TestCase):
+    def fichiers(self):
+        return [f for _, _, noms in os.walk(self.repertoire) for f in noms]
+
+    def test_bulletin_regenere_relu_dans_l_archive(self):
+        premier = self.client.post(reverse('generate_paie'), InstantanesBulletinTests.FORMULAIRE).content
+        second = self.client.post(reverse('generate_paie'), InstantanesBulletinTests.FORMULAIRE).content
+        bulletin = Payslip.objects.get()
+        reimpression = self.client.get(reverse('bulletin_enregistre', args=[bulletin.pk, 'pdf'])).content
+        self.assertEqual(second, premier)
+        self.assertEqual(reimpression, premier)
+        self.assertEqual(self.fichiers(), [f"{empreinte_pdf(bulletin.donnees)}.pdf"])
+        stats = archive_pdf().stats()
+        self.assertEqual((stats['ecritures'], stats['hits']), (1, 2))
+
+    def test_cle_selon_donnees_et_mise_en_page(self):
+        data = calcul_auto(dict(CacheCalculsTests.ENTREES))
+        self.assertEqual(empreinte_pdf(dict(data)), empreinte_pdf(data))
+        self.assertNotEqual(empreinte_pdf(data, compact=True), empreinte_pdf(data))
+        self.assertNotEqual(empreinte_pdf(dict(data, net_a_payer=0)), empreinte_pdf(data))
+        pdf, relu = pdf_bulletin(data)
+        self.assertEqual(pdf_bulletin(data), (pdf, True))
+        self.assertFalse(relu)
+        with override_settings(PAIE_ARCHIVE_PDF=False):
+            self.assertIsNone(archive_pdf())
+
+    def test_taille_de_l_archive_limitee(self):
+        bulletins = bulletins_aleatoires(4, graine=9)
+        with override_settings(PAIE_ARCHIVE_PDF_TAILLE_MAX=0):
+            for data in bulletins:
+                pdf_bulletin(data)
+            self.assertEqual(self.fichiers(), [])
+            self.assertEqual(archive_pdf().stats()['suppressions'], 4)
+        archive = archive_pdf()
+        for data in bulletins:
+            pdf_bulletin(data)
+        self.assertEqual(len(self.fichiers()), 4)
+        self.assertEqual(archive.purger(), 4)
+        self.assertEqual(self.fichiers(), [])
+
+    def test_une_purge_pour_plusieurs_ecritures_au_dela_du_plafond(self):
+        archive = ArchivePdf(self.repertoire, taille_max=1000)
+        with mock.patch.object(archive, '_fichiers', wraps=archive._fichiers) as parcours:
+            for i in range(110):
+                archive.ecrire(f"{i:064x}", b'x' * 10)
+        # Plafond dépassé à la 101e écriture : purge jusqu'à 900 octets, puis 9 écritures sous le plafond
+        self.assertEqual(archive.stats()['purges'], 1)
+        self.assertEqual(archive.stats()['suppressions'], 11)
+        self.assertEqual(len(self.fichiers()), 99)
+        self.assertEqual(archive._taille, 990)
+        # Mesure initiale de l'archive et parcours de la purge, pas un par écriture
+        self.assertEqual(parcours.call_count, 2)
+
+
+class ChronometrageTests(ArchiveTemporaire, TestCase):
+    def setUp(self):
+        super().setUp()
+        statistiques_etapes.vider()
+
+    def test_server_timing_desactive(self):
+        with override_settings(PAIE_SERVER_TIMING=False):
+            reponse = self.client.post(reverse('generate_paie'), InstantanesBulletinTests.FORMULAIRE)
+        self.assertNotIn('Server-Timing', reponse)
+        self.assertEqual(statistiques_etapes.stats(), {})
+
+    def test_server_timing_et_percentiles(self):
+        with override_settings(PAIE_SERVER_TIMING=True), self.assertLogs('fiche_de_paie.chronometrage') as journal:
+            for _ in range(3):
+                reponse = self.client.post(reverse('generate_paie'), InstantanesBulletinTests.FORMULAIRE)
+        etapes = [entree.split(';')[0] for entree in reponse['Server-Timing'].split(', ')]
+        self.assertEqual(etapes, ['validation', 'calcul', 'pdf', 'reponse', 'total'])
+
+        enregistrement = json.loads(journal.records[-1].getMessage())
+        self.assertEqual(enregistrement['vue'], 'generate_paie')
+        self.assertEqual((enregistrement['bulletins'], enregistrement['octets_pdf']), (1, len(reponse.content)))
+
+        stats = self.client.get(reverse('chronometrage_stats')).json()['vues']['generate_paie']
+        self.assertEqual((stats['requetes'], stats['bulletins']), (3, 3))
+        self.assertEqual(stats['etapes']['pdf']['nombre'], 3)
+        self.assertLessEqual(stats['etapes']['total']['p50_ms'], stats['etapes']['total']['p99_ms'])
+
+
+class CumulsAnnuelsTests(TestCase):
+    def saisie(self, mois, salaire_base, **valeurs):
+        return dict({
+            'nom_prenom': 'Ali Ben Salah', 'matricule': 'M1', 'societe': 'SOCIETE DIAMOND', 'annee': 2025,
+            'mois': mois, 'salaire_base': Decimal(salaire_base), 'annees_anciennete': 3,
+            'chef_famille': True, 'enfants': 1, 'avance': Decimal('0'), 'autres_deductions': Decimal('0'),
+        }, **valeurs)
+
+    def test_cumuls_et_regularisation(self):
+        for numero, nom in enumerate(MOIS, start=1):
+            enregistrer_bulletin(self.saisie(nom.capitalize(), 1500 + 250 * numero))
+        # Mars ressaisi : le nouveau bulletin remplace l'ancien dans les cumuls
+        enregistrer_bulletin(self.saisie('Mars', 9000))
+
+        retenus = [Payslip.objects.filter(mois=nom.capitalize()).first().donnees for nom in MOIS]
+        cumul = CumulAnnuel.objects.get()
+        self.assertEqual(len(cumul.bulletins), 12)
+        base = sum(Decimal(str(d['base_imposable_nette'])) for d in retenus)
+        irpp_retenu = sum(Decimal(str(d['irpp'])) for d in retenus)
+        self.assertEqual(cumul.base_imposable, base)
+        self.assertEqual(cumul.irpp, irpp_retenu)
+
+        [regularisation] = regularisations_annuelles('SOCIETE DIAMOND', 2025)
+        irpp_du = calcul_irpp_annuel(base)
+        self.assertEqual(regularisation['irpp_du'], float(irpp_du))
+        self.assertEqual(regularisation['regularisation_irpp'], float(irpp_du - irpp_retenu))
+        # Revenus irréguliers : l'annualisation mensuelle ne retient pas l'impôt exact
+        self.assertNotEqual(regularisation['regularisation_irpp'], 0)
+
+        # Reconstruction depuis les bulletins : mêmes cumuls
+        reconstruire_cumuls('SOCIETE DIAMOND', 2025)
+        self.assertEqual(list(regularisations_annuelles('SOCIETE DIAMOND', 2025)), [regularisation])
+
+    def test_retour_a_une_saisie_anterieure(self):
+        premier = enregistrer_bulletin(self.saisie('Juin', 2000))
+        enregistrer_bulletin(self.saisie('Juin', 3000))
+        enregistrer_bulletin(self.saisie('Juin', 2000))
+        cumul = CumulAnnuel.objects.get()
+        self.assertEqual(cumul.bulletins, {'6': premier.pk})
+        self.assertEqual(cumul.irpp, Decimal(str(premier.donnees['irpp'])))
+
+    def test_employes_sans_matricule_non_cumules(self):
+        alice = enregistrer_bulletin(self.saisie('Janvier', 3000, nom_prenom='Alice', matricule=''))
+        bob = enregistrer_bulletin(self.saisie('Janvier', 1000, nom_prenom='Bob', matricule=''))
+        self.assertNotEqual(alice.pk, bob.pk)
+        self.assertFalse(CumulAnnuel.objects.exists())
+        self.assertIsNone(bulletin_periode('', 'SOCIETE DIAMOND', 2025, 'Janvier'))
+        reconstruire_cumuls('SOCIETE DIAMOND', 2025)
+        self.assertFalse(CumulAnnuel.objects.exists())
+        self.assertEqual(list(regularisations_annuelles('SOCIETE DIAMOND', 2025)), [])
+
+    def test_previsualisation_sans_effet_sur_les_cumuls(self):
+        premier = enregistrer_bulletin(self.saisie('Juin', 2000))
+        enregistrer_bulletin(self.saisie('Juin', 3000))
+        avant = CumulAnnuel.objects.get()
+        # Saisie antérieure prévisualisée : instantané relu, cumuls inchangés
+        formulaire = dict(self.saisie('Juin', 2000), chef_famille='on')
+        reponse = preview_bulletin(RequestFactory().post('/', formulaire))
+        self.assertEqual(reponse.status_code, 200)
+        apres = CumulAnnuel.objects.get()
+        self.assertEqual((apres.bulletins, apres.irpp), (avant.bulletins, avant.irpp))
+        self.assertNotEqual(apres.bulletins, {'6': premier.pk})
+
+    def test_bulletin_et_cumuls_dans_une_transaction(self):
+        with mock.patch('fiche_de_paie.instantanes.cumuler_bulletin', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                enregistrer_bulletin(self.saisie('Juin', 2000))
+        self.assertFalse(Payslip.objects.exists())
+
+    def test_endpoint_regularisation(self):
+        enregistrer_bulletin(self.saisie('Décembre', 2500))
+        reponse = self.client.get(reverse('regularisation_annuelle'), {'societe': 'SOCIETE DIAMOND', 'annee': 2025})
+        self.assertEqual([r['matricule'] for r in reponse.json()['regularisations']], ['M1'])
+        self.assertEqual(self.client.get(reverse('regularisation_annuelle')).status_code, 400)
+
+
+class ImpactReglesTests(TestCase):
+    def saisie(self, i, salaire_base, annees_anciennete=3, mois='Juin'):
+        return {
+            'nom_prenom': f'Employe {i}', 'matricule': f'M{i}', 'societe': 'SOCIETE DIAMOND', 'annee': 2025,
+            'mois': mois, 'salaire_base': Decimal(salaire_base), 'annees_anciennete': annees_anciennete,
+            'chef_famille': False, 'enfants': 0, 'avance': Decimal('0'), 'autres_deductions': Decimal('0'),
+        }
+
+    def test_zones_impactees(self):
+        avant = moteur_regles().defaut
+        apres = moteur_modifie(seuils={'prime_rendement_seuil': 1800}).defaut
+        self.assertEqual(zones_impactees(avant, apres), [
+            ('prime_rendement : seuil 2000 -> 1800', 'salaire_base', Decimal('1800'), Decimal('2000')),
+        ])
+        self.assertEqual(zones_impactees(avant, avant), [])
+        taux = moteur_modifie(taux_primes={'prime_panier': '0.025'}).defaut
+        self.assertEqual(zones_impactees(avant, taux)[0][1:], ('salaire_base', None, None))
+
+    def test_recalcul_des_seuls_bulletins_touches(self):
+        salaires = ['1500', '1799.999', '1800', '1950.5', '2000', '2600']
+        for i, salaire in enumerate(salaires):
+            enregistrer_bulletin(self.saisie(i, salaire))
+        enregistrer_bulletin(self.saisie(9, '1900', mois='Mai'))
+        avant = moteur_regles()
+
+        # Changement à partir de juin : mai n'est pas touché
+        apres = moteur_modifie(seuils={'prime_rendement_seuil': 1800}, debut=(2025, 6))
+        rapport = recalcul_selectif(avant, apres)
+        self.assertEqual(rapport['analyses'], 2)
+        self.assertEqual([l['matricule'] for l in rapport['modifies']], ['M2', 'M3'])
+        ecart = rapport['modifies'][0]['ecarts']['prime_rendement']
+        self.assertEqual(ecart, [0, 72.0])
+
+        # Même résultat qu'un recalcul complet
+        for bulletin in Payslip.objects.filter(mois='Juin'):
+            attendu = calcul_auto_millimes(entrees_bulletin(bulletin.donnees), apres.plan(2025, 6))
+            modifie = bulletin.matricule in ('M2', 'M3')
+            self.assertEqual(bool(ecarts_bulletin(bulletin.donnees, attendu)), modifie, bulletin.matricule)
+
+        rapport = recalcul_selectif(avant, apres, appliquer=True)
+        nouveau = Payslip.objects.get(pk=rapport['modifies'][0]['nouveau_bulletin'])
+        self.assertEqual(nouveau.version_regles, apres.plan(2025, 6).version)
+        self.assertEqual(CumulAnnuel.objects.get(matricule='M2').bulletins, {'6': nouveau.pk})
+        # Les bulletins remplacés ne sont plus analysés
+        self.assertEqual(recalcul_selectif(avant, apres)['analyses'], 0)
+
+    def test_heures_supp_ajoutees_au_brut(self):
+        ancien = moteur_modifie(heures_supp_dans_brut=False)
+        saisie = dict(self.saisie(2, '2000'), heures_supp=Decimal('150'))
+        # Bulletins émis avant que les heures supplémentaires n'entrent dans le brut
+        HEURES_SUPPLEMENTAIRES['dans_le_brut'] = False
+        try:
+            enregistrer_bulletin(self.saisie(1, '2000'))
+            enregistrer_bulletin(saisie)
+            sans = {moteur: calcul_auto(dict(saisie), moteur)['total_brut'] for moteur in ('decimal', 'millimes')}
+        finally:
+            HEURES_SUPPLEMENTAIRES['dans_le_brut'] = True
+        self.assertEqual(set(sans.values()), {calcul_auto(self.saisie(2, '2000'))['total_brut']})
+
+        courant = moteur_regles()
+        self.assertEqual(
+            set(Payslip.objects.values_list('version_regles', flat=True)), {ancien.plan(2025, 'Juin').version},
+        )
+        self.assertNotEqual(ancien.plan(2025, 'Juin').version, courant.plan(2025, 'Juin').version)
+        self.assertEqual(
+            zones_impactees(ancien.plan(2025, 'Juin'), courant.plan(2025, 'Juin')),
+            [('heures supplémentaires dans le brut', None, None, None)],
+        )
+        rapport = recalcul_selectif(ancien, courant)
+        self.assertEqual(rapport['analyses'], 2)
+        self.assertEqual([l['matricule'] for l in rapport['modifies']], ['M2'])
+        brut_avant, brut_apres = rapport['modifies'][0]['ecarts']['total_brut']
+        self.assertAlmostEqual(brut_apres - brut_avant, 150)
+
+        # Même saisie émise avec les règles courantes : nouvel instantané, brut majoré
+        self.assertEqual(enregistrer_bulletin(saisie).donnees['total_brut'], brut_apres)
+
+
+class DeclarationCnssTests(TestCase):
+    def saisie(self, matricule, mois, salaire_base):
+        return {
+            'nom_prenom': f'Employe {matricule}', 'matricule': matricule, 'societe': 'SOCIETE DIAMOND',
+            'annee': 2025, 'mois': mois, 'salaire_base': Decimal(salaire_base), 'annees_anciennete': 3,
+            'chef_famille': False, 'enfants': 0, 'avance': Decimal('0'), 'autres_deductions': Decimal('0'),
+        }
+
+    def test_declaration_trimestrielle(self):
+        retenus = []
+        for matricule in ('M1', 'M2', 'M3'):
+            for mois in ('Janvier', 'Février', 'Mars'):
+                retenus.append(enregistrer_bulletin(self.saisie(matricule, mois, 1800 + 100 * len(retenus))))
+        # Février de M2 ressaisi puis ramené à la saisie d'origine : le bulletin d'origine est retenu
+        enregistrer_bulletin(self.saisie('M2', 'Février', 5000))
+        enregistrer_bulletin(self.saisie('M2', 'Février', 2200))
+        enregistrer_bulletin(self.saisie('M1', 'Avril', 9000))
+
+        paies = paies_trimestre('SOCIETE DIAMOND', 2025, 1)
+        resume = resume_declaration(paies)
+        self.assertEqual((resume['nb_employes'], resume['nb_bulletins']), (3, 9))
+        for ligne in resume['lignes']:
+            attendu = sum(Decimal(str(b.donnees.get(f"patronale_{ligne['ligne']}", 0))) for b in retenus)
+            self.assertEqual(ligne['employeur'], float(attendu), ligne['ligne'])
+        retenue = sum(Decimal(str(b.donnees['retenue_cnss'])) for b in retenus)
+        self.assertEqual(resume['total_salarie'], float(retenue))
+
+        totaux = TotauxDeclaration()
+        lignes = list(csv.reader(io.StringIO(''.join(iter_declaration_csv(paies, totaux)))))
+        self.assertEqual(lignes[0][3:6], ['brut_janvier', 'brut_février', 'brut_mars'])
+        self.assertEqual([l[0] for l in lignes[1:4]], ['M1', 'M2', 'M3'])
+        self.assertEqual(lignes[-1], ['TOTAL', 'ensemble', *(f"{resume[k]:.3f}" for k in (
+            'total_salarie', 'total_employeur', 'total'))])
+        self.assertEqual(totaux.resume(), resume)
+
+    def test_endpoint_declaration(self):
+        bulletin = enregistrer_bulletin(self.saisie('M1', 'Mai', 2000))
+        reponse = self.client.get(reverse('declaration_cnss'), {'paie': bulletin.run_id, 'format': 'json'})
+        self.assertEqual(reponse.json()['total_employeur'], bulletin.donnees['total_cotisations_patronales'])
+        reponse = self.client.get(reverse('declaration_cnss'), {
+            'societe': 'SOCIETE DIAMOND', 'annee': 2025, 'trimestre': 2,
+        })
+        self.assertIn(b'M1,Employe M1,1,', b''.join(reponse.streaming_content))
+        self.assertEqual(self.client.get(reverse('declaration_cnss'), {'annee': 2025, 'trimestre': 5}).status_code, 400)
+
+
+class TraitementsPaieTests(TestCase):
+    def employes(self, nombre):
+        for i in range(nombre):
+            yield i + 2, {
+                'nom_prenom': f'Employe {i}', 'matricule': f'M{i}', 'societe': 'SOCIETE DIAMOND',
+                'annee': 2025, 'mois': 'Avril', 'salaire_base': Decimal(1200 + 10 * i),
+                'annees_anciennete': i % 20, 'chef_famille': i % 2 == 0, 'enfants': i % 4,
+            }, None
+
+    def test_soumission_et_progression(self):
+        csv_employes = BulletinsZipTests.CSV.encode('utf-8')
+        fichier = SimpleUploadedFile('employes.csv', csv_employes, content_type='text/csv')
+        reponse = self.client.post(reverse('soumettre_traitement'), {'fichier': fichier, 'titre': 'Janvier'})
+        self.assertEqual(reponse.status_code, 202)
+        job = reponse.json()
+        self.assertEqual((job['statut'], job['total'], job['traites']), ('en_attente', 2, 0))
+        self.assertEqual(job['rejets'][0]['ligne'], 4)
+
+        self.assertEqual(travailler('test', une_fois=True), 1)
+        etat = self.client.get(reverse('progression_traitement', args=[job['id']])).json()
+        self.assertEqual((etat['statut'], etat['traites'], etat['pourcentage']), ('termine', 2, 100.0))
+        self.assertEqual(Payslip.objects.count(), 2)
+
+    def test_reprise_apres_arret_d_un_worker(self):
+        job = soumettre_paie(self.employes(120), taille_lot=50)
+        self.assertEqual(job.lots.count(), 3)
+
+        # Un worker réserve le premier lot, enregistre 30 bulletins puis s'arrête
+        lot = reserver_lot('arrete')
+        PayrollJobShard.objects.filter(pk=lot.pk).update(
+            position=30, battement=timezone.now() - DELAI_REPRISE - DELAI_REPRISE,
+        )
+        self.assertEqual(travailler('test', une_fois=True), 3)
+
+        job.refresh_from_db()
+        self.assertEqual(job.statut, PayrollJob.TERMINE)
+        # Le lot repris repart de son point de reprise : 30 bulletins non refaits
+        self.assertEqual(Payslip.objects.count(), 90)
+        self.assertEqual(set(job.lots.values_list('worker', flat=True)), {'test'})
+
+    def test_erreur_de_calcul_ou_d_enregistrement_signalee(self):
+        job = soumettre_paie(self.employes(6), taille_lot=10)
+        calcul = travaux.calcul_resultat
+        enregistrer = travaux.enregistrer_bulletin
+
+        def calcul_defaillant(donnees):
+            if donnees['matricule'] == 'M1':
+                raise RuntimeError("calcul impossible")
+            return calcul(donnees)
+
+        def enregistrer_defaillant(donnees, data):
+            if donnees['matricule'] == 'M4':
+                raise IntegrityError("doublon")
+            return enregistrer(donnees, data)
+
+        with mock.patch.object(travaux, 'calcul_resultat', calcul_defaillant), \
+                mock.patch.object(travaux, 'enregistrer_bulletin', enregistrer_defaillant):
+            self.assertEqual(travailler('test', une_fois=True), 1)
+        etat = progression(PayrollJob.objects.get(pk=job.pk))
+        self.assertEqual((etat['statut'], etat['traites']), ('termine', 6))
+        self.assertEqual(etat['erreurs'], [
+            {'ligne': 3, 'message': 'RuntimeError : calcul impossible'},
+            {'ligne': 6, 'message': 'IntegrityError : doublon'},
+        ])
+        self.assertEqual(Payslip.objects.count(), 4)
+
+    def test_lot_en_echec_apres_trop_de_reprises(self):
+        job = soumettre_paie(self.employes(20), taille_lot=10)
+        lot = reserver_lot('arrete')
+        PayrollJobShard.objects.filter(pk=lot.pk).update(
+            position=4, reprises=REPRISES_MAX, battement=timezone.now() - DELAI_REPRISE - DELAI_REPRISE,
+        )
+        self.assertEqual(travailler('test', une_fois=True), 1)
+
+        etat = progression(PayrollJob.objects.get(pk=job.pk))
+        self.assertEqual(etat['statut'], PayrollJob.ECHEC)
+        self.assertEqual(etat['lots'], {'en_attente': 0, 'en_cours': 0, 'termines': 1, 'echecs': 1})
+        self.assertEqual(etat['erreurs'][0]['ligne'], 6)
+        self.assertEqual(Payslip.objects.count(), 10)
+
+    def test_lot_reserve_par_un_seul_worker(self):
+        soumettre_paie(self.employes(10), taille_lot=5)
+        premier, second = reserver_lot('a'), reserver_lot('b')
+        self.assertNotEqual(premier.pk, second.pk)
+        self.assertIsNone(reserver_lot('c'))
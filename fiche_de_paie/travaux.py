@@ -0,0 +1,277 @@
+# fiche_de_paie/travaux.py
+"""File de traitements de paie en tâche de fond, stockée en base.
+
+Un traitement (PayrollJob) est découpé à la soumission en lots d'employés
+(PayrollJobShard). Les workers - des processus locaux lancés par la commande
+``paie_worker``, sans courtier externe - réservent un lot par une mise à jour
+conditionnelle, calculent les bulletins par petits paquets puis les
+enregistrent en avançant le point de reprise du lot dans la même transaction.
+Un lot dont le worker s'est arrêté est repris là où il en était : aucun
+bulletin n'est perdu ni refait. Un lot repris plus de REPRISES_MAX fois (un
+worker qui s'arrête toujours au même endroit) passe en échec.
+"""
+import multiprocessing
+import os
+import socket
+import time
+from datetime import timedelta
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import OperationalError, connections, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .import_employes import ValidateurEmployes
+from .instantanes import enregistrer_bulletin
+from .models import PayrollJob, PayrollJobShard
+from .resultat import calcul_resultat
+
+TAILLE_LOT = 500             # employés par lot réservé
+TAILLE_POINT_REPRISE = 50    # bulletins enregistrés par transaction
+DELAI_REPRISE = timedelta(seconds=120)
+ATTENTE_FILE_VIDE = 2.0      # secondes
+TENTATIVES_VERROU = 8
+REPRISES_MAX = 3             # reprises d'un lot abandonné avant son échec
+
+
+class LotRepris(Exception):
+    """Le lot a été réservé par un autre worker (celui-ci a été jugé arrêté)."""
+
+
+def _donnees_json(donnees):
+    """Données validées en JSON (décimaux en chaînes, revalidés par le worker)."""
+    encodeur = DjangoJSONEncoder()
+    return {
+        k: v if v is None or isinstance(v, (str, int, float, bool)) else encodeur.default(v)
+        for k, v in donnees.items()
+    }
+
+
+def identifiant_worker():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# === Soumission ===
+def soumettre_paie(employes, titre='', taille_lot=TAILLE_LOT):
+    """Crée un traitement à partir des tuples ``(numero, donnees, erreurs)`` de ``lire_employes``.
+
+    Les lignes invalides sont conservées dans ``rejets`` ; les autres sont
+    réparties en lots de ``taille_lot`` employés.
+    """
+    with transaction.atomic():
+        job = PayrollJob.objects.create(titre=titre)
+        lot, numero_lot, total = [], 0, 0
+        for numero, donnees, erreurs in employes:
+            if donnees is None:
+                job.rejets.append([numero, erreurs])
+                continue
+            lot.append([numero, _donnees_json(donnees)])
+            total += 1
+            if len(lot) >= taille_lot:
+                PayrollJobShard.objects.create(job=job, numero=numero_lot, entrees=lot)
+                lot, numero_lot = [], numero_lot + 1
+        if lot:
+            PayrollJobShard.objects.create(job=job, numero=numero_lot, entrees=lot)
+        job.nb_employes = total
+        if not total:
+            job.statut, job.termine_le = PayrollJob.TERMINE, timezone.now()
+        job.save()
+    return job
+
+
+# === Réservation et traitement d'un lot ===
+def reserver_lot(worker):
+    """Réserve le prochain lot en attente, ou un lot abandonné ; None si la file est vide.
+
+    Un lot abandonné déjà repris REPRISES_MAX fois passe en échec au lieu d'être réservé.
+    """
+    abandon = timezone.now() - DELAI_REPRISE
+    candidats = PayrollJobShard.objects.filter(
+        Q(statut=PayrollJob.EN_ATTENTE) | Q(statut=PayrollJob.EN_COURS, battement__lt=abandon)
+    ).order_by('job_id', 'numero').values_list('pk', 'statut', 'battement', 'reprises')[:20]
+
+    for pk, statut, battement, reprises in candidats:
+        # Mise à jour conditionnelle : un seul worker gagne la réservation
+        candidat = PayrollJobShard.objects.filter(pk=pk, statut=statut, battement=battement)
+        if statut == PayrollJob.EN_COURS and reprises >= REPRISES_MAX:
+            if candidat.update(statut=PayrollJob.ECHEC, battement=timezone.now()):
+                _abandonner_lot(pk)
+            continue
+        pris = candidat.update(
+            statut=PayrollJob.EN_COURS, worker=worker, battement=timezone.now(),
+            reprises=F('reprises') + int(statut == PayrollJob.EN_COURS),
+        )
+        if pris:
+            lot = PayrollJobShard.objects.select_related('job').get(pk=pk)
+            if lot.job.statut == PayrollJob.EN_ATTENTE:
+                PayrollJob.objects.filter(pk=lot.job_id, statut=PayrollJob.EN_ATTENTE).update(
+                    statut=PayrollJob.EN_COURS,
+                )
+            return lot
+    return None
+
+
+def _abandonner_lot(pk):
+    """Signale l'échec d'un lot à la ligne où ses workers se sont arrêtés."""
+    lot = PayrollJobShard.objects.get(pk=pk)
+    if lot.position < len(lot.entrees):
+        numero = lot.entrees[lot.position][0]
+        message = f"Lot abandonné après {lot.reprises} reprises : lignes non traitées à partir de celle-ci"
+        PayrollJobShard.objects.filter(pk=pk).update(erreurs=lot.erreurs + [[numero, message]])
+    _terminer_si_complet(lot.job_id)
+
+
+def _calculer_paquet(validateur, entrees, erreurs):
+    """Bulletins calculés ``(numero, donnees, data)`` d'un paquet d'entrées, hors transaction.
+
+    Les lignes invalides ou dont le calcul échoue sont ajoutées à ``erreurs``.
+    """
+    paquet = []
+    for numero, entree in entrees:
+        donnees, invalides = validateur.valider(dict(entree))
+        if invalides:
+            erreurs.append([numero, ', '.join(invalides)])
+            continue
+        try:
+            paquet.append((numero, donnees, calcul_resultat(donnees)))
+        except Exception as e:
+            # Une ligne en erreur ne doit pas arrêter le worker (ni ceux qui reprendraient le lot)
+            erreurs.append([numero, f"{type(e).__name__} : {e}"])
+    return paquet
+
+
+def traiter_lot(lot, worker):
+    """Enregistre les bulletins du lot à partir de son point de reprise."""
+    validateur = ValidateurEmployes()
+    entrees = lot.entrees
+    position = lot.position
+    erreurs = list(lot.erreurs)
+
+    while position < len(entrees):
+        suivante = min(position + TAILLE_POINT_REPRISE, len(entrees))
+        paquet = _calculer_paquet(validateur, entrees[position:suivante], erreurs)
+
+        for tentative in range(TENTATIVES_VERROU):
+            try:
+                erreurs_paquet = _enregistrer_paquet(lot.pk, worker, paquet, suivante, erreurs)
+                break
+            except OperationalError:
+                # Base verrouillée par un autre worker (SQLite) : le paquet est rejoué
+                if tentative == TENTATIVES_VERROU - 1:
+                    raise
+                time.sleep(0.05 * 2 ** tentative)
+        erreurs, position = erreurs_paquet, suivante
+
+    PayrollJobShard.objects.filter(pk=lot.pk, worker=worker).update(statut=PayrollJob.TERMINE)
+    _terminer_si_complet(lot.job_id)
+
+
+def _enregistrer_paquet(lot_pk, worker, paquet, position, erreurs):
+    """Enregistre un paquet de bulletins calculés et avance le point de reprise, en une transaction.
+
+    Le point de reprise est écrit en premier : la transaction prend d'emblée le
+    verrou en écriture, ce qui évite sous SQLite les interblocages entre workers
+    qui lisent tous avant d'écrire. Les calculs sont faits avant (_calculer_paquet) :
+    le verrou n'est tenu que le temps des écritures.
+    """
+    erreurs = list(erreurs)
+    with transaction.atomic():
+        avance = PayrollJobShard.objects.filter(pk=lot_pk, worker=worker).update(
+            position=position, erreurs=erreurs, battement=timezone.now(),
+        )
+        if not avance:
+            raise LotRepris(lot_pk)
+        nb_erreurs = len(erreurs)
+        for numero, donnees, data in paquet:
+            try:
+                with transaction.atomic():
+                    enregistrer_bulletin(donnees, data)
+            except OperationalError:
+                # Base verrouillée : tout le paquet est rejoué
+                raise
+            except Exception as e:
+                erreurs.append([numero, f"{type(e).__name__} : {e}"])
+        if len(erreurs) != nb_erreurs:
+            PayrollJobShard.objects.filter(pk=lot_pk).update(erreurs=erreurs)
+    return erreurs
+
+
+def _terminer_si_complet(job_id):
+    """Clôt le traitement dont tous les lots sont terminés ou en échec (échec s'il y en a un)."""
+    lots = PayrollJobShard.objects.filter(job_id=job_id)
+    if lots.exclude(statut__in=(PayrollJob.TERMINE, PayrollJob.ECHEC)).exists():
+        return
+    statut = PayrollJob.ECHEC if lots.filter(statut=PayrollJob.ECHEC).exists() else PayrollJob.TERMINE
+    PayrollJob.objects.filter(pk=job_id).exclude(statut__in=(PayrollJob.TERMINE, PayrollJob.ECHEC)).update(
+        statut=statut, termine_le=timezone.now(),
+    )
+
+
+# === Boucle des workers ===
+def travailler(worker=None, une_fois=False):
+    """Traite les lots disponibles ; avec ``une_fois``, s'arrête dès que la file est vide.
+
+    Retourne le nombre de lots traités.
+    """
+    worker = worker or identifiant_worker()
+    traites = 0
+    while True:
+        try:
+            lot = reserver_lot(worker)
+        except OperationalError:
+            time.sleep(0.1)
+            continue
+        if lot is None:
+            if une_fois:
+                return traites
+            time.sleep(ATTENTE_FILE_VIDE)
+            continue
+        try:
+            traiter_lot(lot, worker)
+            traites += 1
+        except LotRepris:
+            pass
+
+
+def _processus_worker(une_fois):
+    travailler(une_fois=une_fois)
+
+
+def lancer_workers(processus, une_fois=False):
+    """Lance ``processus`` workers locaux et attend leur fin."""
+    # Les connexions ouvertes ne doivent pas être partagées avec les processus fils
+    connections.close_all()
+    contexte = multiprocessing.get_context('fork')
+    workers = [contexte.Process(target=_processus_worker, args=(une_fois,)) for _ in range(processus)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return [worker.exitcode for worker in workers]
+
+
+# === Avancement ===
+def progression(job):
+    """Avancement d'un traitement, agrégé sur ses lots."""
+    lots = job.lots.aggregate(
+        traites=Sum('position'),
+        en_attente=Count('pk', filter=Q(statut=PayrollJob.EN_ATTENTE)),
+        en_cours=Count('pk', filter=Q(statut=PayrollJob.EN_COURS)),
+        termines=Count('pk', filter=Q(statut=PayrollJob.TERMINE)),
+        echecs=Count('pk', filter=Q(statut=PayrollJob.ECHEC)),
+    )
+    erreurs = [e for lot in job.lots.exclude(erreurs=[]).values_list('erreurs', flat=True) for e in lot]
+    traites = lots['traites'] or 0
+    return {
+        'id': job.pk,
+        'titre': job.titre,
+        'statut': job.statut,
+        'total': job.nb_employes,
+        'traites': traites,
+        'pourcentage': round(100 * traites / job.nb_employes, 1) if job.nb_employes else 100.0,
+        'lots': {k: lots[k] for k in ('en_attente', 'en_cours', 'termines', 'echecs')},
+        'rejets': [{'ligne': numero, 'erreurs': erreurs} for numero, erreurs in job.rejets],
+        'erreurs': [{'ligne': numero, 'message': message} for numero, message in erreurs],
+        'cree_le': job.cree_le.isoformat(),
+        'termine_le': job.termine_le.isoformat() if job.termine_le else None,
+    }
@@ -4,6 +4,23 @@ from . import views
 urlpatterns = [
     path('generate/', views.generate_paie, name='generate_paie'),
     path('calculer-auto/', views.calcul_auto_ajax, name='calcul_auto_ajax'),
+    path('calculer-auto/delta/', views.calcul_auto_delta, name='calcul_auto_delta'),
+    path('calculer-auto/lot/', views.calcul_auto_lot, name='calcul_auto_lot'),
     path('simulateur/', views.simulateur_paie, name='simulateur_paie'),
+    path('simulateur/balayage/', views.balayage_simulateur, name='balayage_simulateur'),
+    path('bulletins/<int:pk>/<str:format>/', views.bulletin_enregistre, name='bulletin_enregistre'),
+    path('bulletins/reimpression/', views.reimpression_bulletin, name='reimpression_bulletin'),
+    path('bulletins/zip/', views.bulletins_zip, name='bulletins_zip'),
+    path('bulletins/import/', views.import_employes, name='import_employes'),
+    path('bulletins/export/', views.export_ndjson, name='export_ndjson'),
+    path('paies/<int:pk>/export/', views.export_paie_ndjson, name='export_paie_ndjson'),
+    path('declarations/cnss/', views.declaration_cnss, name='declaration_cnss'),
+    path('traitements/', views.soumettre_traitement, name='soumettre_traitement'),
+    path('traitements/<int:pk>/', views.progression_traitement, name='progression_traitement'),
+    path('bulletins/recueil/', views.recueil_pdf, name='recueil_pdf'),
+    path('cumuls/regularisation/', views.regularisation_annuelle, name='regularisation_annuelle'),
+    path('cache/stats/', views.cache_stats, name='cache_stats'),
+    path('chronometrage/stats/', views.chronometrage_stats, name='chronometrage_stats'),
+    path('salaire-brut/', views.salaire_brut_ajax, name='salaire_brut_ajax'),
                
 ]
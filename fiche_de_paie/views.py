@@ -1,374 +1,73 @@
-from django.shortcuts import render
-from django.http import HttpResponse, JsonResponse
+import codecs
+from django.conf import settings
+from django.shortcuts import get_object_or_404, render
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from decimal import Decimal, ROUND_HALF_UP
-from datetime import datetime
-from fpdf import FPDF   
+from decimal import Decimal
 from .forms import BulletinPaieForm
-from .auto_calculs import CalculateurPaieAuto, calcul_cotisations, calcul_irpp, calcul_css
-
-# --- Fonction de calcul complète CORRIGÉE ---
-def calcul_auto(data):
-    """Calcul automatique complet du bulletin de paie"""
-    # Extraction des données
-    s_base = Decimal(str(data.get('salaire_base', 0)))
-    chef_famille = data.get('chef_famille', False)
-    enfants = int(data.get('enfants', 0))
-    annees_anciennete = int(data.get('annees_anciennete', 0))
-    
-    # Initialisation du calculateur
-    calculateur = CalculateurPaieAuto(s_base, annees_anciennete)
-    calculateur.calculer_tous_les_gains()
-    resultats = calculateur.calculer_salaire_net()
-
-    total_brut = resultats['total_brut']
-    cotisations = resultats['cotisations']
-    gains = resultats['gains']
-    
-    # Calcul brut imposable MENSUEL
-    brut_imposable_mensuel = total_brut - cotisations['retenue_cnss']
-    
-    # Calcul déductions fiscales MENSUELLES
-    ded_situation_mensuel = Decimal('0')
-    if chef_famille:
-        ded_situation_mensuel += Decimal('25')  # 300/12 = 25 TND par mois
-    ded_situation_mensuel += Decimal('8.33') * enfants  # 100/12 ≈ 8.33 TND par enfant/mois
-    
-    frais_prof_mensuel = (brut_imposable_mensuel * Decimal('0.10')).quantize(Decimal('0.001'))
-    autres_deductions = Decimal(str(data.get('autres_deductions', 0)))
-    avance = Decimal(str(data.get('avance', 0)))
-    
-    # Base imposable nette MENSUELLE
-    base_imposable_nette_mensuel = max(
-        brut_imposable_mensuel - ded_situation_mensuel - frais_prof_mensuel,
-        Decimal('0')
-    )
-    
-    # ✅ CORRECTION : Calcul IRPP sur base MENSUELLE (la fonction gère la conversion annuelle)
-    irpp = calcul_irpp(base_imposable_nette_mensuel)
-    
-    # ✅ CORRECTION : Calcul CSS sur base MENSUELLE
-    css = calcul_css(brut_imposable_mensuel)
-    
-    # Total impôts
-    total_impots = irpp + css
-    
-    # Calcul cohérent du net à payer
-    net_a_payer = total_brut - cotisations['retenue_cnss'] - total_impots - avance - autres_deductions
-
-    # Mise à jour du dictionnaire data
-    data.update({
-        'salaire_base': float(s_base),
-        'total_brut': float(total_brut),
-        'brut_imposable': float(brut_imposable_mensuel),
-        'retenue_cnss': float(cotisations['retenue_cnss']),
-        'total_cotisations_patronales': float(cotisations['total_cotisations_patronales']),
-        'irpp': float(irpp),
-        'css': float(css),
-        'total_impots': float(total_impots),
-        'salaire_net': float(total_brut - cotisations['retenue_cnss'] - total_impots),
-        'net_a_payer': float(net_a_payer),
-        'ded_situation': float(ded_situation_mensuel),
-        'frais_prof': float(frais_prof_mensuel),
-        'base_imposable_nette': float(base_imposable_nette_mensuel),
-        'date_generation': datetime.now().strftime('%d/%m/%Y'),
-    })
+from .auto_calculs import MOTEURS, calcul_cotisations, calcul_irpp, calcul_css
+from .pdf import nom_fichier_bulletin
+from .archive_pdf import archive_pdf, pdf_bulletin
+from .bulk_pdf import iter_zip_bulletins
+from .exports import iter_ndjson_employes, iter_ndjson_paie
+from .import_employes import iter_import_csv, iter_lignes_ndjson, lire_employes, valider_employes
+from .recueil_pdf import iter_recueil_pdf
+from .resultat import ResultatBulletin, calcul_resultat
+from .cache import cache_calculs, calcul_auto_cache, calcul_auto_cache_lot
+from .calcul_incremental import EtatInconnu, calcul_delta, magasin_etats
+from .chronometrage import chronometrer, compter, etape, statistiques_etapes
+from .cumuls import regularisations_annuelles
+from .declaration_cnss import iter_declaration_csv, paies_trimestre, resume_declaration
+from .instantanes import bulletin_periode, bulletin_stocke, enregistrer_bulletin
+from .json_rapide import ReponseJSON, dumps, loads
+from .models import PayrollJob, PayrollRun, Payslip
+from .pointages import ReleveHeures
+from .regles import booleen_saisi
+from .simulation import balayage_csv, balayage_json, balayage_salaires, lire_situations
+from .solveur import salaire_pour_net, salaires_pour_nets
+from .travaux import progression, soumettre_paie
 
-    # Ajouter cotisations salariales individuellement
-    for k, v in cotisations['salarie'].items():
-        data[f'cotisation_{k}'] = float(v)
-    
-    # Ajouter cotisations patronales individuellement
-    for k, v in cotisations['employeur'].items():
-        data[f'patronale_{k}'] = float(v)
-
-    # Ajouter primes individuelles
-    for k, v in gains.items():
-        data[k] = float(v['montant'])
-
-    return data
-  
-# --- Génération PDF améliorée avec FPDF ---
-def generate_pdf_fpdf(data):
-    """Génère un PDF professionnel avec FPDF"""
-    pdf = FPDF('P', 'mm', 'A4')
-    pdf.add_page()
-    pdf.set_auto_page_break(auto=True, margin=15)
-    
-    # Couleurs personnalisées
-    color_header = (52, 73, 94)      # Bleu foncé
-    color_section = (236, 240, 241)  # Gris clair
-    color_red = (231, 76, 60)        # Rouge
-    color_green = (39, 174, 96)      # Vert
-    
-    # --- En-tête ---
-    pdf.set_fill_color(*color_header)
-    pdf.set_text_color(255, 255, 255)
-    pdf.set_font("Arial", "B", 16)
-    pdf.cell(0, 12, data.get('societe', 'SOCIETE DIAMOND'), ln=True, align='C', fill=True)
-    
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font("Arial", "B", 13)
-    pdf.cell(0, 8, f"Bulletin de Paie - {data.get('mois', '-')} {data.get('annee', '-')}", ln=True, align='C')
-    pdf.set_font("Arial", "", 11)
-    pdf.cell(0, 6, f"CNSS : {data.get('cnss', '-')}", ln=True, align='C')
-    pdf.ln(5)
-    
-    # --- Informations employé ---
-    pdf.set_fill_color(*color_section)
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 8, "INFORMATIONS EMPLOYE", ln=True, fill=True)
-    pdf.set_font("Arial", "", 10)
-    
-    # Tableau informations
-    info_data = [
-        ["Nom & Prenom:", str(data.get('nom_prenom', '-')), "Matricule:", str(data.get('matricule', '-'))],
-        ["Emploi:", str(data.get('emploi', '-')), "CIN:", str(data.get('cin', '-'))],
-    ]
-    
-    for row in info_data:
-        pdf.set_font("Arial", "B", 10)
-        pdf.cell(45, 6, row[0], border=1)
-        pdf.set_font("Arial", "", 10)
-        pdf.cell(50, 6, row[1], border=1)
-        pdf.set_font("Arial", "B", 10)
-        pdf.cell(40, 6, row[2], border=1)
-        pdf.set_font("Arial", "", 10)
-        pdf.cell(0, 6, row[3], border=1, ln=True)
-    
-    # Statut familial
-    statut = "Chef de famille" if data.get('chef_famille') else "Celibataire"
-    enfants = f" - {data.get('enfants', 0)} enfant(s)" if data.get('enfants', 0) > 0 else ""
-    pdf.set_font("Arial", "B", 10)
-    pdf.cell(45, 6, "Statut familial:", border=1)
-    pdf.set_font("Arial", "", 10)
-    pdf.cell(0, 6, f"{statut}{enfants}", border=1, ln=True)
-    pdf.ln(5)
-    
-    # --- Gains et Primes ---
-    pdf.set_fill_color(*color_section)
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 8, "GAINS ET PRIMES", ln=True, fill=True)
-    
-    # En-tête tableau
-    pdf.set_fill_color(*color_header)
-    pdf.set_text_color(255, 255, 255)
-    pdf.set_font("Arial", "B", 10)
-    pdf.cell(130, 7, "Designation", border=1, fill=True)
-    pdf.cell(0, 7, "Montant (TND)", border=1, align='R', fill=True, ln=True)
-    
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font("Arial", "", 10)
-    
-    # Lignes gains
-    primes = [
-        ("Salaire de base", data.get('salaire_base', 0)),
-        ("Prime de presence", data.get('prime_presence', 0)),
-        ("Indemnite de transport", data.get('indemn_transport', 0)),
-        ("Prime panier", data.get('prime_panier', 0)),
-        ("Prime de rendement", data.get('prime_rendement', 0)),
-        ("Prime d'anciennete", data.get('prime_anciennete', 0)),
-        ("Heures supplementaires", data.get('heures_supp', 0)),
-    ]
-    
-    for libelle, montant in primes:
-        if montant and montant > 0:
-            pdf.cell(130, 6, libelle, border=1)
-            pdf.cell(0, 6, f"{montant:.3f}", border=1, align='R', ln=True)
-    
-    # Total brut
-    pdf.set_fill_color(*color_section)
-    pdf.set_font("Arial", "B", 10)
-    pdf.cell(130, 7, "TOTAL BRUT", border=1, fill=True)
-    pdf.cell(0, 7, f"{data.get('total_brut', 0):.3f}", border=1, align='R', fill=True, ln=True)
-    pdf.ln(5)
-    
-    # --- Cotisations Sociales ---
-    pdf.set_fill_color(*color_section)
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 8, "COTISATIONS SOCIALES", ln=True, fill=True)
-    
-    # En-tête tableau
-    pdf.set_fill_color(*color_header)
-    pdf.set_text_color(255, 255, 255)
-    pdf.set_font("Arial", "B", 9)
-    pdf.cell(90, 7, "Designation", border=1, fill=True)
-    pdf.cell(50, 7, "Part Salariale", border=1, align='R', fill=True)
-    pdf.cell(0, 7, "Part Patronale", border=1, align='R', fill=True, ln=True)
-    
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font("Arial", "", 9)
-    
-    cotisations = [
-        ("Assurances sociales (5%)", data.get('cotisation_assurances', 0), data.get('patronale_assurances', 0)),
-        ("Cotisation supp. maladie (1.43%)", data.get('cotisation_supp', 0), data.get('patronale_supp', 0)),
-        ("Regime de pensions (2.75%)", data.get('cotisation_pensions', 0), data.get('patronale_pensions', 0)),
-        ("Assurance chomage (0.5%)", data.get('cotisation_chomage', 0), data.get('patronale_chomage', 0)),
-        ("Majoration loi 74-101 (0.5%)", 0, data.get('patronale_majoration_loi_74_101', 0)),
-    ]
-    
-    for libelle, part_s, part_p in cotisations:
-        pdf.cell(90, 6, libelle, border=1)
-        pdf.cell(50, 6, f"{part_s:.3f}" if part_s > 0 else "-", border=1, align='R')
-        pdf.cell(0, 6, f"{part_p:.3f}", border=1, align='R', ln=True)
-    
-    # Total cotisations
-    pdf.set_fill_color(*color_section)
-    pdf.set_font("Arial", "B", 9)
-    pdf.cell(90, 7, "TOTAL COTISATIONS", border=1, fill=True)
-    pdf.cell(50, 7, f"{data.get('retenue_cnss', 0):.3f}", border=1, align='R', fill=True)
-    pdf.cell(0, 7, f"{data.get('total_cotisations_patronales', 0):.3f}", border=1, align='R', fill=True, ln=True)
-    pdf.ln(5)
-    
-    # --- Impôts et Contributions ---
-    pdf.set_fill_color(*color_section)
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 8, "IMPOTS ET CONTRIBUTIONS", ln=True, fill=True)
-    
-    # En-tête tableau
-    pdf.set_fill_color(*color_header)
-    pdf.set_text_color(255, 255, 255)
-    pdf.set_font("Arial", "B", 10)
-    pdf.cell(130, 7, "Designation", border=1, fill=True)
-    pdf.cell(0, 7, "Montant (TND)", border=1, align='R', fill=True, ln=True)
-    
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_font("Arial", "", 10)
-    
-    # Calcul imposable
-    pdf.cell(130, 6, "Salaire brut imposable", border=1)
-    pdf.cell(0, 6, f"{data.get('brut_imposable', 0):.3f}", border=1, align='R', ln=True)
-    
-    if data.get('ded_situation', 0) > 0:
-        pdf.cell(130, 6, "Deduction situation familiale", border=1)
-        pdf.set_text_color(*color_red)
-        pdf.cell(0, 6, f"-{data.get('ded_situation', 0):.3f}", border=1, align='R', ln=True)
-        pdf.set_text_color(0, 0, 0)
-    
-    if data.get('frais_prof', 0) > 0:
-        pdf.cell(130, 6, "Frais professionnels (10%)", border=1)
-        pdf.set_text_color(*color_red)
-        pdf.cell(0, 6, f"-{data.get('frais_prof', 0):.3f}", border=1, align='R', ln=True)
-        pdf.set_text_color(0, 0, 0)
-    
-    # Base imposable nette
-    pdf.set_fill_color(248, 249, 250)
-    pdf.set_font("Arial", "B", 10)
-    pdf.cell(130, 6, "Base imposable nette", border=1, fill=True)
-    pdf.cell(0, 6, f"{data.get('base_imposable_nette', 0):.3f}", border=1, align='R', fill=True, ln=True)
-    pdf.set_font("Arial", "", 10)
-    
-    # IRPP et CSS
-    pdf.cell(130, 6, "IRPP (Impot sur le revenu)", border=1)
-    pdf.set_text_color(*color_red)
-    pdf.cell(0, 6, f"{data.get('irpp', 0):.3f}", border=1, align='R', ln=True)
-    
-    pdf.set_text_color(0, 0, 0)
-    pdf.cell(130, 6, "CSS (Contribution solidarite - 0.5%)", border=1)
-    pdf.set_text_color(*color_red)
-    pdf.cell(0, 6, f"{data.get('css', 0):.3f}", border=1, align='R', ln=True)
-    
-    # Total impôts
-    pdf.set_text_color(0, 0, 0)
-    pdf.set_fill_color(*color_section)
-    pdf.set_font("Arial", "B", 10)
-    pdf.cell(130, 7, "TOTAL IMPOTS", border=1, fill=True)
-    pdf.set_text_color(*color_red)
-    pdf.cell(0, 7, f"{data.get('total_impots', 0):.3f}", border=1, align='R', fill=True, ln=True)
-    pdf.set_text_color(0, 0, 0)
-    pdf.ln(5)
-    
-    # --- Récapitulatif Final ---
-    pdf.set_fill_color(*color_section)
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(0, 8, "RECAPITULATIF", ln=True, fill=True)
-    
-    pdf.set_font("Arial", "", 10)
-    recap_data = [
-        ("Salaire brut total", data.get('total_brut', 0), False),
-        ("Cotisations sociales salariales", data.get('retenue_cnss', 0), True),
-        ("IRPP", data.get('irpp', 0), True),
-        ("CSS", data.get('css', 0), True),
-    ]
-    
-    if data.get('avance', 0) > 0:
-        recap_data.append(("Avances et acomptes", data.get('avance', 0), True))
-    
-    if data.get('autres_deductions', 0) > 0:
-        recap_data.append(("Autres deductions", data.get('autres_deductions', 0), True))
-    
-    for libelle, montant, is_negative in recap_data:
-        pdf.cell(130, 6, libelle, border=1)
-        if is_negative:
-            pdf.set_text_color(*color_red)
-            pdf.cell(0, 6, f"-{montant:.3f}", border=1, align='R', ln=True)
-            pdf.set_text_color(0, 0, 0)
-        else:
-            pdf.cell(0, 6, f"{montant:.3f}", border=1, align='R', ln=True)
-    
-    # NET À PAYER
-    pdf.set_fill_color(39, 174, 96)
-    pdf.set_text_color(255, 255, 255)
-    pdf.set_font("Arial", "B", 12)
-    pdf.cell(130, 10, "NET A PAYER", border=1, fill=True)
-    pdf.cell(0, 10, f"{data.get('net_a_payer', 0):.3f} TND", border=1, align='R', fill=True, ln=True)
-    pdf.set_text_color(0, 0, 0)
-    pdf.ln(10)
-    
-    # --- Signatures ---
-    y_position = pdf.get_y()
-    
-    # Signature responsable
-    pdf.set_xy(20, y_position)
-    pdf.set_font("Arial", "B", 10)
-    pdf.cell(80, 6, "Le responsable", align='C', ln=True)
-    pdf.set_x(20)
-    pdf.set_font("Arial", "", 9)
-    pdf.cell(80, 6, "Signature et cachet", align='C')
-    
-    # Signature employé
-    pdf.set_xy(110, y_position)
-    pdf.set_font("Arial", "B", 10)
-    pdf.cell(80, 6, "L'employe", align='C', ln=True)
-    pdf.set_xy(110, y_position + 6)
-    pdf.set_font("Arial", "", 9)
-    pdf.cell(80, 6, "Signature", align='C')
-    
-    pdf.ln(15)
-    
-    # --- Pied de page ---
-    pdf.set_y(-20)
-    pdf.set_font("Arial", "I", 8)
-    pdf.set_text_color(127, 140, 141)
-    pdf.cell(0, 5, f"Bulletin etabli le {data.get('date_generation', '-')} - Conforme a la legislation tunisienne 2025", align='C')
-    
-    return pdf.output(dest='S').encode('latin1')
+
+def _pdf_compact(request):
+    """PDF compact (PDF 1.5) demandé par le paramètre ``compact``, sinon réglage PAIE_PDF_COMPACT."""
+    valeur = request.POST.get('compact', request.GET.get('compact'))
+    if valeur is None:
+        return getattr(settings, 'PAIE_PDF_COMPACT', False)
+    return valeur not in ('0', 'false', 'non', '')
 
 
 # --- Vue principale de génération ---
 @csrf_exempt
+@chronometrer
 def generate_paie(request):
     """Vue pour générer un bulletin de paie PDF"""
     if request.method == 'POST':
-        form = BulletinPaieForm(request.POST)
-        
-        if not form.is_valid():
+        with etape(request, 'validation'):
+            form = BulletinPaieForm(request.POST)
+            valide = form.is_valid()
+
+        if not valide:
             return render(request, 'fiche_de_paie/formulaire_auto.html', {
                 'form': form,
                 'errors': form.errors
             })
         
-        # Calcul automatique
-        data = calcul_auto(form.cleaned_data)
+        # Calcul automatique (ou relecture du bulletin déjà émis)
+        with etape(request, 'calcul'):
+            data = enregistrer_bulletin(form.cleaned_data).donnees
         
         try:
             # Génération du PDF
-            pdf_bytes = generate_pdf_fpdf(data)
+            with etape(request, 'pdf'):
+                # PDF déjà archivé pour ces données : relu sans rendu
+                pdf_bytes, _ = pdf_bulletin(data, gabarit=True, compact=_pdf_compact(request))
+            compter(request, bulletins=1, octets_pdf=len(pdf_bytes))
             
             # Réponse HTTP avec le PDF
-            response = HttpResponse(pdf_bytes, content_type='application/pdf')
-            nom_fichier = f"bulletin_paie_{data.get('nom_prenom', 'employe').replace(' ', '_')}_{data.get('mois', '')}_{data.get('annee', '')}.pdf"
-            response['Content-Disposition'] = f'inline; filename="{nom_fichier}"'
+            with etape(request, 'reponse'):
+                response = HttpResponse(pdf_bytes, content_type='application/pdf')
+                nom_fichier = nom_fichier_bulletin(data)
+                response['Content-Disposition'] = f'inline; filename="{nom_fichier}"'
             
             return response
             
@@ -381,6 +80,17 @@ def generate_paie(request):
     })
 
 
+def _bulletin_sans_emission(donnees):
+    """Bulletin déjà émis pour ces entrées (dict), sinon ResultatBulletin calculé sans être enregistré.
+
+    Hors du cache de calcul (cache.py), dont les résultats sont des dicts.
+    """
+    bulletin = bulletin_stocke(donnees)
+    if bulletin is not None:
+        return bulletin.donnees
+    return calcul_resultat(donnees)
+
+
 # --- Vue de prévisualisation HTML ---
 def preview_bulletin(request):
     """Prévisualisation HTML du bulletin avant génération PDF"""
@@ -388,7 +98,7 @@ def preview_bulletin(request):
         form = BulletinPaieForm(request.POST)
         
         if form.is_valid():
-            data = calcul_auto(form.cleaned_data)
+            data = _bulletin_sans_emission(form.cleaned_data)
             return render(request, 'fiche_de_paie/bulletin.html', {'data': data})
         else:
             return render(request, 'fiche_de_paie/formulaire_auto.html', {
@@ -403,6 +113,7 @@ def preview_bulletin(request):
 
 # --- API AJAX pour calcul automatique ---
 @csrf_exempt
+@chronometrer
 def calcul_auto_ajax(request):
     """API AJAX pour calculer automatiquement les montants"""
     if request.method != 'POST':
@@ -410,15 +121,20 @@ def calcul_auto_ajax(request):
     
     try:
         # Récupération des données POST
-        post_data = request.POST.dict()
+        with etape(request, 'lecture'):
+            post_data = request.POST.dict()
+            moteur = post_data.pop('moteur', None)
         
         # Calcul automatique
-        data = calcul_auto(post_data)
+        with etape(request, 'calcul'):
+            data = calcul_auto_cache(post_data, moteur)
+        compter(request, bulletins=1)
         
-        return JsonResponse({
-            'success': True,
-            'data': data
-        })
+        with etape(request, 'reponse'):
+            return JsonResponse({
+                'success': True,
+                'data': data
+            })
         
     except Exception as e:
         return JsonResponse({
@@ -427,6 +143,76 @@ def calcul_auto_ajax(request):
         }, status=400)
 
 
+# --- API AJAX de recalcul incrémental ---
+@csrf_exempt
+@chronometrer
+def calcul_auto_delta(request):
+    """Recalcul à partir d'un état précédent et des seuls champs modifiés.
+
+    POST : ``etat`` (identifiant retourné par l'appel précédent, absent pour la
+    première saisie) et les champs modifiés. Réponse : nouvel ``etat``, sorties
+    ``modifies``, sorties ``supprimes`` et ``etapes`` recalculées. Un état
+    inconnu ou expiré donne un 409 : le formulaire renvoie alors tous ses champs.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Methode non autorisee'}, status=405)
+
+    with etape(request, 'lecture'):
+        modifications = request.POST.dict()
+        identifiant = modifications.pop('etat', None)
+        modifications.pop('moteur', None)
+
+    try:
+        with etape(request, 'calcul'):
+            resultat = calcul_delta(modifications, identifiant)
+    except EtatInconnu:
+        return JsonResponse({'success': False, 'error': 'Etat inconnu ou expire', 'etat_inconnu': True}, status=409)
+    except (ValueError, ArithmeticError, TypeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    compter(request, bulletins=1)
+
+    with etape(request, 'reponse'):
+        return JsonResponse({'success': True, **resultat})
+
+
+# --- API de calcul en lot ---
+@csrf_exempt
+@chronometrer
+def calcul_auto_lot(request):
+    """Calcule un tableau JSON d'employés en un aller-retour.
+
+    Corps : ``[{...}, ...]`` ou ``{"employes": [...], "moteur": ...}``, chaque
+    objet ayant les champs de calcul_auto_ajax. Les erreurs sont rapportées
+    élément par élément, sans faire échouer le lot.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Methode non autorisee'}, status=405)
+
+    try:
+        with etape(request, 'lecture'):
+            corps = loads(request.body)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': f'JSON invalide : {e}'}, status=400)
+    moteur = None
+    if isinstance(corps, dict):
+        moteur = corps.get('moteur')
+        corps = corps.get('employes')
+    if not isinstance(corps, list):
+        return JsonResponse({'success': False, 'error': 'Tableau d\'employes attendu'}, status=400)
+    limite = getattr(settings, 'PAIE_LOT_MAX', 10000)
+    if len(corps) > limite:
+        return JsonResponse({'success': False, 'error': f'Lot limite a {limite} employes'}, status=413)
+    if moteur not in (None,) + MOTEURS:
+        return JsonResponse({'success': False, 'error': f'Moteur inconnu : {moteur}'}, status=400)
+
+    with etape(request, 'calcul'):
+        resultats = calcul_auto_cache_lot(corps, moteur)
+    erreurs = sum(1 for r in resultats if not r['success'])
+    compter(request, bulletins=len(resultats) - erreurs)
+    with etape(request, 'reponse'):
+        return ReponseJSON({'success': True, 'total': len(resultats), 'erreurs': erreurs, 'resultats': resultats})
+
+
 # --- Simulateur simplifié ---
 # --- Simulateur simplifié ALTERNATIF ---
 def simulateur_paie(request):
@@ -499,6 +285,42 @@ def simulateur_paie(request):
             })
     
     return render(request, 'fiche_de_paie/formulaire.html')
+
+
+# --- Balayage de salaires : courbes du simulateur ---
+@csrf_exempt
+@chronometrer
+def balayage_simulateur(request):
+    """Courbes net, IRPP, CSS, coût employeur et taux marginal sur une plage de salaires.
+
+    Paramètres (GET ou POST) : minimum, maximum, pas (TND), situations
+    (``"chef:enfants"`` séparés par des virgules), annees_anciennete, annee,
+    mois et format (json ou csv).
+    """
+    parametres = request.POST if request.method == 'POST' else request.GET
+    try:
+        with etape(request, 'calcul'):
+            balayage = balayage_salaires(
+                parametres.get('minimum', '500'),
+                parametres.get('maximum', '15000'),
+                parametres.get('pas', '1'),
+                situations=lire_situations(parametres.get('situations', '')),
+                annees_anciennete=int(parametres.get('annees_anciennete') or 0),
+                annee=int(parametres['annee']) if parametres.get('annee') else None,
+                mois=parametres.get('mois') or None,
+            )
+    except (ValueError, ArithmeticError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    compter(request, bulletins=len(balayage['salaire_base']) * len(balayage['situations']))
+    with etape(request, 'reponse'):
+        if parametres.get('format') == 'csv':
+            response = HttpResponse(balayage_csv(balayage), content_type='text/csv')
+            response['Content-Disposition'] = 'attachment; filename="balayage_salaires.csv"'
+            return response
+        return JsonResponse({'success': True, 'points': len(balayage['salaire_base']), **balayage_json(balayage)})
+
+
 # --- Vue d'export JSON ---
 @csrf_exempt
 def export_calculs_json(request):
@@ -507,13 +329,329 @@ def export_calculs_json(request):
         form = BulletinPaieForm(request.POST)
         
         if form.is_valid():
-            data = calcul_auto(form.cleaned_data)
+            data = _bulletin_sans_emission(form.cleaned_data)
+            contenu = data.json() if isinstance(data, ResultatBulletin) else dumps(data)
             
-            response = JsonResponse(data, json_dumps_params={'indent': 2})
+            response = HttpResponse(contenu, content_type='application/json')
             response['Content-Disposition'] = 'attachment; filename="calculs_paie.json"'
             
             return response
         
         return JsonResponse({'error': 'Donnees invalides', 'errors': form.errors.as_json()}, status=400)
     
-    return JsonResponse({'error': 'Methode non autorisee'}, status=405)
\ No newline at end of file
+    return JsonResponse({'error': 'Methode non autorisee'}, status=405)
+
+
+# --- Bulletins enregistrés : réimpression sans recalcul ---
+def _servir_bulletin(request, bulletin, format):
+    data = bulletin.donnees
+    if format == 'pdf':
+        with etape(request, 'pdf'):
+            pdf_bytes, _ = pdf_bulletin(data, gabarit=True, compact=_pdf_compact(request))
+        compter(request, bulletins=1, octets_pdf=len(pdf_bytes))
+        response = HttpResponse(pdf_bytes, content_type='application/pdf')
+        response['Content-Disposition'] = f'inline; filename="{nom_fichier_bulletin(data)}"'
+        return response
+    if format == 'json':
+        return JsonResponse(data, json_dumps_params={'indent': 2})
+    if format == 'apercu':
+        return render(request, 'fiche_de_paie/bulletin.html', {'data': data})
+    return JsonResponse({'error': f'Format inconnu : {format}'}, status=404)
+
+
+@chronometrer
+def bulletin_enregistre(request, pk, format):
+    """Sert un bulletin enregistré (pdf, json ou apercu) à partir de son instantané"""
+    with etape(request, 'lecture'):
+        bulletin = get_object_or_404(Payslip, pk=pk)
+    return _servir_bulletin(request, bulletin, format)
+
+
+@chronometrer
+def reimpression_bulletin(request):
+    """Dernier bulletin d'un employé pour une période (matricule, societe, annee, mois)"""
+    try:
+        annee = int(request.GET['annee']) if request.GET.get('annee') else None
+    except ValueError:
+        return JsonResponse({'error': 'Annee invalide'}, status=400)
+
+    with etape(request, 'lecture'):
+        bulletin = bulletin_periode(
+            request.GET.get('matricule', ''), request.GET.get('societe', ''), annee, request.GET.get('mois', ''),
+        )
+    if bulletin is None:
+        return JsonResponse({'error': 'Aucun bulletin pour cet employe et cette periode'}, status=404)
+    return _servir_bulletin(request, bulletin, request.GET.get('format', 'pdf'))
+
+
+# --- Régularisation annuelle à partir des cumuls ---
+def regularisation_annuelle(request):
+    """Régularisation IRPP / CSS de fin d'année des employés d'une société (societe, annee)"""
+    try:
+        annee = int(request.GET['annee'])
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Annee manquante ou invalide'}, status=400)
+
+    lignes = list(regularisations_annuelles(request.GET.get('societe', ''), annee))
+    return JsonResponse({'success': True, 'annee': annee, 'regularisations': lignes})
+
+
+# --- Génération en masse : archive ZIP en flux ---
+@csrf_exempt
+def bulletins_zip(request):
+    """Génère les bulletins d'un fichier CSV/XLSX d'employés dans une archive ZIP diffusée en flux"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Methode non autorisee'}, status=405)
+
+    fichier = request.FILES.get('fichier')
+    if fichier is None:
+        return JsonResponse({'error': 'Fichier CSV/XLSX manquant (champ "fichier")'}, status=400)
+
+    employes = lire_employes(fichier, fichier.name, delimiteur=request.POST.get('delimiteur', ','))
+
+    response = StreamingHttpResponse(
+        iter_zip_bulletins(employes, compact=_pdf_compact(request)), content_type='application/zip',
+    )
+    response['Content-Disposition'] = 'attachment; filename="bulletins_paie.zip"'
+    return response
+
+
+# --- Import en masse : calcul des bulletins d'un fichier CSV/XLSX ---
+def _appliquer_pointages(request, employes, delimiteur):
+    """Heures supplémentaires du relevé de pointages joint (champ ``pointages``), s'il y en a un."""
+    pointages = request.FILES.get('pointages')
+    if pointages is None:
+        return employes
+    releve = ReleveHeures.lire(codecs.iterdecode(pointages, 'utf-8-sig'), delimiteur)
+    return releve.appliquer(employes)
+
+
+@csrf_exempt
+def import_employes(request):
+    """Calcule les bulletins d'un fichier CSV/XLSX d'employés et renvoie le CSV des résultats en flux.
+
+    Les lignes invalides figurent dans le résultat avec leurs erreurs (colonne ``erreurs``).
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Methode non autorisee'}, status=405)
+
+    fichier = request.FILES.get('fichier')
+    if fichier is None:
+        return JsonResponse({'error': 'Fichier CSV/XLSX manquant (champ "fichier")'}, status=400)
+
+    delimiteur = request.POST.get('delimiteur', ',')
+    employes = lire_employes(fichier, fichier.name, delimiteur=delimiteur)
+    try:
+        employes = _appliquer_pointages(request, employes, delimiteur)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    response = StreamingHttpResponse(iter_import_csv(employes, delimiteur=delimiteur), content_type='text/csv')
+    response['Content-Disposition'] = 'attachment; filename="bulletins_calcules.csv"'
+    return response
+
+
+# --- Export NDJSON en flux ---
+@csrf_exempt
+def export_ndjson(request):
+    """Calcule un lot d'employés et renvoie un objet JSON compact par bulletin, en flux.
+
+    Entrées : fichier CSV/XLSX/NDJSON (champ ``fichier``) ou corps NDJSON
+    (``Content-Type: application/x-ndjson``), lu au fil du calcul.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Methode non autorisee'}, status=405)
+
+    if request.content_type == 'application/x-ndjson':
+        employes = valider_employes(iter_lignes_ndjson(request))
+    else:
+        fichier = request.FILES.get('fichier')
+        if fichier is None:
+            return JsonResponse({'error': 'Fichier CSV/XLSX/NDJSON manquant (champ "fichier")'}, status=400)
+        delimiteur = request.POST.get('delimiteur', ',')
+        employes = lire_employes(fichier, fichier.name, delimiteur=delimiteur)
+        try:
+            employes = _appliquer_pointages(request, employes, delimiteur)
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+
+    response = StreamingHttpResponse(iter_ndjson_employes(employes), content_type='application/x-ndjson')
+    response['Content-Disposition'] = 'attachment; filename="bulletins_paie.ndjson"'
+    return response
+
+
+def export_paie_ndjson(request, pk):
+    """Bulletins enregistrés d'une paie (PayrollRun) en NDJSON, relus sans recalcul"""
+    run = get_object_or_404(PayrollRun, pk=pk)
+    response = StreamingHttpResponse(iter_ndjson_paie(run), content_type='application/x-ndjson')
+    response['Content-Disposition'] = f'attachment; filename="paie_{run.pk}.ndjson"'
+    return response
+
+
+# --- Déclaration CNSS ---
+def declaration_cnss(request):
+    """Déclaration CNSS d'une paie (paie=<id>) ou d'un trimestre (societe, annee, trimestre).
+
+    ``format=csv`` (défaut) diffuse le fichier de déclaration, ``format=json`` le seul récapitulatif.
+    """
+    try:
+        if request.GET.get('paie'):
+            paies = [get_object_or_404(PayrollRun, pk=int(request.GET['paie']))]
+            nom_fichier = f"declaration_cnss_paie_{paies[0].pk}.csv"
+        else:
+            annee, trimestre = int(request.GET['annee']), int(request.GET['trimestre'])
+            paies = paies_trimestre(request.GET.get('societe', ''), annee, trimestre)
+            nom_fichier = f"declaration_cnss_{annee}_T{trimestre}.csv"
+    except (KeyError, ValueError):
+        return JsonResponse({'error': 'Parametres invalides (paie, ou annee et trimestre 1-4)'}, status=400)
+
+    if request.GET.get('format', 'csv') == 'json':
+        return JsonResponse({'success': True, 'paies': [run.pk for run in paies], **resume_declaration(paies)})
+    response = StreamingHttpResponse(
+        iter_declaration_csv(paies, delimiteur=request.GET.get('delimiteur', ',')), content_type='text/csv',
+    )
+    response['Content-Disposition'] = f'attachment; filename="{nom_fichier}"'
+    return response
+
+
+# --- Traitements de paie en tâche de fond ---
+@csrf_exempt
+def soumettre_traitement(request):
+    """Met en file le calcul et l'enregistrement des bulletins d'un fichier CSV/XLSX (commande paie_worker)"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Methode non autorisee'}, status=405)
+
+    fichier = request.FILES.get('fichier')
+    if fichier is None:
+        return JsonResponse({'error': 'Fichier CSV/XLSX manquant (champ "fichier")'}, status=400)
+
+    try:
+        employes = lire_employes(fichier, fichier.name, delimiteur=request.POST.get('delimiteur', ','))
+        job = soumettre_paie(employes, titre=request.POST.get('titre', ''))
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({'success': True, **progression(job)}, status=202)
+
+
+def progression_traitement(request, pk):
+    """Avancement d'un traitement de paie (à interroger périodiquement)"""
+    job = get_object_or_404(PayrollJob, pk=pk)
+    return JsonResponse(progression(job))
+
+
+# --- Recueil PDF multi-pages en flux ---
+@csrf_exempt
+def recueil_pdf(request):
+    """Génère un PDF unique contenant tous les bulletins d'un fichier CSV/XLSX, diffusé en flux"""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Methode non autorisee'}, status=405)
+
+    fichier = request.FILES.get('fichier')
+    if fichier is None:
+        return JsonResponse({'error': 'Fichier CSV/XLSX manquant (champ "fichier")'}, status=400)
+
+    employes = lire_employes(fichier, fichier.name, delimiteur=request.POST.get('delimiteur', ','))
+    index = request.POST.get('index', '1') not in ('0', 'false', 'non')
+
+    response = StreamingHttpResponse(
+        iter_recueil_pdf(employes, index=index, titre=request.POST.get('titre', ''), compact=_pdf_compact(request)),
+        content_type='application/pdf',
+    )
+    response['Content-Disposition'] = 'attachment; filename="recueil_bulletins_paie.pdf"'
+    return response
+
+
+# --- Statistiques du cache de calcul ---
+def cache_stats(request):
+    """Compteurs du cache de calcul (JSON, ou format texte Prometheus avec ?format=prometheus)"""
+    stats = cache_calculs.stats()
+    archive = archive_pdf()
+    if archive is not None:
+        stats['archive_pdf'] = archive.stats()
+    stats['etats_delta'] = magasin_etats.stats()
+    if request.GET.get('format') == 'prometheus':
+        lignes = [
+            f"paie_cache_{nom} {valeur}"
+            for nom, valeur in stats.items()
+            if isinstance(valeur, (int, float))
+        ]
+        return HttpResponse('\n'.join(lignes) + '\n', content_type='text/plain; version=0.0.4')
+    return JsonResponse(stats)
+
+
+# --- Chronométrage des vues ---
+def chronometrage_stats(request):
+    """Percentiles des étapes des vues chronométrées (JSON, ou format Prometheus avec ?format=prometheus)"""
+    stats = statistiques_etapes.stats()
+    if request.GET.get('format') == 'prometheus':
+        lignes = []
+        for vue, compteurs in stats.items():
+            for nom in ('requetes', 'bulletins', 'octets_pdf'):
+                lignes.append(f'paie_vue_{nom}{{vue="{vue}"}} {compteurs[nom]}')
+            for nom, etape_stats in compteurs['etapes'].items():
+                for p in (50, 95, 99):
+                    lignes.append(
+                        f'paie_etape_ms{{vue="{vue}",etape="{nom}",quantile="0.{p}"}} {etape_stats[f"p{p}_ms"]}'
+                    )
+        return HttpResponse('\n'.join(lignes) + '\n', content_type='text/plain; version=0.0.4')
+    return JsonResponse({'actif': getattr(settings, 'PAIE_SERVER_TIMING', False), 'vues': stats})
+
+
+# --- Solveur net -> brut ---
+@csrf_exempt
+def salaire_brut_ajax(request):
+    """Salaire de base nécessaire pour atteindre un net à payer cible.
+
+    Formulaire POST (net_cible, chef_famille, enfants, annees_anciennete, avance,
+    autres_deductions, annee, mois) pour une cible, ou corps JSON
+    ``{"cibles": [...], "annee": ..., "mois": ...}`` pour un lot (PAIE_LOT_MAX cibles au plus).
+    Les règles appliquées sont celles de la période donnée.
+    """
+    if request.method != 'POST':
+        return JsonResponse({'error': 'Methode non autorisee'}, status=405)
+
+    try:
+        if request.content_type == 'application/json':
+            corps = loads(request.body)
+            if not isinstance(corps, dict) or not isinstance(corps.get('cibles'), list) \
+                    or not all(isinstance(cible, dict) for cible in corps['cibles']):
+                return JsonResponse({'success': False, 'error': 'Tableau de cibles attendu'}, status=400)
+            cibles = corps['cibles']
+            limite = getattr(settings, 'PAIE_LOT_MAX', 10000)
+            if len(cibles) > limite:
+                return JsonResponse({'success': False, 'error': f'Lot limite a {limite} cibles'}, status=413)
+            resultats = salaires_pour_nets(
+                cibles,
+                annee=int(corps['annee']) if corps.get('annee') else None,
+                mois=corps.get('mois') or None,
+            )
+            lignes = [
+                {'salaire_base': s, 'net_a_payer': n, 'ecart': e}
+                for s, n, e in zip(
+                    resultats['salaire_base'].tolist(),
+                    resultats['net_a_payer'].tolist(),
+                    resultats['ecart'].tolist(),
+                )
+            ]
+            return JsonResponse({
+                'success': True,
+                'resultats': lignes,
+                'evaluations': resultats['evaluations'],
+            })
+
+        resultat = salaire_pour_net(
+            request.POST['net_cible'],
+            chef_famille=booleen_saisi(request.POST.get('chef_famille', '')),
+            enfants=request.POST.get('enfants') or 0,
+            annees_anciennete=request.POST.get('annees_anciennete') or 0,
+            avance=request.POST.get('avance') or 0,
+            autres_deductions=request.POST.get('autres_deductions') or 0,
+            annee=int(request.POST['annee']) if request.POST.get('annee') else None,
+            mois=request.POST.get('mois') or None,
+        )
+        return JsonResponse({'success': True, **resultat})
+
+    except (KeyError, ValueError, ArithmeticError, TypeError) as e:
+        return JsonResponse({
+            'success': False,
+            'error': str(e)
+        }, status=400)